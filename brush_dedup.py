@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from mutation_journal import JournalStep
+from read_Systemax import SystemaxReader
+from sai_codec import SaiDocument, read_lines
+
+@dataclass
+class DuplicateSet:
+    """一组内容相同的.saitdat文件"""
+    fingerprint: str
+    canonical: int                                       # 保留为实体文件的dat编号
+    duplicates: List[int] = field(default_factory=list)  # 可以改为链接的dat编号
+
+class BrushDeduplicator:
+    """笔刷库重复笔刷检测与基于.saitlnk的去重"""
+    
+    def __init__(self, reader: SystemaxReader, ignore_keys: Optional[Iterable[str]] = None):
+        """
+        Args:
+            reader: 已初始化的SystemaxReader
+            ignore_keys: 计算指纹时忽略的字段，None时使用配置文件中的 dedup_ignore_keys
+        """
+        self.reader = reader
+        self.nrm_path = reader.library_path
+        if ignore_keys is None:
+            ignore_keys = reader.config.get_dedup_ignore_keys()
+        self.ignore_keys = set(ignore_keys)
+    
+    def fingerprint_lines(self, lines: List[str]) -> str:
+        """
+        计算规范化内容的指纹：去掉空白行和首尾空白、忽略配置的字段，并按行排序，
+        因此字段顺序和换行风格不同的文件也会得到相同指纹
+        
+        Args:
+            lines: 文件行列表
+        
+        Returns:
+            str: 十六进制指纹
+        """
+        normalized = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            key = line.split('=', 1)[0]
+            if key in self.ignore_keys:
+                continue
+            normalized.append(line)
+        normalized.sort()
+        return hashlib.sha1('\n'.join(normalized).encode('utf-8')).hexdigest()
+    
+    def fingerprint_dat(self, dat_id: int) -> Optional[str]:
+        """
+        计算单个.saitdat文件的指纹
+        
+        Args:
+            dat_id: dat编号
+        
+        Returns:
+            Optional[str]: 指纹，读取失败返回None
+        """
+        try:
+            lines = read_lines(self.nrm_path / f"{dat_id}.saitdat")
+        except OSError as e:
+            print(f"读取 {dat_id}.saitdat 时出错: {str(e)}")
+            return None
+        if lines is None:
+            return None
+        return self.fingerprint_lines(lines)
+    
+    def list_ids(self, suffix: str) -> List[int]:
+        """列出nrm目录下指定扩展名的文件编号"""
+        ids = []
+        for name in os.listdir(self.nrm_path):
+            stem, ext = os.path.splitext(name)
+            if ext == suffix and stem.isdigit():
+                ids.append(int(stem))
+        return sorted(ids)
+    
+    def find_duplicates(self) -> List[DuplicateSet]:
+        """
+        对整个笔刷库的.saitdat计算指纹并分组
+        
+        Returns:
+            List[DuplicateSet]: 至少包含两个文件的重复组，编号最小的dat作为保留文件
+        """
+        by_fingerprint: Dict[str, List[int]] = {}
+        for dat_id in self.list_ids('.saitdat'):
+            fingerprint = self.fingerprint_dat(dat_id)
+            if fingerprint:
+                by_fingerprint.setdefault(fingerprint, []).append(dat_id)
+        
+        return [
+            DuplicateSet(fingerprint=fingerprint, canonical=ids[0], duplicates=ids[1:])
+            for fingerprint, ids in by_fingerprint.items()
+            if len(ids) > 1
+        ]
+    
+    def fingerprint_all(self, cache_path: Optional[Path] = None) -> Dict[int, str]:
+        """
+        计算整个笔刷库所有.saitdat的指纹
+        
+        指纹按 (文件大小, 修改时间) 缓存在cache_path中，只有变化过的文件才会重新读取。
+        
+        Args:
+            cache_path: 指纹缓存文件，None表示不使用缓存
+        
+        Returns:
+            Dict[int, str]: {dat编号: 指纹}
+        """
+        cache = {}
+        cache_key = {'nrm_path': str(self.nrm_path), 'ignore_keys': sorted(self.ignore_keys)}
+        if cache_path and cache_path.exists():
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('key') == cache_key:
+                    cache = data.get('entries', {})
+            except Exception as e:
+                print(f"读取指纹缓存时出错: {str(e)}")
+        
+        entries = {}
+        fingerprints: Dict[int, str] = {}
+        with os.scandir(self.nrm_path) as it:
+            for entry in it:
+                stem, ext = os.path.splitext(entry.name)
+                if ext != '.saitdat' or not stem.isdigit():
+                    continue
+                stat = entry.stat()
+                cached = cache.get(stem)
+                if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+                    fingerprint = cached[2]
+                else:
+                    fingerprint = self.fingerprint_dat(int(stem))
+                    if not fingerprint:
+                        continue
+                entries[stem] = [stat.st_size, stat.st_mtime_ns, fingerprint]
+                fingerprints[int(stem)] = fingerprint
+        
+        if cache_path and entries != cache:
+            try:
+                with open(cache_path, 'w', encoding='utf-8') as f:
+                    json.dump({'key': cache_key, 'entries': entries}, f)
+            except Exception as e:
+                print(f"保存指纹缓存时出错: {str(e)}")
+        
+        return fingerprints
+    
+    def build_index(self, cache_path: Optional[Path] = None) -> Dict[str, int]:
+        """
+        建立整个笔刷库的内容指纹索引
+        
+        Args:
+            cache_path: 指纹缓存文件，None表示不使用缓存
+        
+        Returns:
+            Dict[str, int]: {指纹: 编号最小的dat编号}
+        """
+        index: Dict[str, int] = {}
+        for dat_id, fingerprint in self.fingerprint_all(cache_path).items():
+            if fingerprint not in index or dat_id < index[fingerprint]:
+                index[fingerprint] = dat_id
+        return index
+    
+    def link_template(self) -> SaiDocument:
+        """以笔刷库中已有的.saitlnk作为新链接文件的模板（保留其编码和换行符），没有时使用最简格式"""
+        for lnk_id in self.list_ids('.saitlnk'):
+            document = SaiDocument.load(self.nrm_path / f"{lnk_id}.saitlnk")
+            if document and document.get_int('tarid') is not None:
+                return document
+        return SaiDocument.from_text('tarid=I:0\n')
+    
+    @staticmethod
+    def render_link(template: SaiDocument, target_id: int) -> bytes:
+        """根据模板生成指向target_id的链接文件内容（只改写tarid一行）"""
+        document = template.copy()
+        document.set('tarid', str(target_id))
+        return document.encode()
+    
+    def link_duplicates(self, duplicate_sets: List[DuplicateSet], dry_run: bool = False) -> Dict[str, int]:
+        """
+        把重复的.saitdat替换为指向保留文件的.saitlnk
+        
+        笔刷组文件引用的编号不变（SAI会先找.saitdat再找.saitlnk）；
+        原本指向被替换文件的链接会改为直接指向保留文件，避免出现链接链。
+        所有链接的写入和dat的删除通过预写日志作为一次操作执行，中途失败时全部恢复原状。
+        
+        Args:
+            duplicate_sets: find_duplicates 的结果
+            dry_run: 为True时只统计，不修改任何文件
+        
+        Returns:
+            Dict[str, int]: {'files': 替换的文件数, 'bytes': 回收的字节数, 'relinked': 改写的已有链接数}
+        """
+        redirect = {}
+        for duplicate_set in duplicate_sets:
+            for dat_id in duplicate_set.duplicates:
+                redirect[dat_id] = duplicate_set.canonical
+        
+        template = self.link_template()
+        result = {'files': 0, 'bytes': 0, 'relinked': 0}
+        # 同一个文件只写入一次（后面的内容优先）
+        writes: Dict[Path, bytes] = {}
+        deletes: List[Path] = []
+        
+        # 先改写指向将被替换文件的已有链接
+        for lnk_id in self.list_ids('.saitlnk'):
+            lnk_path = self.nrm_path / f"{lnk_id}.saitlnk"
+            document = SaiDocument.load(lnk_path)
+            if not document:
+                continue
+            target = document.get_int('tarid')
+            if target in redirect:
+                result['relinked'] += 1
+                writes[lnk_path] = self.render_link(document, redirect[target])
+        
+        # 再把重复的dat替换为链接
+        for dat_id, canonical in sorted(redirect.items()):
+            dat_path = self.nrm_path / f"{dat_id}.saitdat"
+            content = self.render_link(template, canonical)
+            try:
+                saved = dat_path.stat().st_size - len(content)
+            except OSError as e:
+                print(f"读取 {dat_path.name} 时出错: {str(e)}")
+                continue
+            result['files'] += 1
+            result['bytes'] += max(saved, 0)
+            writes[self.nrm_path / f"{dat_id}.saitlnk"] = content
+            deletes.append(dat_path)
+        
+        if dry_run or not writes:
+            return result
+        steps = [JournalStep('write', path, data=data) for path, data in writes.items()]
+        steps += [JournalStep('delete', path) for path in deletes]
+        if not self.reader.journal.run("brush_dedup", steps):
+            print("替换重复笔刷失败，已恢复原状")
+            return {'files': 0, 'bytes': 0, 'relinked': 0}
+        print(f"已将 {result['files']} 个重复文件替换为链接，改写 {result['relinked']} 个已有链接")
+        return result
+    
+    def generate_report(self, duplicate_sets: List[DuplicateSet]) -> str:
+        """
+        生成重复笔刷的文本报告
+        
+        Args:
+            duplicate_sets: find_duplicates 的结果
+        
+        Returns:
+            str: 报告文本
+        """
+        if not duplicate_sets:
+            return "没有发现重复的笔刷"
+        
+        summary = self.link_duplicates(duplicate_sets, dry_run=True)
+        output = [f"发现 {len(duplicate_sets)} 组重复笔刷，共 {summary['files']} 个可替换为链接的文件，"
+                  f"可回收 {summary['bytes']} 字节"]
+        for duplicate_set in duplicate_sets:
+            duplicates = ', '.join(f"{dat_id}.saitdat" for dat_id in duplicate_set.duplicates)
+            output.append(f"- 保留 {duplicate_set.canonical}.saitdat，重复: {duplicates}")
+        return '\n'.join(output)
+
+if __name__ == '__main__':
+    # python brush_dedup.py [--apply]
+    reader = SystemaxReader()
+    if reader.initialize():
+        deduplicator = BrushDeduplicator(reader)
+        sets = deduplicator.find_duplicates()
+        print(deduplicator.generate_report(sets))
+        if sets and '--apply' in sys.argv[1:]:
+            result = deduplicator.link_duplicates(sets)
+            print(f"已替换 {result['files']} 个文件，回收 {result['bytes']} 字节，改写 {result['relinked']} 个已有链接")
@@ -0,0 +1,137 @@
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from sai_codec import SaiDocument
+
+@dataclass
+class BrushReferences:
+    """笔刷组、.saitdat 和 .saitlnk 之间的引用关系
+    
+    与SAI相同，grp引用的编号先找同编号的.saitdat，没有时再找.saitlnk并沿tarid继续查找。
+    导入查重、笔刷去重和同步都会让多个笔刷组共用同一个dat，
+    删除和批量修改据此判断一个文件是否还被其他笔刷组或链接使用。
+    """
+    dat_ids: Set[int] = field(default_factory=set)
+    link_targets: Dict[int, Optional[int]] = field(default_factory=dict)   # lnk编号 -> tarid（无法读取时为None）
+    group_refs: Dict[int, List[int]] = field(default_factory=dict)         # 笔刷组序号 -> grp中引用的编号
+    
+    @classmethod
+    def scan(cls, nrm_path) -> 'BrushReferences':
+        """
+        读取笔刷库的引用关系：nrm目录只列出一次，每个grp和lnk读取一次
+        
+        Args:
+            nrm_path: custool/nrm 目录
+        
+        Returns:
+            BrushReferences: 引用关系
+        """
+        nrm_path = Path(nrm_path)
+        refs = cls()
+        group_numbers = []
+        with os.scandir(nrm_path) as it:
+            for entry in it:
+                stem, ext = os.path.splitext(entry.name)
+                if ext == '.saitdat' and stem.isdigit():
+                    refs.dat_ids.add(int(stem))
+                elif ext == '.saitlnk' and stem.isdigit():
+                    refs.link_targets[int(stem)] = None
+                elif ext == '.saitgrp' and stem[:1] == '_' and stem[1:].isdigit():
+                    group_numbers.append(int(stem[1:]))
+        
+        for lnk_id in refs.link_targets:
+            document = SaiDocument.load(nrm_path / f"{lnk_id}.saitlnk")
+            refs.link_targets[lnk_id] = document.get_int('tarid') if document is not None else None
+        for group_number in sorted(group_numbers):
+            document = SaiDocument.load(nrm_path / f"_{group_number}.saitgrp")
+            refs.group_refs[group_number] = [value for _, _, value in document.entries()] if document is not None else []
+        return refs
+    
+    def resolve(self, ref_id: int) -> List[str]:
+        """
+        按SAI的查找顺序列出一个编号经过的文件
+        
+        Args:
+            ref_id: grp或lnk中引用的编号
+        
+        Returns:
+            List[str]: 文件名，找到实际的dat时最后一个是该.saitdat
+        """
+        files = []
+        seen = set()
+        while ref_id is not None and ref_id not in seen:
+            seen.add(ref_id)
+            if ref_id in self.dat_ids:
+                files.append(f"{ref_id}.saitdat")
+                break
+            if ref_id not in self.link_targets:
+                break
+            files.append(f"{ref_id}.saitlnk")
+            ref_id = self.link_targets[ref_id]
+        return files
+    
+    def target(self, ref_id: int) -> Optional[int]:
+        """一个编号实际使用的dat编号，找不到时返回None"""
+        files = self.resolve(ref_id)
+        if files and files[-1].endswith('.saitdat'):
+            return int(files[-1][:-len('.saitdat')])
+        return None
+    
+    def group_files(self, group_number: int) -> List[str]:
+        """一个笔刷组使用的dat和lnk文件（按grp中的顺序，不重复）"""
+        files: Dict[str, None] = {}
+        for ref_id in self.group_refs.get(group_number, []):
+            for name in self.resolve(ref_id):
+                files.setdefault(name)
+        return list(files)
+    
+    def file_users(self) -> Dict[str, Set[int]]:
+        """
+        每个dat和lnk文件被哪些笔刷组使用
+        
+        Returns:
+            Dict[str, Set[int]]: {文件名: 笔刷组序号}
+        """
+        users: Dict[str, Set[int]] = {}
+        for group_number in self.group_refs:
+            for name in self.group_files(group_number):
+                users.setdefault(name, set()).add(group_number)
+        return users
+    
+    def removable_files(self, group_numbers: Iterable[int]) -> List[str]:
+        """
+        删除这些笔刷组之后不再被使用的dat和lnk文件
+        
+        笔刷组自己的.saitlnk会被删除，但链接指向的dat只有在没有其他grp或保留下来的lnk
+        （包括不属于任何笔刷组的lnk）引用时才会删除。
+        
+        Args:
+            group_numbers: 将被删除的笔刷组序号
+        
+        Returns:
+            List[str]: 可以删除的文件名
+        """
+        remove = set(group_numbers)
+        kept: Set[str] = set()
+        candidates: Dict[str, None] = {}
+        for group_number in self.group_refs:
+            for name in self.group_files(group_number):
+                if group_number in remove:
+                    candidates.setdefault(name)
+                else:
+                    kept.add(name)
+        removable = [name for name in candidates if name not in kept]
+        
+        # 保留下来的链接指向的文件也要保留；被保留的链接又会保留它指向的文件，直到不再变化
+        while True:
+            removing = set(removable)
+            protected = set()
+            for lnk_id, target in self.link_targets.items():
+                if target is not None and f"{lnk_id}.saitlnk" not in removing:
+                    protected.update(self.resolve(target))
+            remaining = [name for name in removable if name not in protected]
+            if len(remaining) == len(removable):
+                return remaining
+            removable = remaining
@@ -0,0 +1,521 @@
+import csv
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dat_fields import DatFieldExtractor
+
+# .saitdat的任意一行：键=类型:值
+_ANY_KEY_PATTERN = re.compile(rb'^([^=\s]+)=([A-Za-z]):([^\r\n]*)', re.MULTILINE)
+
+@dataclass
+class Column:
+    """一个参数的列"""
+    kind: str                # 'int'：所有值都是 I: 整数，'str'：其他（I: 的值仍保留为int，U: 的值为str）
+    values: np.ndarray       # int列为int64（缺失处为0），str列为object（缺失处为None）
+    present: np.ndarray      # bool，该笔刷是否有此参数
+    
+    def as_text(self) -> np.ndarray:
+        """转换为字符串数组（缺失处为空字符串），用于字符串比较和排序"""
+        text = np.empty(len(self.values), dtype=object)
+        text[:] = ''
+        if self.kind == 'int':
+            text[self.present] = self.values[self.present].astype(str)
+        else:
+            text[self.present] = [str(value) for value in self.values[self.present]]
+        return text.astype(str)
+    
+    def as_float(self) -> np.ndarray:
+        """转换为浮点数组（缺失或不是数字处为nan），用于数值比较"""
+        if self.kind == 'int':
+            numbers = self.values.astype(np.float64)
+            numbers[~self.present] = np.nan
+            return numbers
+        numbers = np.full(len(self.values), np.nan)
+        for i in np.flatnonzero(self.present):
+            try:
+                numbers[i] = float(self.values[i])
+            except ValueError:
+                pass
+        return numbers
+    
+    def take(self, indices: np.ndarray) -> 'Column':
+        return Column(self.kind, self.values[indices], self.present[indices])
+
+def _build_column(values: Sequence[object]) -> Column:
+    """由逐行的值（None表示缺失）建立列，所有值都是int时使用int64"""
+    present = np.fromiter((value is not None for value in values), dtype=bool, count=len(values))
+    if all(type(value) is int for value in values if value is not None):
+        return Column('int', np.array([0 if value is None else value for value in values], dtype=np.int64), present)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return Column('str', column, present)
+
+class BrushTable:
+    """整个笔刷库所有.saitdat参数的列式表
+    
+    每个参数一列，按 I:/U: 前缀确定类型，缺失的参数用掩码表示（不使用-1等特殊值）。
+    筛选、排序和分组都是对整列的numpy运算，结果是共享同一组列定义的新表。
+    """
+    
+    def __init__(self, ids: np.ndarray, columns: Dict[str, Column],
+                 sizes: Optional[np.ndarray] = None, mtimes: Optional[np.ndarray] = None):
+        """
+        Args:
+            ids: dat编号
+            columns: {参数名: 列}
+            sizes: 文件大小（用于增量加载）
+            mtimes: 修改时间（纳秒，用于增量加载）
+        """
+        self.ids = ids
+        self.columns = columns
+        self.sizes = sizes if sizes is not None else np.zeros(len(ids), dtype=np.int64)
+        self.mtimes = mtimes if mtimes is not None else np.zeros(len(ids), dtype=np.int64)
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def keys(self) -> List[str]:
+        """所有参数名，按出现的笔刷数量从多到少排列"""
+        return sorted(self.columns, key=lambda key: (-int(self.columns[key].present.sum()), key))
+    
+    def take(self, indices: np.ndarray) -> 'BrushTable':
+        """
+        按行号或布尔掩码取出部分行
+        
+        Args:
+            indices: 行号数组或与表等长的布尔数组
+        """
+        return BrushTable(self.ids[indices], {key: column.take(indices) for key, column in self.columns.items()},
+                          self.sizes[indices], self.mtimes[indices])
+    
+    def row(self, position: int) -> Dict[str, object]:
+        """取出一行（只包含该笔刷有的参数）"""
+        row = {'id': int(self.ids[position])}
+        for key, column in self.columns.items():
+            if column.present[position]:
+                value = column.values[position]
+                row[key] = value.item() if isinstance(value, np.generic) else value
+        return row
+    
+    def mask(self, condition) -> np.ndarray:
+        """
+        计算一个筛选条件的掩码，语义与 bulk_edit.Condition.matches 相同：
+        两边都是数字时按数值比较，否则只支持 = 和 != 的字符串比较；没有该参数的笔刷不满足
+        
+        Args:
+            condition: 具有 key、op、value 属性的条件（bulk_edit.Condition）
+        
+        Returns:
+            np.ndarray: 布尔掩码
+        """
+        column = self.columns.get(condition.key)
+        if column is None:
+            return np.zeros(len(self), dtype=bool)
+        if condition.op == '~':
+            text = np.char.lower(column.as_text())
+            return column.present & (np.char.find(text, condition.value.lower()) >= 0)
+        
+        try:
+            number = float(condition.value)
+        except ValueError:
+            number = None
+        if number is not None:
+            numbers = column.as_float()
+            numeric = ~np.isnan(numbers)
+            with np.errstate(invalid='ignore'):
+                compared = {'=': numbers == number, '!=': numbers != number, '>': numbers > number,
+                            '>=': numbers >= number, '<': numbers < number, '<=': numbers <= number}[condition.op]
+            result = numeric & compared
+            if condition.op in ('=', '!='):
+                # 不是数字的值按字符串比较
+                text_equal = column.as_text() == condition.value
+                result |= ~numeric & (text_equal if condition.op == '=' else ~text_equal)
+            return column.present & result
+        
+        if condition.op not in ('=', '!='):
+            return np.zeros(len(self), dtype=bool)
+        text_equal = column.as_text() == condition.value
+        return column.present & (text_equal if condition.op == '=' else ~text_equal)
+    
+    def filter(self, conditions: Iterable) -> 'BrushTable':
+        """
+        取出满足全部条件的行
+        
+        Args:
+            conditions: 筛选条件（bulk_edit.parse_conditions 的结果）
+        """
+        selected = np.ones(len(self), dtype=bool)
+        for condition in conditions:
+            selected &= self.mask(condition)
+        return self.take(selected)
+    
+    def sort(self, key: str, descending: bool = False) -> 'BrushTable':
+        """
+        按参数排序（稳定排序，没有该参数的笔刷总是排在最后）
+        
+        Args:
+            key: 参数名，'id' 表示按dat编号
+            descending: 是否降序
+        """
+        if key == 'id':
+            order = np.argsort(-self.ids if descending else self.ids, kind='stable')
+            return self.take(order)
+        column = self.columns.get(key)
+        if column is None:
+            return self
+        if column.kind == 'int':
+            sort_keys = -column.values if descending else column.values
+        else:
+            # 字符串按文本排序：先求每个值的名次，降序时取反
+            _, ranks = np.unique(column.as_text(), return_inverse=True)
+            sort_keys = -ranks if descending else ranks
+        order = np.lexsort((sort_keys, ~column.present))
+        return self.take(order)
+    
+    def group_by(self, key: str) -> List[Tuple[object, 'BrushTable']]:
+        """
+        按参数值分组（没有该参数的笔刷不参与分组）
+        
+        Args:
+            key: 参数名
+        
+        Returns:
+            List[Tuple[object, BrushTable]]: [(参数值, 该组的行)]，按笔刷数量从多到少排列
+        """
+        column = self.columns.get(key)
+        if column is None:
+            return []
+        present = np.flatnonzero(column.present)
+        values = column.values[present] if column.kind == 'int' else column.as_text()[present]
+        uniques, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+        order = np.argsort(inverse, kind='stable')
+        boundaries = np.cumsum(counts)[:-1]
+        groups = []
+        for value, rows in zip(uniques, np.split(present[order], boundaries)):
+            groups.append((value.item() if isinstance(value, np.generic) else value, self.take(rows)))
+        groups.sort(key=lambda group: -len(group[1]))
+        return groups
+    
+    def summarize(self, key: str, value_key: str) -> List[Dict[str, object]]:
+        """
+        按参数分组并统计另一个整数参数（数量、最小、最大、平均）
+        
+        Args:
+            key: 分组的参数名
+            value_key: 统计的整数参数名
+        
+        Returns:
+            List[Dict[str, object]]: 每组一行
+        """
+        column = self.columns.get(key)
+        value_column = self.columns.get(value_key)
+        if column is None or value_column is None or value_column.kind != 'int':
+            return []
+        rows = np.flatnonzero(column.present & value_column.present)
+        group_values = column.values[rows] if column.kind == 'int' else column.as_text()[rows]
+        uniques, inverse = np.unique(group_values, return_inverse=True)
+        numbers = value_column.values[rows]
+        counts = np.bincount(inverse, minlength=len(uniques))
+        sums = np.bincount(inverse, weights=numbers, minlength=len(uniques))
+        minimums = np.full(len(uniques), np.iinfo(np.int64).max)
+        maximums = np.full(len(uniques), np.iinfo(np.int64).min)
+        np.minimum.at(minimums, inverse, numbers)
+        np.maximum.at(maximums, inverse, numbers)
+        summary = []
+        for i, value in enumerate(uniques):
+            summary.append({key: value.item() if isinstance(value, np.generic) else value, 'count': int(counts[i]),
+                            'min': int(minimums[i]), 'max': int(maximums[i]), 'mean': float(sums[i] / counts[i])})
+        summary.sort(key=lambda item: -item['count'])
+        return summary
+    
+    def records(self, keys: Optional[Sequence[str]] = None) -> List[Dict[str, object]]:
+        """
+        转换为逐行的字典
+        
+        Args:
+            keys: 输出的参数，None表示全部
+        """
+        keys = list(keys) if keys else self.keys()
+        columns = [(key, self.columns.get(key)) for key in keys]
+        records = []
+        for position in range(len(self)):
+            record = {'id': int(self.ids[position])}
+            for key, column in columns:
+                if column is not None and column.present[position]:
+                    value = column.values[position]
+                    record[key] = value.item() if isinstance(value, np.generic) else value
+                else:
+                    record[key] = None
+            records.append(record)
+        return records
+    
+    def export_csv(self, output_path: Path, keys: Optional[Sequence[str]] = None) -> bool:
+        """
+        导出为CSV（UTF-8 BOM，Excel可以直接打开，缺失的参数为空）
+        
+        Args:
+            output_path: 输出文件
+            keys: 输出的参数，None表示全部
+        
+        Returns:
+            bool: 是否成功
+        """
+        try:
+            keys = list(keys) if keys else self.keys()
+            with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=['id'] + keys)
+                writer.writeheader()
+                for record in self.records(keys):
+                    writer.writerow({key: '' if value is None else value for key, value in record.items()})
+            return True
+        except Exception as e:
+            print(f"导出CSV时出错: {str(e)}")
+            return False
+    
+    def export_json(self, output_path: Path, keys: Optional[Sequence[str]] = None) -> bool:
+        """
+        导出为JSON（缺失的参数为null）
+        
+        Args:
+            output_path: 输出文件
+            keys: 输出的参数，None表示全部
+        
+        Returns:
+            bool: 是否成功
+        """
+        try:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(self.records(keys), f, ensure_ascii=False, indent=1)
+            return True
+        except Exception as e:
+            print(f"导出JSON时出错: {str(e)}")
+            return False
+
+class BrushTableLoader:
+    """加载笔刷参数表
+    
+    按 (文件大小, 修改时间) 增量加载：只重新读取有变化的.saitdat，其余行直接从上次的表
+    （内存中或磁盘缓存）按整列取出。缓存按列保存，读取时每列只需一次数组转换。
+    """
+    
+    CACHE_VERSION = 1
+    
+    def __init__(self, nrm_path):
+        """
+        Args:
+            nrm_path: custool/nrm 目录
+        """
+        self.nrm_path = Path(nrm_path)
+        self._extractor = DatFieldExtractor(self.nrm_path, keys=())
+        self._table: Optional[BrushTable] = None
+        self.reread = 0          # 上次加载重新读取的文件数量
+        self.elapsed = 0.0       # 上次加载的用时
+    
+    def _cache_key(self) -> Dict[str, object]:
+        return {'nrm_path': str(self.nrm_path), 'version': self.CACHE_VERSION}
+    
+    def _list(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """列出所有.saitdat的 (编号, 大小, 修改时间)，按编号排序"""
+        listing = []
+        with os.scandir(self.nrm_path) as it:
+            for entry in it:
+                name = entry.name
+                if name.endswith('.saitdat') and name[:-8].isdigit():
+                    stat = entry.stat()
+                    listing.append((int(name[:-8]), stat.st_size, stat.st_mtime_ns))
+        listing.sort()
+        if not listing:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty.copy(), empty.copy()
+        ids, sizes, mtimes = (np.array(values, dtype=np.int64) for values in zip(*listing))
+        return ids, sizes, mtimes
+    
+    def _read_row(self, dat_id: int) -> Optional[Dict[str, object]]:
+        """读取一个dat的所有参数，I: 的整数转换为int，同名参数只使用第一次出现的值"""
+        matches = self._extractor._scan(f"{self._extractor._base}{dat_id}.saitdat", _ANY_KEY_PATTERN)
+        if matches is None:
+            return None
+        row = {}
+        for key, kind, raw in matches:
+            key = self._extractor._decode(key)
+            if key in row:
+                continue
+            if kind in (b'I', b'i') and raw.lstrip(b'-').isdigit():
+                row[key] = int(raw)
+            else:
+                row[key] = self._extractor._decode(raw)
+        return row
+    
+    def _read_cache(self, cache_path: Path) -> Optional[BrushTable]:
+        """读取磁盘缓存，路径或版本不符时返回None"""
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('key') != self._cache_key():
+                return None
+            count = len(data['ids'])
+            columns = {}
+            for key, (kind, values, missing) in data['columns'].items():
+                present = np.ones(count, dtype=bool)
+                present[missing] = False
+                if kind == 'int':
+                    columns[key] = Column('int', np.array(values, dtype=np.int64), present)
+                else:
+                    column = np.empty(count, dtype=object)
+                    column[:] = values
+                    columns[key] = Column('str', column, present)
+            return BrushTable(np.array(data['ids'], dtype=np.int64), columns,
+                              np.array(data['sizes'], dtype=np.int64), np.array(data['mtimes'], dtype=np.int64))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"读取参数表缓存时出错: {str(e)}")
+            return None
+    
+    def _write_cache(self, table: BrushTable, cache_path: Path) -> None:
+        """按列保存缓存（先写临时文件再替换）"""
+        columns = {}
+        for key, column in table.columns.items():
+            missing = np.flatnonzero(~column.present).tolist()
+            columns[key] = [column.kind, column.values.tolist(), missing]
+        try:
+            tmp_path = cache_path.with_name(f"{cache_path.name}.tmp")
+            # json.dumps 使用C实现的编码器，比直接 json.dump 到文件快得多
+            content = json.dumps({'key': self._cache_key(), 'ids': table.ids.tolist(), 'sizes': table.sizes.tolist(),
+                                  'mtimes': table.mtimes.tolist(), 'columns': columns}, ensure_ascii=False)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            print(f"保存参数表缓存时出错: {str(e)}")
+    
+    def load(self, cache_path: Optional[Path] = None) -> BrushTable:
+        """
+        加载整个笔刷库的参数表
+        
+        Args:
+            cache_path: 磁盘缓存文件，None表示只使用内存中的上一次结果
+        
+        Returns:
+            BrushTable: 参数表
+        """
+        start = time.perf_counter()
+        ids, sizes, mtimes = self._list()
+        previous = self._table
+        if previous is None and cache_path is not None:
+            previous = self._read_cache(cache_path)
+        
+        # 与上次的表按编号对齐，大小和修改时间都相同的行可以直接复用
+        if previous is not None and len(previous):
+            positions = np.minimum(np.searchsorted(previous.ids, ids), len(previous) - 1)
+            found = previous.ids[positions] == ids
+            unchanged = found & (previous.sizes[positions] == sizes) & (previous.mtimes[positions] == mtimes)
+        else:
+            positions = np.zeros(len(ids), dtype=np.int64)
+            unchanged = np.zeros(len(ids), dtype=bool)
+        
+        changed = np.flatnonzero(~unchanged)
+        if previous is not None and not len(changed) and len(ids) == len(previous):
+            table = previous
+        else:
+            rows: Dict[int, Dict[str, object]] = {}
+            for position in changed:
+                row = self._read_row(int(ids[position]))
+                rows[int(position)] = row if row is not None else {}
+            
+            keys = set(previous.columns) if previous is not None else set()
+            for row in rows.values():
+                keys.update(row)
+            kept_positions = positions[unchanged]
+            columns = {}
+            for key in keys:
+                old = previous.columns.get(key) if previous is not None else None
+                new_values = [row.get(key) for row in rows.values()]
+                if old is not None and old.kind == 'int' and all(type(value) is int for value in new_values
+                                                                 if value is not None):
+                    values = np.zeros(len(ids), dtype=np.int64)
+                    present = np.zeros(len(ids), dtype=bool)
+                    values[unchanged] = old.values[kept_positions]
+                    present[unchanged] = old.present[kept_positions]
+                    if rows:
+                        values[changed] = [0 if value is None else value for value in new_values]
+                        present[changed] = [value is not None for value in new_values]
+                    column = Column('int', values, present)
+                else:
+                    merged = np.empty(len(ids), dtype=object)
+                    if old is not None and old.kind == 'int':
+                        merged[unchanged] = [int(value) if flag else None for value, flag
+                                             in zip(old.values[kept_positions], old.present[kept_positions])]
+                    elif old is not None:
+                        merged[unchanged] = old.values[kept_positions]
+                    if rows:
+                        merged[changed] = new_values
+                    column = _build_column(merged.tolist())
+                if column.present.any():
+                    columns[key] = column
+            table = BrushTable(ids, columns, sizes, mtimes)
+            if cache_path is not None:
+                self._write_cache(table, cache_path)
+        
+        self._table = table
+        self.reread = len(changed)
+        self.elapsed = time.perf_counter() - start
+        return table
+
+def generate_report(table: BrushTable, keys: Optional[Sequence[str]] = None, limit: Optional[int] = 20) -> str:
+    """
+    生成查询结果的文本报告
+    
+    Args:
+        table: 查询结果
+        keys: 显示的参数，None表示 name 和出现最多的几个参数
+        limit: 最多列出的行数，None表示全部
+    
+    Returns:
+        str: 报告文本
+    """
+    keys = list(keys) if keys else (['name'] + [key for key in table.keys() if key != 'name'])[:6]
+    output = [f"共 {len(table)} 个笔刷"]
+    for record in table.take(np.arange(min(len(table), limit if limit is not None else len(table)))).records(keys):
+        output.append(f"- {record.pop('id')}.saitdat " + '，'.join(f"{key}={value}" for key, value in record.items()
+                                                                  if value is not None))
+    if limit is not None and len(table) > limit:
+        output.append(f"……（还有 {len(table) - limit} 个）")
+    return '\n'.join(output)
+
+if __name__ == '__main__':
+    # python brush_table.py [--where 条件] [--sort 参数] [--desc] [--group 参数] [--keys a,b] [--output 文件.csv|.json]
+    from bulk_edit import parse_conditions
+    from read_Systemax import SystemaxReader
+    
+    args = sys.argv[1:]
+    
+    def option(flag: str) -> Optional[str]:
+        return args[args.index(flag) + 1] if flag in args and args.index(flag) + 1 < len(args) else None
+    
+    reader = SystemaxReader()
+    if reader.initialize():
+        brush_table = reader.load_brush_table(reader.config.exe_dir / 'brush_table_cache.json')
+        result = brush_table.filter(parse_conditions(option('--where') or ''))
+        if option('--sort'):
+            result = result.sort(option('--sort'), descending='--desc' in args)
+        selected_keys = option('--keys').split(',') if option('--keys') else None
+        if option('--group'):
+            for group_value, rows in result.group_by(option('--group')):
+                print(f"{option('--group')}={group_value}: {len(rows)} 个笔刷")
+        else:
+            print(generate_report(result, selected_keys))
+        output = Path(option('--output')) if option('--output') else None
+        if output is not None:
+            if output.suffix.lower() == '.json':
+                result.export_json(output, selected_keys)
+            else:
+                result.export_csv(output, selected_keys)
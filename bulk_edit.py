@@ -0,0 +1,329 @@
+import fnmatch
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from mutation_journal import JournalStep
+from read_Systemax import SystemaxReader
+from sai_codec import SaiDocument
+
+_CONDITION_PATTERN = re.compile(r'^\s*([^\s=!<>~]+)\s*(>=|<=|!=|=|>|<|~)\s*(.*?)\s*$')
+
+@dataclass
+class Condition:
+    """筛选条件：键 运算符 值"""
+    key: str
+    op: str      # '=', '!=', '>', '>=', '<', '<=', '~'（包含，不区分大小写）
+    value: str
+    
+    def matches(self, values: Dict[str, str]) -> bool:
+        """判断一个笔刷是否满足条件（没有该键的笔刷不满足）"""
+        actual = values.get(self.key)
+        if actual is None:
+            return False
+        if self.op == '~':
+            return self.value.casefold() in actual.casefold()
+        try:
+            left, right = float(actual), float(self.value)
+        except ValueError:
+            left, right = actual, self.value
+            if self.op not in ('=', '!='):
+                return False
+        return {'=': left == right, '!=': left != right, '>': left > right,
+                '>=': left >= right, '<': left < right, '<=': left <= right}[self.op]
+
+@dataclass
+class EditOperation:
+    """对笔刷参数的一个修改"""
+    action: str                        # 'set'：设置值（没有该键时加入），'scale'：按比例缩放整数值，'rename'：重命名键
+    key: str
+    value: Optional[str] = None        # set 的新值，rename 的新键名
+    factor: float = 1.0                # scale 的比例
+    minimum: Optional[int] = None      # scale 结果的下限
+    maximum: Optional[int] = None      # scale 结果的上限
+
+@dataclass
+class DatEdit:
+    """一个将被改写的.saitdat"""
+    dat_id: int
+    name: str
+    encoding: str
+    data: bytes                                                           # 改写后的内容（原编码）
+    changes: List[Tuple[str, str, Optional[str], str]] = field(default_factory=list)  # (操作, 键, 原值, 新值或新键名)
+
+@dataclass
+class BulkEditPlan:
+    """批量修改的预览结果"""
+    edits: List[DatEdit] = field(default_factory=list)
+    scanned: int = 0                   # 读取的dat数量
+    matched: int = 0                   # 满足筛选条件的dat数量
+    warnings: List[str] = field(default_factory=list)
+    shared: Dict[int, List[int]] = field(default_factory=dict)   # 因被范围外的笔刷组共用而未修改的dat -> 这些笔刷组
+
+def parse_conditions(text: str) -> List[Condition]:
+    """
+    解析筛选条件，多个条件用逗号分隔（全部满足），例如 "density>50, texnam~paper"
+    
+    Raises:
+        ValueError: 条件格式不正确
+    """
+    conditions = []
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        match = _CONDITION_PATTERN.match(part)
+        if not match:
+            raise ValueError(f"无法解析条件: {part.strip()}")
+        conditions.append(Condition(*match.groups()))
+    return conditions
+
+def parse_operations(text: str) -> List[EditOperation]:
+    """
+    解析修改操作，多个操作用分号分隔：
+    "size=20" 设置值，"density*0.8" 按比例缩放，"oldkey->newkey" 重命名键
+    
+    Raises:
+        ValueError: 操作格式不正确
+    """
+    operations = []
+    for part in text.split(';'):
+        part = part.strip()
+        if not part:
+            continue
+        if '->' in part:
+            key, new_key = (item.strip() for item in part.split('->', 1))
+            if not key or not re.fullmatch(r'[^=\s:]+', new_key):
+                raise ValueError(f"无法解析重命名: {part}")
+            operations.append(EditOperation('rename', key, value=new_key))
+        elif '*' in part and '=' not in part:
+            key, factor = (item.strip() for item in part.split('*', 1))
+            operations.append(EditOperation('scale', key, factor=float(factor)))
+        elif '=' in part:
+            key, value = part.split('=', 1)
+            if not key.strip():
+                raise ValueError(f"无法解析设置: {part}")
+            operations.append(EditOperation('set', key.strip(), value=value.strip()))
+        else:
+            raise ValueError(f"无法解析操作: {part}")
+    return operations
+
+class BulkEditor:
+    """批量修改笔刷参数
+    
+    每个候选dat只读取一次：用 SaiDocument 无损解析，先判断是否满足筛选条件，再就地修改对应的行，
+    其余行保持原始字节不变，修改过的行按原编码重新编码；内容确实变化的文件才会写入。
+    所有写入通过预写日志作为一次操作执行。
+    
+    只修改部分笔刷组时，通过链接或查重与范围外的笔刷组共用的dat不会被修改（否则会同时改变其他笔刷组），
+    这些dat列在预览结果的 shared 中。
+    """
+    
+    def __init__(self, reader: SystemaxReader):
+        """
+        Args:
+            reader: 已初始化的SystemaxReader
+        """
+        self.reader = reader
+        self.nrm_path = reader.library_path
+    
+    def candidate_ids(self, group_numbers: Optional[Iterable[int]] = None) -> List[int]:
+        """
+        列出候选dat编号
+        
+        Args:
+            group_numbers: 只包括这些笔刷组使用的dat（链接解析为目标dat），None表示整个笔刷库
+        
+        Returns:
+            List[int]: 实际存在的dat编号
+        """
+        references = self.reader.scan_references()
+        if group_numbers is None:
+            return sorted(references.dat_ids)
+        selected = set()
+        for group_number in group_numbers:
+            for ref_id in references.group_refs.get(group_number, []):
+                dat_id = references.target(ref_id)
+                if dat_id is not None:
+                    selected.add(dat_id)
+        return sorted(selected)
+    
+    def shared_dats(self, group_numbers: Iterable[int]) -> Dict[int, List[int]]:
+        """
+        找出这些笔刷组使用的dat中，同时被其他笔刷组使用的dat
+        
+        Args:
+            group_numbers: 将被修改的笔刷组序号
+        
+        Returns:
+            Dict[int, List[int]]: {dat编号: 使用它的其他笔刷组序号}
+        """
+        group_numbers = set(group_numbers)
+        shared = {}
+        for name, users in self.reader.scan_references().file_users().items():
+            others = users - group_numbers
+            if name.endswith('.saitdat') and others and users & group_numbers:
+                shared[int(name[:-len('.saitdat')])] = sorted(others)
+        return shared
+    
+    @staticmethod
+    def _apply(document: SaiDocument, operations: List[EditOperation], dat_id: int,
+               warnings: List[str]) -> List[Tuple[str, str, Optional[str], str]]:
+        """在文档上就地执行修改（只改动相关的行），返回实际发生的变化"""
+        changes = []
+        for operation in operations:
+            field_value = document.get_field(operation.key)
+            
+            if operation.action == 'set':
+                old_value = field_value[1] if field_value is not None else None
+                if old_value != operation.value:
+                    # 没有该键时加在 --EOF-- 之前，使用文件中已有的换行符
+                    document.set(operation.key, operation.value)
+                    changes.append(('set', operation.key, old_value, operation.value))
+            
+            elif operation.action == 'scale':
+                if field_value is None:
+                    continue
+                kind, old_value = field_value
+                if kind not in ('I', 'i') or not re.fullmatch(r'-?\d+', old_value):
+                    warnings.append(f"{dat_id}.saitdat 的 {operation.key} 不是整数，未缩放")
+                    continue
+                value = int(round(int(old_value) * operation.factor))
+                if operation.minimum is not None:
+                    value = max(value, operation.minimum)
+                if operation.maximum is not None:
+                    value = min(value, operation.maximum)
+                if str(value) != old_value:
+                    document.set(operation.key, str(value))
+                    changes.append(('scale', operation.key, old_value, str(value)))
+            
+            elif operation.action == 'rename':
+                if field_value is None:
+                    continue
+                if document.find(operation.value) is not None:
+                    warnings.append(f"{dat_id}.saitdat 已有 {operation.value}，未重命名 {operation.key}")
+                    continue
+                document.rename(operation.key, operation.value)
+                changes.append(('rename', operation.key, field_value[1], operation.value))
+        return changes
+    
+    def plan(self, operations: List[EditOperation], group_numbers: Optional[Iterable[int]] = None,
+             name_pattern: Optional[str] = None, conditions: Iterable[Condition] = ()) -> BulkEditPlan:
+        """
+        选出笔刷并计算修改后的内容（不写入文件）
+        
+        Args:
+            operations: 修改操作
+            group_numbers: 只修改这些笔刷组的笔刷，None表示整个笔刷库
+            name_pattern: 笔刷名称的通配符（不区分大小写，例如 "*铅笔*"）
+            conditions: 筛选条件，全部满足的笔刷才会被修改
+        
+        Returns:
+            BulkEditPlan: 预览结果
+        """
+        result = BulkEditPlan()
+        conditions = list(conditions)
+        pattern = name_pattern.casefold() if name_pattern else None
+        if group_numbers is not None:
+            group_numbers = list(group_numbers)
+            result.shared = self.shared_dats(group_numbers)
+        for dat_id in self.candidate_ids(group_numbers):
+            if dat_id in result.shared:
+                continue
+            try:
+                with open(self.nrm_path / f"{dat_id}.saitdat", 'rb') as f:
+                    original = f.read()
+            except OSError as e:
+                result.warnings.append(f"读取 {dat_id}.saitdat 时出错: {str(e)}")
+                continue
+            result.scanned += 1
+            document = SaiDocument.decode(original)
+            values = document.fields()
+            name = values.get('name', '')
+            if pattern and not fnmatch.fnmatchcase(name.casefold(), pattern):
+                continue
+            if not all(condition.matches(values) for condition in conditions):
+                continue
+            result.matched += 1
+            
+            changes = self._apply(document, operations, dat_id, result.warnings)
+            if not changes:
+                continue
+            try:
+                data = document.encode()
+            except UnicodeEncodeError:
+                result.warnings.append(f"{dat_id}.saitdat 的新内容无法用原编码 {document.encoding} 保存，已跳过")
+                continue
+            if data != original:
+                result.edits.append(DatEdit(dat_id, name, document.encoding, data, changes))
+        return result
+    
+    def apply(self, plan: BulkEditPlan) -> bool:
+        """
+        通过预写日志一次写入所有修改
+        
+        Args:
+            plan: plan 的结果
+        
+        Returns:
+            bool: 是否成功（没有需要修改的文件也视为成功）
+        """
+        if not plan.edits:
+            return True
+        steps = [JournalStep('write', self.nrm_path / f"{edit.dat_id}.saitdat", data=edit.data)
+                 for edit in plan.edits]
+        if not self.reader.journal.run("bulk_edit", steps):
+            print("批量修改失败，已恢复原状")
+            return False
+        print(f"已修改 {len(plan.edits)} 个笔刷")
+        return True
+    
+    def generate_report(self, plan: BulkEditPlan, limit: int = 20) -> str:
+        """
+        生成预览报告
+        
+        Args:
+            plan: plan 的结果
+            limit: 最多列出的笔刷数量
+        
+        Returns:
+            str: 报告文本
+        """
+        output = [f"检查了 {plan.scanned} 个笔刷，{plan.matched} 个满足条件，{len(plan.edits)} 个将被修改"]
+        for edit in plan.edits[:limit]:
+            changes = '，'.join(f"{key} 重命名为 {new}" if action == 'rename' else f"{key}: {old} -> {new}"
+                               for action, key, old, new in edit.changes)
+            output.append(f"- {edit.dat_id}.saitdat {edit.name}: {changes}")
+        if len(plan.edits) > limit:
+            output.append(f"……（还有 {len(plan.edits) - limit} 个）")
+        if plan.shared:
+            output.append(f"{len(plan.shared)} 个笔刷还被其他笔刷组使用，未修改：")
+            for dat_id, groups in list(plan.shared.items())[:limit]:
+                output.append(f"- {dat_id}.saitdat（笔刷组 {', '.join(str(number) for number in groups)}）")
+        for warning in plan.warnings[:limit]:
+            output.append(f"警告: {warning}")
+        return '\n'.join(output)
+
+if __name__ == '__main__':
+    # python bulk_edit.py 操作 [--name 通配符] [--where 条件] [--group 序号,...] [--apply]
+    args = sys.argv[1:]
+    if not args:
+        print("用法: python bulk_edit.py \"size=20; density*0.8\" [--name \"*铅笔*\"] [--where \"density>50\"] "
+              "[--group 1,2] [--apply]")
+        sys.exit(1)
+    
+    def option(flag: str) -> Optional[str]:
+        return args[args.index(flag) + 1] if flag in args and args.index(flag) + 1 < len(args) else None
+    
+    reader = SystemaxReader()
+    if reader.initialize():
+        editor = BulkEditor(reader)
+        groups = option('--group')
+        edit_plan = editor.plan(parse_operations(args[0]),
+                                group_numbers=[int(number) for number in groups.split(',')] if groups else None,
+                                name_pattern=option('--name'),
+                                conditions=parse_conditions(option('--where') or ''))
+        print(editor.generate_report(edit_plan))
+        if '--apply' in args:
+            editor.apply(edit_plan)
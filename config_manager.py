@@ -2,7 +2,7 @@ import json
 import os
 import sys
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 class ConfigManager:
     """配置管理器，用于保存和读取用户配置"""
@@ -61,3 +61,41 @@ class ConfigManager:
         """设置上次导入路径"""
         self.config['last_import_path'] = path
         self._save_config()
+
+    def get_dedup_ignore_keys(self) -> List[str]:
+        """获取查重时忽略的.saitdat字段（例如 name），默认不忽略任何字段"""
+        return list(self.config.get('dedup_ignore_keys', []))
+    
+    def set_dedup_ignore_keys(self, keys: List[str]) -> None:
+        """设置查重时忽略的.saitdat字段"""
+        self.config['dedup_ignore_keys'] = list(keys)
+        self._save_config()
+
+    def get_shadow_mirror(self) -> bool:
+        """是否启用本地镜像模式（SAI设置目录位于云同步文件夹时使用）"""
+        return bool(self.config.get('shadow_mirror', False))
+    
+    def set_shadow_mirror(self, enabled: bool) -> None:
+        """设置是否启用本地镜像模式"""
+        self.config['shadow_mirror'] = bool(enabled)
+        self._save_config()
+
+    def get_live_watch(self) -> bool:
+        """是否监视笔刷库的变化并自动更新显示"""
+        return bool(self.config.get('live_watch', False))
+    
+    def set_live_watch(self, enabled: bool) -> None:
+        """设置是否监视笔刷库的变化"""
+        self.config['live_watch'] = bool(enabled)
+        self._save_config()
+
+    def get_snapshot_settings(self) -> dict:
+        """获取自动快照设置：enabled 是否在导入/删除前创建快照，keep_last/keep_daily 为保留策略"""
+        settings = {'enabled': True, 'keep_last': 10, 'keep_daily': 7}
+        settings.update(self.config.get('snapshot', {}))
+        return settings
+    
+    def set_snapshot_settings(self, settings: dict) -> None:
+        """设置自动快照"""
+        self.config['snapshot'] = dict(settings)
+        self._save_config()
@@ -0,0 +1,295 @@
+import io
+import mmap
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from sai_codec import SaiDocument
+
+# 资源扫描和名称查找需要的字段
+DEFAULT_KEYS = ('name', 'fomcat', 'fomnam', 'texcat', 'texnam')
+
+@dataclass
+class DatFieldTable:
+    """按列存放的.saitdat字段提取结果"""
+    ids: np.ndarray                                           # dat编号，升序
+    columns: Dict[str, np.ndarray]                            # 字段 -> 列；整数字段缺失为-1，字符串字段缺失为None
+    links: Dict[int, int] = field(default_factory=dict)       # lnk编号 -> 目标编号
+    
+    def __post_init__(self):
+        self._positions = {int(dat_id): i for i, dat_id in enumerate(self.ids)}
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def __contains__(self, dat_id: int) -> bool:
+        return dat_id in self._positions
+    
+    def get(self, dat_id: int, key: str, default=None):
+        """
+        读取单个字段
+        
+        Args:
+            dat_id: dat编号
+            key: 字段名
+            default: 没有该dat或字段时的返回值
+        """
+        position = self._positions.get(dat_id)
+        column = self.columns.get(key)
+        if position is None or column is None:
+            return default
+        value = column[position]
+        if value is None or (column.dtype != object and value < 0):
+            return default
+        return value.item() if isinstance(value, np.generic) else value
+    
+    def lookup(self, dat_id: int, key: str, default=None):
+        """
+        读取字段，dat中没有该字段时沿同编号的.saitlnk继续查找（与逐个读取dat再读取lnk的顺序一致）
+        
+        Args:
+            dat_id: dat或lnk编号
+            key: 字段名
+            default: 找不到时的返回值
+        """
+        seen = set()
+        while dat_id is not None and dat_id not in seen:
+            seen.add(dat_id)
+            value = self.get(dat_id, key)
+            if value is not None:
+                return value
+            dat_id = self.links.get(dat_id)
+        return default
+
+class DatFieldExtractor:
+    """批量提取.saitdat中的少量字段
+    
+    每个文件只用一次readinto读入可复用的缓冲区（大文件改用mmap），
+    用预编译的字节正则找到需要的键，只对匹配到的值解码，不对整个文件做编码探测和逐行拆分。
+    """
+    
+    ENCODINGS = SaiDocument.ENCODINGS  # 与 sai_codec 使用相同的编码顺序
+    MMAP_THRESHOLD = 1 << 20  # 超过1MB的文件使用mmap
+    
+    def __init__(self, nrm_path, keys: Sequence[str] = DEFAULT_KEYS):
+        """
+        Args:
+            nrm_path: custool/nrm 目录
+            keys: 需要提取的字段
+        """
+        self.nrm_path = Path(nrm_path)
+        self.keys = tuple(keys)
+        alternatives = b'|'.join(re.escape(key.encode('ascii')) for key in self.keys)
+        self._pattern = re.compile(rb'^(' + alternatives + rb')=([A-Za-z]):([^\r\n]*)', re.MULTILINE)
+        self._tarid_pattern = re.compile(rb'^tarid=I:(-?\d+)', re.MULTILINE)
+        self._base = str(self.nrm_path) + os.sep
+        self._buffer = bytearray(64 * 1024)
+        self._listing_mtime = None
+        self._link_ids = set()
+    
+    def _decode(self, raw: bytes) -> str:
+        """只对匹配到的值按多种编码尝试解码"""
+        for encoding in self.ENCODINGS:
+            try:
+                return raw.decode(encoding)
+            except UnicodeDecodeError:
+                continue
+        return raw.decode('latin1')
+    
+    def _scan(self, path: str, pattern: re.Pattern) -> Optional[List[Tuple[bytes, ...]]]:
+        """
+        读取文件并返回所有匹配的分组
+        
+        缓冲区会被下一次读取覆盖，因此这里直接取出分组的值。
+        
+        Args:
+            path: 文件路径
+            pattern: 预编译的字节正则
+        
+        Returns:
+            Optional[List[Tuple[bytes, ...]]]: 每个匹配的分组，文件不存在返回None
+        """
+        try:
+            with io.FileIO(path, 'r') as f:
+                view = memoryview(self._buffer)
+                length = f.readinto(view)
+                if length == len(self._buffer):
+                    # 缓冲区已满，说明文件较大：超过阈值使用mmap，否则扩大缓冲区后继续读取
+                    size = os.fstat(f.fileno()).st_size
+                    if size >= self.MMAP_THRESHOLD:
+                        view.release()
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                            return [match.groups() for match in pattern.finditer(mapped)]
+                    view.release()
+                    self._buffer.extend(bytes(max(size, 2 * length) + 1 - length))
+                    view = memoryview(self._buffer)
+                    while length < len(self._buffer):
+                        n = f.readinto(view[length:])
+                        if not n:
+                            break
+                        length += n
+                view.release()
+        except FileNotFoundError:
+            return None
+        return [match.groups() for match in pattern.finditer(self._buffer, 0, length)]
+    
+    def read_link(self, lnk_id: int) -> Optional[int]:
+        """读取.saitlnk的目标编号"""
+        matches = self._scan(f"{self._base}{lnk_id}.saitlnk", self._tarid_pattern)
+        if not matches:
+            return None
+        return int(matches[0][0])
+    
+    def link_targets(self, ids: Iterable[int]) -> Dict[int, int]:
+        """
+        读取指定编号中确实存在的.saitlnk
+        
+        Args:
+            ids: 编号
+        
+        Returns:
+            Dict[int, int]: {lnk编号: 目标编号}
+        """
+        link_ids = self._current_link_ids()
+        targets = {}
+        for lnk_id in ids:
+            if lnk_id in link_ids:
+                target = self.read_link(lnk_id)
+                if target is not None:
+                    targets[lnk_id] = target
+        return targets
+    
+    def _list_files(self) -> Tuple[List[int], set]:
+        """
+        列出nrm目录下的dat编号和lnk编号
+        
+        lnk编号按目录修改时间缓存，extract只需对确实存在的链接文件进行读取。
+        
+        Returns:
+            Tuple[List[int], set]: (dat编号列表, lnk编号集合)
+        """
+        dat_ids = []
+        link_ids = set()
+        with os.scandir(self.nrm_path) as it:
+            for entry in it:
+                stem, ext = os.path.splitext(entry.name)
+                if not stem.isdigit():
+                    continue
+                if ext == '.saitdat':
+                    dat_ids.append(int(stem))
+                elif ext == '.saitlnk':
+                    link_ids.add(int(stem))
+        self._link_ids = link_ids
+        return sorted(dat_ids), link_ids
+    
+    def _current_link_ids(self) -> set:
+        """返回缓存的lnk编号集合，目录有变化时重新列出"""
+        mtime = os.stat(self.nrm_path).st_mtime_ns
+        if mtime != self._listing_mtime:
+            self._list_files()
+            self._listing_mtime = mtime
+        return self._link_ids
+    
+    def _extract_row(self, dat_id: int) -> Optional[Dict[str, object]]:
+        """
+        提取单个dat的字段
+        
+        Args:
+            dat_id: dat编号
+        
+        Returns:
+            Optional[Dict[str, object]]: {字段: 值}，I类型的值转换为int，文件不存在返回None
+        """
+        matches = self._scan(f"{self._base}{dat_id}.saitdat", self._pattern)
+        if matches is None:
+            return None
+        row = {}
+        for key, kind, raw in matches:
+            key = key.decode('ascii')
+            if key in row:
+                continue  # 与逐行解析一致，只使用第一次出现的值
+            if kind in (b'I', b'i') and raw.lstrip(b'-').isdigit():
+                row[key] = int(raw)
+            else:
+                row[key] = self._decode(raw)
+        return row
+    
+    def extract(self, ids: Iterable[int], follow_links: bool = True) -> DatFieldTable:
+        """
+        提取指定编号的字段
+        
+        同编号的.saitlnk也会被读取；follow_links为True时，链接目标不在ids中的dat也会一并提取。
+        
+        Args:
+            ids: dat编号
+            follow_links: 是否提取链接目标
+        
+        Returns:
+            DatFieldTable: 提取结果，不存在的dat不会出现在表中
+        """
+        pending = sorted(set(ids))
+        link_ids = self._current_link_ids()
+        done = set()
+        rows: Dict[int, Dict[str, object]] = {}
+        links: Dict[int, int] = {}
+        
+        while pending:
+            next_pending = []
+            for dat_id in pending:
+                done.add(dat_id)
+                row = self._extract_row(dat_id)
+                if row is not None:
+                    rows[dat_id] = row
+                
+                # 没有dat的编号也尝试读取链接，避免目录列表缓存尚未反映新建的链接
+                target = self.read_link(dat_id) if dat_id in link_ids or row is None else None
+                if target is not None:
+                    links[dat_id] = target
+                    if follow_links and target not in done:
+                        next_pending.append(target)
+            pending = sorted(set(next_pending) - done)
+        
+        return self._to_table(rows, links)
+    
+    def extract_all(self) -> DatFieldTable:
+        """
+        一次提取整个笔刷库所有.saitdat和.saitlnk的字段
+        
+        Returns:
+            DatFieldTable: 提取结果
+        """
+        dat_ids, link_ids = self._list_files()
+        self._listing_mtime = os.stat(self.nrm_path).st_mtime_ns
+        
+        rows: Dict[int, Dict[str, object]] = {}
+        for dat_id in dat_ids:
+            row = self._extract_row(dat_id)
+            if row is not None:
+                rows[dat_id] = row
+        
+        links = {}
+        for lnk_id in sorted(link_ids):
+            target = self.read_link(lnk_id)
+            if target is not None:
+                links[lnk_id] = target
+        
+        return self._to_table(rows, links)
+    
+    def _to_table(self, rows: Dict[int, Dict[str, object]], links: Dict[int, int]) -> DatFieldTable:
+        """把逐文件结果转换为列"""
+        ids = np.array(sorted(rows), dtype=np.int64)
+        columns = {}
+        for key in self.keys:
+            values = [rows[int(dat_id)].get(key) for dat_id in ids]
+            present = [value for value in values if value is not None]
+            if present and all(isinstance(value, int) for value in present):
+                columns[key] = np.array([-1 if value is None else value for value in values], dtype=np.int64)
+            else:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+                columns[key] = column
+        return DatFieldTable(ids=ids, columns=columns, links=links)
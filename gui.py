@@ -1,10 +1,25 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, simpledialog
 from pathlib import Path
 from read_Systemax import BrushImporter, SystemaxReader
+from resource_index import RESOURCE_LABELS
 from config_manager import ConfigManager
+from search_index import BrushSearchIndex
+from brush_dedup import BrushDeduplicator
+from bulk_edit import BulkEditor, parse_conditions, parse_operations
+from resource_dedup import ResourceDeduplicator
+from sai_codec import SaiDocument
+from library_check import LibraryChecker
+from library_diff import LibraryDiffer
+from library_sync import LibrarySync
+from library_usage import LibraryUsage, USAGE_CATEGORIES, format_size
+from shadow_mirror import ShadowMirror
+from library_watcher import LibraryWatcher
+from snapshot_backup import SnapshotManager
+from thumbnail_cache import ThumbnailCache
+import bisect
 import os
-import shutil
+import queue
 import sys
 
 class SAIBrushTool:
@@ -37,10 +52,33 @@ class SAIBrushTool:
         self.nrm_path = None
         self.saitset_path = None
         
+        # 本地镜像（启用镜像模式时，上面的路径都指向镜像）
+        self.mirror = None
+        
+        # 导入/删除前的自动快照
+        self.snapshots = None
+        
         # 创建导入器和读取器
         self.importer = BrushImporter()
         self.reader = SystemaxReader()
         
+        # 正在分批插入文本的任务 {Text组件名: 任务标记}
+        self._insert_jobs = {}
+        
+        # 笔刷名称搜索索引，在后台逐组建立，导入/删除时增量更新
+        self.search_index = BrushSearchIndex()
+        self._index_builder = None
+        self._search_job = None
+        
+        # 笔刷库监视：后台线程把变化放入队列，由after()周期在主线程中处理
+        self.watcher = None
+        self._watch_queue = queue.Queue()
+        self._watch_job = None
+        
+        # 形状和纹理的缩略图缓存，选中笔刷组时延迟显示预览
+        self.thumbnails = ThumbnailCache(self.config.exe_dir / "thumbnail_cache")
+        self._preview_job = None
+        
         self._create_widgets()
         self._load_saved_path()
         
@@ -60,6 +98,16 @@ class SAIBrushTool:
         path_btn = ttk.Button(path_frame, text="选择", command=self._select_sai_path)
         path_btn.pack(side='left', padx=5)
         
+        self.mirror_var = tk.BooleanVar(value=self.config.get_shadow_mirror())
+        mirror_check = ttk.Checkbutton(path_frame, text="本地镜像模式（设置目录位于云同步文件夹时）",
+                                       variable=self.mirror_var, command=self._toggle_shadow_mirror)
+        mirror_check.pack(side='left', padx=5)
+        
+        self.watch_var = tk.BooleanVar(value=self.config.get_live_watch())
+        watch_check = ttk.Checkbutton(path_frame, text="监视笔刷库变化",
+                                      variable=self.watch_var, command=self._toggle_live_watch)
+        watch_check.pack(side='left', padx=5)
+        
         # 创建选项卡
         notebook = ttk.Notebook(self.root)
         notebook.pack(fill='both', expand=True, padx=10, pady=5)
@@ -110,6 +158,10 @@ class SAIBrushTool:
         scrollbar.pack(side='right', fill='y')
         self.import_text.configure(yscrollcommand=scrollbar.set)
         
+        # 形状与纹理预览
+        self.import_preview = ttk.LabelFrame(parent, text="形状与纹理预览", padding=5)
+        self.import_preview.pack(fill='x', pady=5)
+        
         # 导入按钮
         self.import_btn = ttk.Button(parent, text="导入笔刷组", command=self._import_brushes)
         self.import_btn.pack(pady=10)
@@ -128,18 +180,66 @@ class SAIBrushTool:
         refresh_btn = ttk.Button(toolbar, text="刷新结构", command=self._refresh_structure)
         refresh_btn.pack(side='left', padx=5)
         
+        graph_btn = ttk.Button(toolbar, text="导出依赖图", command=self._export_dependency_graph)
+        graph_btn.pack(side='left', padx=5)
+        
+        dedup_btn = ttk.Button(toolbar, text="查找重复笔刷", command=self._deduplicate_brushes)
+        dedup_btn.pack(side='left', padx=5)
+        
+        resource_dedup_btn = ttk.Button(toolbar, text="查找相似资源", command=self._deduplicate_resources)
+        resource_dedup_btn.pack(side='left', padx=5)
+        
+        bulk_edit_btn = ttk.Button(toolbar, text="批量修改参数", command=self._bulk_edit)
+        bulk_edit_btn.pack(side='left', padx=5)
+        
+        query_btn = ttk.Button(toolbar, text="参数查询", command=self._query_parameters)
+        query_btn.pack(side='left', padx=5)
+        
+        check_btn = ttk.Button(toolbar, text="检查笔刷库", command=self._check_library)
+        check_btn.pack(side='left', padx=5)
+        
+        sync_btn = ttk.Button(toolbar, text="同步笔刷库", command=self._sync_library)
+        sync_btn.pack(side='left', padx=5)
+        
+        usage_btn = ttk.Button(toolbar, text="磁盘占用", command=self._show_disk_usage)
+        usage_btn.pack(side='left', padx=5)
+        
+        restore_btn = ttk.Button(toolbar, text="恢复备份", command=self._show_snapshots)
+        restore_btn.pack(side='left', padx=5)
+        
         # 笔刷组列表和操作区域
         list_frame = ttk.LabelFrame(parent, text="笔刷组操作", padding=10)
         list_frame.pack(fill='x', pady=5)
         
-        # 创建笔刷组列表框
-        self.brush_listbox = tk.Listbox(list_frame, selectmode='multiple', height=6)
-        self.brush_listbox.pack(side='left', fill='both', expand=True, padx=5)
+        # 搜索框：按笔刷组、子笔刷或资源名称过滤列表
+        search_frame = ttk.Frame(list_frame)
+        search_frame.pack(side='top', fill='x', pady=(0, 5))
+        ttk.Label(search_frame, text="搜索:").pack(side='left', padx=5)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=40)
+        search_entry.pack(side='left', padx=5)
+        search_entry.bind('<KeyRelease>', self._on_search_changed)
+        
+        # 创建笔刷组树形列表：行以笔刷组序号为ID，只在滚动到附近时才创建，
+        # 子笔刷在展开笔刷组时才读取
+        self.brush_tree = ttk.Treeview(list_frame, columns=('number', 'count'), selectmode='extended', height=8)
+        self.brush_tree.heading('#0', text='名称')
+        self.brush_tree.heading('number', text='序号')
+        self.brush_tree.heading('count', text='笔刷数量')
+        self.brush_tree.column('number', width=80, anchor='center', stretch=False)
+        self.brush_tree.column('count', width=80, anchor='center', stretch=False)
+        self.brush_tree.pack(side='left', fill='both', expand=True, padx=5)
+        self.brush_tree.bind('<<TreeviewOpen>>', self._on_tree_open)
+        self.brush_tree.bind('<<TreeviewSelect>>', self._on_tree_select)
         
         # 添加滚动条
-        listbox_scroll = ttk.Scrollbar(list_frame, orient='vertical', command=self.brush_listbox.yview)
-        listbox_scroll.pack(side='right', fill='y')
-        self.brush_listbox.configure(yscrollcommand=listbox_scroll.set)
+        self.tree_scroll = ttk.Scrollbar(list_frame, orient='vertical', command=self.brush_tree.yview)
+        self.tree_scroll.pack(side='right', fill='y')
+        self.brush_tree.configure(yscrollcommand=self._on_tree_scroll)
+        
+        # 尚未创建行的笔刷组序号，以及已读取的笔刷组名称 {序号: 名称}
+        self._pending_groups = []
+        self._group_names = {}
         
         # 按钮框架
         button_frame = ttk.Frame(list_frame)
@@ -153,6 +253,10 @@ class SAIBrushTool:
         export_btn = ttk.Button(button_frame, text="导出选中的笔刷组", command=self._export_selected_brushes)
         export_btn.pack(side='left', padx=5)
         
+        # 选中笔刷组的形状与纹理预览
+        self.export_preview = ttk.LabelFrame(parent, text="形状与纹理预览", padding=5)
+        self.export_preview.pack(fill='x', pady=5)
+        
         # 使用Text组件显示结构
         self.export_text = tk.Text(structure_frame, wrap='word', height=20)
         self.export_text.pack(fill='both', expand=True)
@@ -257,15 +361,34 @@ SAI笔刷工具使用说明
             bool: 更新是否成功
         """
         try:
+            # 验证路径
+            real_path = Path(path)
+            real_saitset = real_path / "SAIv2" / "settings" / "custool" / "nrm" / "_0.saitset"
+            if not real_saitset.exists():
+                messagebox.showerror("错误", "无效的SAI路径")
+                return False
+            
+            # 镜像模式下所有读写都在本地镜像中进行
+            if self.config.get_shadow_mirror():
+                self.status_var.set("正在同步本地镜像...")
+                self.root.update_idletasks()
+                self.mirror = ShadowMirror(real_path, self.config.exe_dir / "settings_mirror")
+                self.mirror.refresh()
+                working_path = self.mirror.mirror_root
+            else:
+                self.mirror = None
+                working_path = real_path
+            
             # 更新基础路径
-            self.sai_path = Path(path)
+            self.sai_path = working_path
             self.nrm_path = self.sai_path / "SAIv2" / "settings" / "custool" / "nrm"
             self.saitset_path = self.nrm_path / "_0.saitset"
             
-            # 验证路径
-            if not self.nrm_path.exists() or not self.saitset_path.exists():
-                messagebox.showerror("错误", "无效的SAI路径")
-                return False
+            snapshot_settings = self.config.get_snapshot_settings()
+            self.snapshots = SnapshotManager(self.sai_path, self.config.exe_dir / "backups",
+                                             keep_last=snapshot_settings['keep_last'],
+                                             keep_daily=snapshot_settings['keep_daily'],
+                                             journal=self.reader.journal)
             
             # 更新导入器设置
             self.importer.sai_path = self.sai_path
@@ -275,24 +398,252 @@ SAI笔刷工具使用说明
             # 更新读取器设置
             self.reader.folder_path = str(self.sai_path)
             self.reader.saitset_path = str(self.saitset_path)
-            self.reader._base_path = str(self.nrm_path)
+            self.reader.library_path = self.nrm_path
             
-            # 初始化读取器
+            # 初始化读取器（笔刷数据由_refresh_structure逐组读取）
             self.reader.initialize()
-            self.reader.read_all_brushes()
             
             # 保存路径到配置
-            self.config.set_sai_path(str(self.sai_path))
+            self.config.set_sai_path(str(real_path))
             self.status_var.set("SAI路径已更新")
             
             # 刷新笔刷结构显示
             self._refresh_structure()
             
+            # 重新建立搜索索引
+            self._build_search_index()
+            
+            # 重新开始监视新的路径
+            self._start_watcher()
+            
             return True
             
         except Exception as e:
             print(f"更新SAI路径时发生错误: {str(e)}")
             return False
+    
+    def _toggle_shadow_mirror(self):
+        """切换本地镜像模式"""
+        if self.mirror:
+            self._commit_mirror()
+        self.config.set_shadow_mirror(self.mirror_var.get())
+        if self.path_var.get():
+            self._update_sai_path(self.path_var.get())
+    
+    def _toggle_live_watch(self):
+        """切换笔刷库监视"""
+        self.config.set_live_watch(self.watch_var.get())
+        self._start_watcher()
+    
+    def _start_watcher(self):
+        """按当前设置启动或停止笔刷库监视"""
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+        if self._watch_job is not None:
+            self.root.after_cancel(self._watch_job)
+            self._watch_job = None
+        if not self.watch_var.get() or not self.sai_path:
+            return
+        
+        # 镜像模式下监视真实的设置目录，变化时先同步到镜像
+        watch_root = self.mirror.real_root if self.mirror else self.sai_path
+        self.watcher = LibraryWatcher(watch_root, self._watch_queue.put)
+        if self.watcher.start():
+            self.status_var.set(f"正在监视笔刷库变化（{self.watcher.mode}）")
+            self._watch_job = self.root.after(300, self._poll_watch_queue)
+        else:
+            self.watcher = None
+    
+    def _poll_watch_queue(self):
+        """在主线程中取出监视线程报告的变化"""
+        changes = set()
+        while True:
+            try:
+                changes |= self._watch_queue.get_nowait()
+            except queue.Empty:
+                break
+        if changes:
+            try:
+                self._apply_library_changes(changes)
+            except Exception as e:
+                print(f"更新笔刷库变化时发生错误: {str(e)}")
+        self._watch_job = self.root.after(300, self._poll_watch_queue)
+    
+    def _apply_library_changes(self, changes: set):
+        """
+        把笔刷库的变化应用到读取器、树形列表和搜索索引，只更新受影响的笔刷组
+        
+        Args:
+            changes: 变化文件的相对路径集合
+        """
+        if self.mirror:
+            self.mirror.refresh()
+        
+        affected = self.reader.apply_changes(changes)
+        for group_number in sorted(affected):
+            self._update_tree_row(group_number)
+            self.search_index.index_group(self.reader, group_number)
+        
+        resource_changes = [path for path in changes if not path.startswith('custool/nrm/')]
+        status = f"检测到笔刷库变化，已更新 {len(affected)} 个笔刷组"
+        if resource_changes:
+            status += f"，{len(resource_changes)} 个资源文件有变化"
+        self.status_var.set(status)
+    
+    def _update_tree_row(self, group_number: int):
+        """重新读取一个笔刷组并更新（或添加、删除）它在树形列表中的行"""
+        iid = str(group_number)
+        summary = self.reader.read_group_summary(group_number)
+        if summary is None:
+            # 笔刷组已被删除
+            if self.brush_tree.exists(iid):
+                self.brush_tree.delete(iid)
+            if group_number in self._pending_groups:
+                self._pending_groups.remove(group_number)
+            self._group_names.pop(group_number, None)
+            return
+        
+        group_name, count = summary
+        self._group_names[group_number] = group_name
+        if self.brush_tree.exists(iid):
+            # 子笔刷重新改为占位项，展开时再读取
+            self.brush_tree.item(iid, text=group_name, values=(group_number, count), open=False)
+            self.brush_tree.delete(*self.brush_tree.get_children(iid))
+            if count:
+                self.brush_tree.insert(iid, tk.END, iid=f"{group_number}/loading", text="加载中...")
+            return
+        
+        if self.search_var.get().strip() or group_number in self._pending_groups:
+            return  # 搜索结果不自动加入新笔刷组；尚未创建的行在滚动到时再读取
+        
+        loaded = [int(item) for item in self.brush_tree.get_children('')]
+        if self._pending_groups and (not loaded or group_number > loaded[-1]):
+            bisect.insort(self._pending_groups, group_number)
+            return
+        
+        position = bisect.bisect(loaded, group_number)
+        item = self.brush_tree.insert('', position, iid=iid, text=group_name, values=(group_number, count))
+        if count:
+            self.brush_tree.insert(item, tk.END, iid=f"{group_number}/loading", text="加载中...")
+    
+    def _take_snapshot(self, label: str, parent=None) -> bool:
+        """
+        在修改笔刷库之前创建快照（未启用自动快照时不做任何事）
+        
+        Args:
+            label: 快照说明
+            parent: 错误提示的父窗口
+        
+        Returns:
+            bool: 是否可以继续修改；启用了自动快照但创建失败时返回False，调用方应取消操作
+        """
+        if not self.snapshots or not self.config.get_snapshot_settings()['enabled']:
+            return True
+        self.status_var.set("正在创建快照...")
+        self.root.update_idletasks()
+        if self.snapshots.create(label) is None:
+            self.status_var.set("创建快照失败，已取消操作")
+            messagebox.showerror("错误", "创建快照失败，为避免无法恢复，已取消本次操作。", parent=parent)
+            return False
+        return True
+    
+    def _show_snapshots(self):
+        """显示快照列表，恢复整个设置目录或单个笔刷组"""
+        if not self.snapshots:
+            messagebox.showwarning("警告", "请先选择有效的SAI路径")
+            return
+        snapshots = self.snapshots.list_snapshots()
+        if not snapshots:
+            messagebox.showinfo("恢复备份", "还没有任何快照")
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("恢复备份")
+        listbox = tk.Listbox(window, width=70, height=15)
+        listbox.pack(fill='both', expand=True, padx=10, pady=5)
+        for snapshot in snapshots:
+            listbox.insert(tk.END, f"{snapshot['name']}  {snapshot['label']}  "
+                                   f"（{snapshot['files']} 个文件，新增 {snapshot['copied_bytes']} 字节）")
+        
+        def selected_name():
+            selection = listbox.curselection()
+            if not selection:
+                messagebox.showwarning("警告", "请先选择一个快照", parent=window)
+                return None
+            return snapshots[selection[0]]['name']
+        
+        def restore_all():
+            name = selected_name()
+            if not name or not messagebox.askyesno(
+                    "确认", f"确定要把整个笔刷库恢复到快照 {name} 吗？\n当前状态会先保存为新的快照。", parent=window):
+                return
+            ok = self.snapshots.restore(name)
+            window.destroy()
+            self._after_restore(ok)
+        
+        def restore_group():
+            name = selected_name()
+            if not name:
+                return
+            selections = self._selected_group_numbers()
+            group_number = simpledialog.askinteger("恢复笔刷组", "要恢复的笔刷组序号：", parent=window,
+                                                   initialvalue=selections[0] if selections else None,
+                                                   minvalue=1)
+            if group_number is None:
+                return
+            ok = self.snapshots.restore_group(name, group_number)
+            window.destroy()
+            self._after_restore(ok)
+        
+        def compare():
+            name = selected_name()
+            if not name:
+                return
+            differ = LibraryDiffer(SystemaxReader.from_path(self.snapshots.backup_root / name),
+                                   SystemaxReader.from_path(self.sai_path),
+                                   self.config.exe_dir / "fingerprint_cache")
+            report = differ.generate_report(differ.diff())
+            
+            report_window = tk.Toplevel(window)
+            report_window.title(f"快照 {name} 与当前笔刷库的差异")
+            report_text = tk.Text(report_window, wrap='word', width=80, height=30)
+            report_text.pack(fill='both', expand=True, padx=10, pady=5)
+            report_text.insert('1.0', report)
+            report_text.config(state='disabled')
+        
+        button_frame = ttk.Frame(window)
+        button_frame.pack(pady=5)
+        ttk.Button(button_frame, text="恢复整个笔刷库", command=restore_all).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="只恢复一个笔刷组", command=restore_group).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="与当前笔刷库比较", command=compare).pack(side='left', padx=5)
+    
+    def _after_restore(self, ok: bool):
+        """恢复快照后推送修改并刷新显示"""
+        if ok:
+            self._commit_mirror()
+            messagebox.showinfo("成功", "已从快照恢复")
+        else:
+            messagebox.showerror("错误", "从快照恢复失败，详细信息见控制台输出")
+        self._refresh_structure()
+        self._build_search_index()
+    
+    def _commit_mirror(self):
+        """把镜像中的修改推送到SAI设置目录，未启用镜像模式时不做任何事"""
+        if not self.mirror:
+            return
+        self.status_var.set("正在推送修改到SAI设置目录...")
+        self.root.update_idletasks()
+        changed = self.mirror.commit()
+        self.status_var.set(f"已推送 {changed} 个文件的修改")
+        if self.mirror.conflicts:
+            shown = '\n'.join(self.mirror.conflicts[:20])
+            if len(self.mirror.conflicts) > 20:
+                shown += f"\n……（还有 {len(self.mirror.conflicts) - 20} 个文件）"
+            messagebox.showwarning(
+                "推送冲突",
+                f"以下文件在SAI设置目录中已被其他程序修改，本次修改没有推送，将以SAI设置目录中的版本为准：\n{shown}"
+            )
             
     def _select_sai_path(self):
         """选择SAI路径"""
@@ -327,24 +678,71 @@ SAI笔刷工具使用说明
                 
             # 显示笔刷组结构
             self.import_text.delete('1.0', tk.END)
-            structure = self.importer.generate_text_structure()
-            self.import_text.insert('1.0', structure)
+            self.import_btn.state(['disabled'])
+            self._insert_chunks(self.import_text, self.importer.iter_text_structure(),
+                                self._on_import_structure_loaded)
             
-            if structure != "没有找到笔刷数据":
-                self.import_btn.state(['!disabled'])
-                self.status_var.set("笔刷组已加载")
-            else:
-                self.import_btn.state(['disabled'])
-                self.status_var.set("无法读取笔刷组数据")
+    def _on_import_structure_loaded(self):
+        """导入笔刷组结构显示完毕后更新按钮状态"""
+        if self.importer.brush_data:
+            self.import_btn.state(['!disabled'])
+            self.status_var.set("笔刷组已加载")
+            resources = self.importer.plan.resources if self.importer.plan else {}
+            self._show_thumbnails(self.import_preview,
+                                  [path for rel_dir in sorted(resources) for path in resources[rel_dir]])
+        else:
+            self.import_btn.state(['disabled'])
+            self.status_var.set("无法读取笔刷组数据")
+    
+    def _insert_chunks(self, text_widget, chunks, on_done=None, batch: int = 20):
+        """
+        分批把文本块插入Text组件，每个after()周期插入batch块，避免界面卡顿
+        
+        对同一组件再次调用时，尚未完成的旧任务会被放弃。
+        
+        Args:
+            text_widget: 目标Text组件
+            chunks: 产生文本块的迭代器
+            on_done: 全部插入后调用的回调
+            batch: 每个周期插入的文本块数量
+        """
+        job = object()
+        self._insert_jobs[str(text_widget)] = job
+        
+        def step():
+            if self._insert_jobs.get(str(text_widget)) is not job:
+                return
+            try:
+                for _ in range(batch):
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        del self._insert_jobs[str(text_widget)]
+                        if on_done:
+                            on_done()
+                        return
+                    text_widget.insert(tk.END, chunk)
+            except Exception as e:
+                del self._insert_jobs[str(text_widget)]
+                error_msg = f"显示结构时发生错误: {str(e)}"
+                print(error_msg)
+                self.status_var.set(error_msg)
+                return
+            self.root.after(1, step)
+        
+        self.root.after_idle(step)
                 
     def _import_brushes(self):
         """导入笔刷组"""
         if messagebox.askyesno("确认", "是否要导入这个笔刷组？"):
             try:
+                if not self._take_snapshot("导入前"):
+                    return
                 if self.importer.import_brushes():
+                    self._commit_mirror()
                     messagebox.showinfo("成功", "笔刷组导入成功！")
                     self.status_var.set("导入完成")
-                    self._refresh_structure()  # 刷新笔刷结构
+                    self._refresh_structure([self.importer.imported_grp_number])  # 刷新笔刷结构
+                    self.search_index.index_group(self.reader, self.importer.imported_grp_number)
                 else:
                     messagebox.showerror("错误", "笔刷组导入失败")
                     self.status_var.set("导入失败")
@@ -352,48 +750,38 @@ SAI笔刷工具使用说明
                 messagebox.showerror("错误", f"导入过程中发生错误：{str(e)}")
                 self.status_var.set("导入出错")
                 
-    def _refresh_structure(self):
-        """刷新笔刷结构显示"""
+    def _refresh_structure(self, changed_groups=None):
+        """
+        刷新笔刷结构显示
+        
+        Args:
+            changed_groups: 本程序修改过的笔刷组序号，None表示修改范围不确定
+        """
         try:
             if not self.sai_path or not self.sai_path.exists():
                 self.status_var.set("请先选择有效的SAI路径")
                 return
                 
             self.export_text.delete('1.0', tk.END)
-            self.brush_listbox.delete(0, tk.END)  # 清空列表框
+            self.brush_tree.delete(*self.brush_tree.get_children())  # 清空树形列表
+            self._group_names = {}
             
-            # 重新初始化读取器
-            self.reader = SystemaxReader()
-            self.reader.folder_path = str(self.sai_path)
-            self.reader.saitset_path = str(self.saitset_path)
-            self.reader._base_path = str(self.nrm_path)
+            # 镜像模式下先同步SAI在外部所做的修改
+            if self.mirror:
+                self.mirror.refresh()
             
-            # 初始化并读取所有笔刷
+            # 保留读取器的缓存，只让修改过的笔刷组重新读取
+            self.reader.invalidate_references(changed_groups)
+            
+            # 初始化并逐组读取笔刷，结构文本分批插入
             if self.reader.initialize():
-                self.reader.read_all_brushes()
-                structure = self.reader.generate_text_structure()
+                self.status_var.set("正在读取笔刷结构...")
+                self._insert_chunks(self.export_text, self.reader.iter_text_structure(),
+                                    lambda: self.status_var.set("笔刷结构已刷新"))
                 
-                if structure:
-                    self.export_text.insert('1.0', structure)
-                    self.status_var.set("笔刷结构已刷新")
-                    
-                    # 更新笔刷组列表
-                    for group_number in range(1, 1000):  # 假设最大1000个笔刷组
-                        group_info = self.reader.get_brush_group_info(group_number)
-                        if group_info:
-                            # 读取笔刷组名称
-                            grp_content = group_info['grp_path'].read_text(encoding='utf-8')
-                            name_line = next((line for line in grp_content.splitlines() if line.startswith('name=')), None)
-                            group_name = name_line.split('=')[1] if name_line else f"group_{group_number}"
-                            
-                            # 移除名称中的"U:"前缀
-                            if group_name.startswith("U:"):
-                                group_name = group_name[2:]
-                            
-                            self.brush_listbox.insert(tk.END, f"{group_number}: {group_name}")
-                else:
-                    self.export_text.insert('1.0', "没有找到笔刷数据")
-                    self.status_var.set("无法读取笔刷数据")
+                # 更新笔刷组列表：只列目录，行在滚动到附近时才创建
+                self._pending_groups = self._filtered_group_numbers()
+                self._load_tree_page()
             else:
                 self.export_text.insert('1.0', "初始化读取器失败")
                 self.status_var.set("初始化失败")
@@ -404,119 +792,255 @@ SAI笔刷工具使用说明
             self.status_var.set(error_msg)
             self.export_text.insert('1.0', "刷新结构时发生错误")
                 
+    def _load_tree_page(self, page_size: int = 100):
+        """为接下来的一页笔刷组创建树形列表行"""
+        page = self._pending_groups[:page_size]
+        del self._pending_groups[:page_size]
+        
+        for group_number in page:
+            summary = self.reader.read_group_summary(group_number)
+            if not summary:
+                continue
+            group_name, count = summary
+            self._group_names[group_number] = group_name
+            item = self.brush_tree.insert('', tk.END, iid=str(group_number), text=group_name,
+                                          values=(group_number, count))
+            # 占位子项，使笔刷组可以展开；展开时再替换为真实的子笔刷
+            if count:
+                self.brush_tree.insert(item, tk.END, iid=f"{group_number}/loading", text="加载中...")
+    
+    def _on_tree_scroll(self, first, last):
+        """滚动条回调：接近底部时创建下一页行"""
+        self.tree_scroll.set(first, last)
+        if self._pending_groups and float(last) > 0.9:
+            self.root.after_idle(self._load_tree_page)
+    
+    def _on_tree_open(self, event):
+        """展开笔刷组时读取其子笔刷"""
+        item = self.brush_tree.focus()
+        placeholder = f"{item}/loading"
+        if not self.brush_tree.exists(placeholder):
+            return
+        self.brush_tree.delete(placeholder)
+        
+        brush_data = self.reader.read_brush_data(int(item))
+        if not brush_data:
+            return
+        for idx, sub_name in sorted(brush_data.sub_brushes.items()):
+            self.brush_tree.insert(item, tk.END, iid=f"{item}/{idx}", text=sub_name, values=('', idx))
+    
+    def _on_tree_select(self, event=None):
+        """选中项变化时延迟显示预览，合并连续的选择（例如按住方向键滚动）"""
+        if self._preview_job is not None:
+            self.root.after_cancel(self._preview_job)
+        self._preview_job = self.root.after(150, self._show_group_preview)
+    
+    def _show_group_preview(self):
+        """显示第一个选中的笔刷组所用的形状和纹理"""
+        self._preview_job = None
+        group_numbers = self._selected_group_numbers()
+        if not group_numbers:
+            self._show_thumbnails(self.export_preview, [])
+            return
+        
+        resources = self.reader.get_brush_resource_files(group_numbers[0])
+        resource_index = self.reader.get_resource_index()
+        paths = []
+        for rel_dir in sorted(resources):
+            for name in sorted(resources[rel_dir]):
+                entry = resource_index.find(rel_dir, name)
+                if entry is not None:
+                    paths.append(entry.path)
+        self._show_thumbnails(self.export_preview, paths)
+    
+    def _show_thumbnails(self, frame, paths, limit: int = 12):
+        """
+        在frame中显示BMP文件的缩略图（缩略图来自缓存，同一个文件不会重复解码）
+        
+        Args:
+            frame: 显示缩略图的框架，原有内容会被清除
+            paths: 资源文件路径，非BMP文件会被忽略
+            limit: 最多显示的数量
+        """
+        for child in frame.winfo_children():
+            child.destroy()
+        
+        bmp_paths = [path for path in paths if path.suffix.lower() == '.bmp']
+        for path, data in self.thumbnails.get_many(bmp_paths[:limit]):
+            try:
+                image = tk.PhotoImage(data=data)
+            except tk.TclError as e:
+                print(f"显示缩略图失败 {path.name}: {str(e)}")
+                continue
+            label = ttk.Label(frame, image=image, text=path.stem, compound='top')
+            label.image = image  # 保留引用，否则图像会被回收
+            label.pack(side='left', padx=3)
+        
+        if not bmp_paths:
+            ttk.Label(frame, text="没有形状或纹理文件").pack(side='left')
+        elif len(bmp_paths) > limit:
+            ttk.Label(frame, text=f"……共 {len(bmp_paths)} 个").pack(side='left', padx=3)
+    
+    def _build_search_index(self):
+        """在after()周期中逐组建立搜索索引，避免阻塞界面"""
+        self.search_index = BrushSearchIndex()
+        builder = self.search_index.iter_build(self.reader)
+        self._index_builder = builder
+        
+        def step():
+            if self._index_builder is not builder:
+                return
+            try:
+                for _ in range(20):
+                    if next(builder, None) is None:
+                        self._index_builder = None
+                        if self.search_var.get().strip():
+                            self._apply_search()
+                        return
+            except Exception as e:
+                self._index_builder = None
+                print(f"建立搜索索引时发生错误: {str(e)}")
+                return
+            self.root.after(1, step)
+        
+        self.root.after_idle(step)
+    
+    def _on_search_changed(self, event=None):
+        """搜索框内容变化时延迟执行搜索，合并连续的按键"""
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(200, self._apply_search)
+    
+    def _filtered_group_numbers(self) -> list:
+        """获取当前搜索条件下应显示的笔刷组序号"""
+        query = self.search_var.get().strip()
+        if not query:
+            return self.reader.list_group_numbers()
+        return self.search_index.search_groups(query)
+    
+    def _apply_search(self):
+        """按搜索框内容重新填充笔刷组列表"""
+        self._search_job = None
+        self.brush_tree.delete(*self.brush_tree.get_children())
+        self._pending_groups = self._filtered_group_numbers()
+        self._load_tree_page()
+        
+        if self.search_var.get().strip():
+            status = f"找到 {len(self._pending_groups) + len(self.brush_tree.get_children())} 个笔刷组"
+            if self._index_builder is not None:
+                status += "（索引建立中，结果可能不完整）"
+            self.status_var.set(status)
+    
+    def _selected_group_numbers(self) -> list:
+        """获取选中的笔刷组序号（选中子笔刷时视为选中其所属笔刷组）"""
+        group_numbers = []
+        for item in self.brush_tree.selection():
+            group_number = int(item.split('/')[0])
+            if group_number not in group_numbers:
+                group_numbers.append(group_number)
+        return group_numbers
+    
     def _delete_brush_group(self):
-        """删除选中的笔刷组"""
+        """删除选中的笔刷组（所有选中的笔刷组一起确认，一次删除）"""
         try:
             # 获取选中的项目
-            selections = self.brush_listbox.curselection()
+            selections = self._selected_group_numbers()
             if not selections:
                 messagebox.showwarning("警告", "请先选择要删除的笔刷组")
                 return
             
-            for index in selections:
-                # 从列表项文本中提取笔刷组序号
-                item_text = self.brush_listbox.get(index)
-                group_number = int(item_text.split(':')[0])
-                group_name = item_text.split(':', 1)[1].strip()
-                
-                # 获取笔刷组信息
-                group_info = self.reader.get_brush_group_info(group_number)
-                if not group_info:
+            groups = []
+            for group_number in selections:
+                if self.reader.get_brush_group_info(group_number):
+                    groups.append(group_number)
+                else:
                     messagebox.showerror("错误", f"找不到笔刷组 {group_number}")
-                    continue
+            if not groups:
+                return
                 
-                # 获取相关的资源文件信息
-                resource_files = self.reader.get_brush_resource_files(group_number)
+            # 按所有选中的笔刷组一起计算：只被这些笔刷组共用的dat也会被删除
+            references = self.reader.scan_references()
+            removable = references.removable_files(groups)
+            group_dats = {name for group_number in groups for name in references.group_files(group_number)
+                          if name.endswith('.saitdat')}
+            shared = sorted((name for name in group_dats if name not in removable),
+                            key=lambda name: int(name[:-len('.saitdat')]))
                 
-                # 构建确认消息
-                confirm_msg = f"确定要删除笔刷组 {group_number}: {group_name} 吗？\n"
-                confirm_msg += f"这将删除以下文件：\n"
+            def dat_label(name: str) -> str:
+                """读取dat中的笔刷名称（按文件原有的编码解析）"""
+                document = SaiDocument.load(Path(self.nrm_path) / name)
+                brush_name = document.get('name') if document is not None else None
+                return f"- {name} ({brush_name if brush_name is not None else name[:-len('.saitdat')]})"
                 
-                # 显示grp文件及其包含的笔刷名称
-                grp_content = group_info['grp_path'].read_text(encoding='utf-8')
-                brush_names = []
-                current_section = None
+            def limited(lines: list, limit: int = 30) -> list:
+                return lines[:limit] + ([f"……（还有 {len(lines) - limit} 个）"] if len(lines) > limit else [])
                 
-                # 读取每个.saitdat文件的名称
-                dat_brush_names = {}
-                for dat_number in group_info['dat_numbers']:
-                    dat_path = Path(self.nrm_path) / f"{dat_number}.saitdat"
-                    if dat_path.exists():
-                        try:
-                            with open(dat_path, 'r', encoding='utf-8') as f:
-                                dat_content = f.read()
-                                for line in dat_content.splitlines():
-                                    if line.startswith('name='):
-                                        name = line.split('=')[1]
-                                        if name.startswith('U:'):
-                                            name = name[2:]
-                                        dat_brush_names[dat_number] = name
-                                        break
-                        except:
-                            dat_brush_names[dat_number] = f"笔刷{dat_number}"
+            # 相关的资源文件（合并所有选中的笔刷组）
+            resource_files = {}
+            for group_number in groups:
+                for rel_dir, files in self.reader.get_brush_resource_files(group_number).items():
+                    resource_files.setdefault(rel_dir, set()).update(files)
+            has_resources = any(resource_files.values())
                 
-                confirm_msg += f"- {group_info['grp_path'].name} (笔刷组：{group_name})\n"
+            # 构建确认消息
+            confirm_msg = f"确定要删除以下 {len(groups)} 个笔刷组吗？\n"
+            confirm_msg += "\n".join(limited([f"- _{group_number}.saitgrp "
+                                               f"({self._group_names.get(group_number, f'group_{group_number}')})"
+                                               for group_number in groups]))
+            if removable:
+                confirm_msg += "\n\n这将删除以下文件：\n"
+                confirm_msg += "\n".join(limited([f"- {name} (链接)" if name.endswith('.saitlnk') else dat_label(name)
+                                                   for name in removable]))
+            if shared:
+                confirm_msg += "\n\n以下笔刷仍被其他笔刷组使用，将保留：\n"
+                confirm_msg += "\n".join(limited([dat_label(name) for name in shared]))
+            if has_resources:
+                # 根据路径显示资源类型
+                confirm_msg += "\n\n这些笔刷组关联以下资源文件：\n"
+                confirm_msg += "\n".join(limited([f"- {rel_dir}/{file} ({RESOURCE_LABELS.get(rel_dir, '其他')})"
+                                                   for rel_dir, files in resource_files.items()
+                                                   for file in sorted(files)]))
                 
-                # 显示dat文件及其对应的笔刷名称
-                for dat_number in group_info['dat_numbers']:
-                    brush_name = dat_brush_names.get(dat_number, f"笔刷{dat_number}")
-                    confirm_msg += f"- {dat_number}.saitdat ({brush_name})\n"
+            if not messagebox.askyesno("确认删除", confirm_msg):
+                return
                 
-                # 显示资源文件信息
-                has_resources = any(files for files in resource_files.values())
-                if has_resources:
-                    confirm_msg += "\n该笔刷组关联以下资源文件：\n"
-                    for path, files in resource_files.items():
-                        if files:
-                            # 根据路径显示资源类型
-                            resource_type = {
-                                'brushfom/blotmap': '形状',
-                                'brushfom/bristle': '笔触',
-                                'brushfom/brshape': '笔形',
-                                'scatter': '散布',
-                                'brushtex': '纹理'
-                            }.get(path, '其他')
+            # 如果有资源文件，询问是否一并删除
+            delete_resources = False
+            if has_resources:
+                delete_resources = messagebox.askyesno(
+                    "删除资源文件",
+                    "是否同时删除相关的材质和形状文件？\n"
+                    "注意：如果其他笔刷组也在使用这些文件，删除后可能会影响其他笔刷组的显示。"
+                )
                             
-                            for file in files:
-                                confirm_msg += f"- {path}/{file} ({resource_type})\n"
-            
-                if not messagebox.askyesno("确认删除", confirm_msg):
-                    continue
-            
-                # 如果有资源文件，询问是否一并删除
-                delete_resources = False
-                if has_resources:
+                # 如果用户选择删除资源文件，进行二次确认
+                if delete_resources:
                     delete_resources = messagebox.askyesno(
-                        "删除资源文件",
-                        "是否同时删除相关的材质和形状文件？\n"
-                        "注意：如果其他笔刷组也在使用这些文件，删除后可能会影响其他笔刷组的显示。"
+                        "！！危险操作确认！！",
+                        "【警告】您真的要删除全部相关的形状和材质文件吗？\n\n"
+                        "这个操作不可撤销，可能会影响其他笔刷组的显示。\n"
+                        "建议您在操作前备份 SAI2 的设置文件夹。",
+                        icon='warning'
                     )
                     
-                    # 如果用户选择删除资源文件，进行二次确认
-                    if delete_resources:
-                        second_confirm = messagebox.askyesno(
-                            "！！危险操作确认！！",
-                            "【警告】您真的要删除全部相关的形状和材质文件吗？\n\n"
-                            "这个操作不可撤销，可能会影响其他笔刷组的显示。\n"
-                            "建议您在操作前备份 SAI2 的设置文件夹。",
-                            icon='warning'
-                        )
-                        # 如果用户在二次确认时选择否，则取消删除资源文件
-                        if not second_confirm:
-                            delete_resources = False
-            
-                # 执行删除
-                if self.reader.delete_brush_group(group_number):
-                    # 如果用户确认删除资源文件
-                    if delete_resources:
-                        self.reader.delete_brush_resources(resource_files)
-                        messagebox.showinfo("成功", f"笔刷组 {group_number} 和相关资源文件已删除")
-                    else:
-                        messagebox.showinfo("成功", f"笔刷组 {group_number} 删除成功")
+            # 执行删除（删除前创建一次快照）；资源文件与笔刷组在同一次操作中删除
+            if not self._take_snapshot(f"删除笔刷组 {', '.join(map(str, groups))} 前"):
+                return
+            if self.reader.delete_brush_groups(groups, resource_files if delete_resources else None):
+                for group_number in groups:
+                    self.search_index.remove_group(group_number)
+                if delete_resources:
+                    messagebox.showinfo("成功", f"已删除 {len(groups)} 个笔刷组及相关资源文件")
                 else:
-                    messagebox.showerror("错误", f"删除笔刷组 {group_number} 失败")
+                    messagebox.showinfo("成功", f"已删除 {len(groups)} 个笔刷组")
+            else:
+                messagebox.showerror("错误", f"删除笔刷组 {', '.join(map(str, groups))} 失败")
             
-            self._refresh_structure()  # 刷新显示
+            self._commit_mirror()
+            self._refresh_structure(groups)  # 刷新显示
+            for group_number in groups:
+                if not self.reader.read_group_summary(group_number):
+                    self.search_index.remove_group(group_number)
             
         except Exception as e:
             messagebox.showerror("错误", f"删除过程中发生错误：{str(e)}")
@@ -525,206 +1049,21 @@ SAI笔刷工具使用说明
         """导出选中的笔刷组"""
         try:
             # 获取选中的项目
-            selections = self.brush_listbox.curselection()
+            selections = self._selected_group_numbers()
             if not selections:
                 messagebox.showwarning("警告", "请先选择要导出的笔刷组")
                 return
             
-            # 创建导出基础目录（在exe同目录下）
-            if getattr(sys, 'frozen', False):
-                exe_dir = Path(os.path.dirname(sys.executable))
-            else:
-                exe_dir = Path(os.path.dirname(os.path.abspath(__file__)))
-            
-            export_base_path = exe_dir / "exported_brushes"
-            export_base_path.mkdir(exist_ok=True)
-            
             # 确保读取器已正确初始化
             if not self.reader.initialize():
                 messagebox.showerror("错误", "读取器初始化失败")
                 return
             
-            # 导出每个选中的笔刷组
-            success_count = 0
-            failed_groups = []
-            
-            for index in selections:
-                # 从列表项文本中提取笔刷组序号
-                item_text = self.brush_listbox.get(index)
-                group_number = int(item_text.split(':')[0])
-                group_name = item_text.split(':', 1)[1].strip()
-                
-                try:
-                    # 创建该笔刷组的导出目录
-                    safe_name = group_name.replace(':', '_').replace('/', '_').replace('\\', '_')
-                    export_path = export_base_path / f"group_{group_number}_{safe_name}"
-                    export_path.mkdir(parents=True, exist_ok=True)
-                    
-                    # 获取笔刷组信息
-                    group_info = self.reader.get_brush_group_info(group_number)
-                    if not group_info:
-                        failed_groups.append(group_number)
-                        continue
-                    
-                    # 读取原始grp文件内容
-                    grp_file = group_info['grp_path']
-                    grp_content = grp_file.read_text(encoding='utf-8')
-                    
-                    # 解析grp文件内容
-                    sections = grp_content.split('.')
-                    header_section = []
-                    mapping_section = []
-                    actual_dats = set()  # 需要复制的实际dat文件集合
-                    
-                    # 处理头部信息
-                    if len(sections) > 1:
-                        header_lines = sections[0].strip().splitlines()
-                        for line in header_lines:
-                            line = line.strip()
-                            if line:
-                                header_section.append(line)
-                    
-                    # 处理映射部分
-                    mapping_lines = sections[1].strip().splitlines()
-                    for line in mapping_lines:
-                        line = line.strip()
-                        if '=' in line:
-                            index, dat_value = line.split('=')
-                            try:
-                                original_dat = int(dat_value)
-                                # 检查是否存在链接文件
-                                lnk_path = Path(self.nrm_path) / f"{original_dat}.saitlnk"
-                                if lnk_path.exists():
-                                    try:
-                                        lnk_content = lnk_path.read_text(encoding='utf-8')
-                                        for lnk_line in lnk_content.splitlines():
-                                            if lnk_line.startswith('tarid='):
-                                                _, target_value = lnk_line.split('=', 1)
-                                                if target_value.startswith('I:'):
-                                                    target_value = target_value[2:]
-                                                actual_dat = int(target_value.strip())
-                                                mapping_section.append(f"{index}={actual_dat}")
-                                                actual_dats.add(actual_dat)
-                                                break
-                                        else:
-                                            mapping_section.append(line)
-                                            actual_dats.add(original_dat)
-                                    except Exception as e:
-                                        print(f"读取链接文件出错 {lnk_path}: {e}")
-                                        mapping_section.append(line)
-                                        actual_dats.add(original_dat)
-                                else:
-                                    mapping_section.append(line)
-                                    actual_dats.add(original_dat)
-                            except ValueError:
-                                mapping_section.append(line)
-                    
-                    # 构建新的grp文件内容
-                    new_content = []
-                    # 添加头部信息
-                    new_content.extend(header_section)
-                    new_content.append('.')
-                    # 添加映射信息
-                    new_content.extend(mapping_section)
-                    new_content.append('.')
-                    # 添加文件结束标记
-                    new_content.append('--EOF--')
-                    
-                    # 写入新的grp文件
-                    new_grp_path = export_path / grp_file.name
-                    new_grp_path.write_text('\n'.join(new_content), encoding='utf-8')
-                    
-                    # 用于存储需要的资源信息
-                    needed_resources = {}  # {目录: {文件名}}
-                    
-                    # 遍历每个dat文件，检查其fomcat和texcat值
-                    for dat_number in actual_dats:
-                        dat_path = Path(self.nrm_path) / f"{dat_number}.saitdat"
-                        if not dat_path.exists():
-                            continue
-                            
-                        try:
-                            # 读取dat文件内容
-                            dat_content = dat_path.read_text(encoding='utf-8')
-                            fomcat = None
-                            texcat = None
-                            fomnam = None
-                            texnam = None
-                            
-                            # 解析值
-                            for line in dat_content.splitlines():
-                                line = line.strip()
-                                if line.startswith('fomcat='):
-                                    value = line.split('=')[1]
-                                    if value.startswith('I:'):
-                                        fomcat = int(value[2:])
-                                elif line.startswith('texcat='):
-                                    value = line.split('=')[1]
-                                    if value.startswith('I:'):
-                                        texcat = int(value[2:])
-                                elif line.startswith('fomnam=U:'):
-                                    fomnam = line.split('U:')[1]
-                                elif line.startswith('texnam=U:'):
-                                    texnam = line.split('U:')[1]
-                        
-                            print(f"笔刷 {dat_number}.saitdat: fomcat={fomcat}, texcat={texcat}")
-                            print(f"fomnam={fomnam}, texnam={texnam}")
-                            
-                            # 根据fomcat和fomnam添加需要的资源
-                            if fomcat and fomnam:
-                                if fomcat == 1:
-                                    needed_resources.setdefault('brushfom/blotmap', set()).add(fomnam)
-                                elif fomcat == 2:
-                                    needed_resources.setdefault('brushfom/bristle', set()).add(fomnam)
-                                elif fomcat == 3:
-                                    needed_resources.setdefault('brushfom/brshape', set()).add(fomnam)
-                                elif fomcat == 4:
-                                    needed_resources.setdefault('scatter', set()).add(fomnam)
-                            
-                            # 根据texcat和texnam添加需要的资源
-                            if texcat == 2 and texnam:
-                                needed_resources.setdefault('brushtex', set()).add(texnam)
-                            
-                        except Exception as e:
-                            print(f"处理dat文件 {dat_number} 时出错: {e}")
-                    
-                    print(f"需要的资源: {needed_resources}")
-                    
-                    # 复制需要的资源文件
-                    for resource_dir, filenames in needed_resources.items():
-                        # 创建目标目录
-                        target_dir = export_path / resource_dir
-                        target_dir.mkdir(parents=True, exist_ok=True)
-                        
-                        for filename in filenames:
-                            # 确定需要复制的文件扩展名
-                            if resource_dir in ['brushfom/blotmap', 'brushfom/bristle', 'brushtex']:
-                                extensions = ['.bmp']
-                            else:
-                                extensions = ['.bmp', '.ini']
-                            
-                            # 复制文件
-                            for ext in extensions:
-                                src_path = self.sai_path / "SAIv2/settings" / resource_dir / f"{filename}{ext}"
-                                if src_path.exists():
-                                    dst_path = target_dir / f"{filename}{ext}"
-                                    shutil.copy2(src_path, dst_path)
-                                    print(f"已复制资源文件: {filename}{ext} 到 {resource_dir}")
-                                else:
-                                    print(f"警告: 找不到资源文件 {src_path}")
-                    
-                    # 复制dat文件
-                    for actual_dat in actual_dats:
-                        dat_file = Path(self.nrm_path) / f"{actual_dat}.saitdat"
-                        if dat_file.exists():
-                            shutil.copy2(dat_file, export_path / dat_file.name)
-                            print(f"已复制笔刷文件: {dat_file.name}")
-                    
-                    success_count += 1
-                    
-                except Exception as e:
-                    print(f"导出笔刷组 {group_number} 时出错: {str(e)}")
-                    failed_groups.append(group_number)
+            # 导出到exe同目录下的 exported_brushes
+            export_base_path = self.config.exe_dir / "exported_brushes"
+            exported = self.reader.export_brush_groups(selections, export_base_path)
+            success_count = len(exported)
+            failed_groups = [group_number for group_number in selections if group_number not in exported]
             
             # 显示结果
             if success_count > 0:
@@ -744,6 +1083,451 @@ SAI笔刷工具使用说明
         except Exception as e:
             messagebox.showerror("错误", f"导出过程中发生错误：{str(e)}")
                 
+    def _export_dependency_graph(self):
+        """导出选中笔刷组（未选中时为整个笔刷库）的依赖关系图"""
+        try:
+            if not self.reader.initialize():
+                messagebox.showerror("错误", "读取器初始化失败")
+                return
+            
+            group_numbers = self._selected_group_numbers()
+            
+            output_path = self.config.exe_dir / "exported_brushes" / "library_graph.dot"
+            
+            # 被20个以上笔刷共享的资源折叠为汇总节点，避免大型笔刷库的图无法阅读
+            result = self.reader.export_dependency_graph(
+                str(output_path), group_numbers or None, fmt='svg', hub_threshold=20
+            )
+            if result:
+                messagebox.showinfo("导出完成", f"依赖关系图已导出到:\n{result}")
+                self.status_var.set("依赖关系图已导出")
+            elif output_path.exists():
+                messagebox.showwarning("警告", f"无法渲染SVG（是否已安装graphviz？），已保留DOT文件:\n{output_path}")
+            else:
+                messagebox.showerror("错误", "导出依赖关系图失败")
+        
+        except Exception as e:
+            messagebox.showerror("错误", f"导出依赖关系图时发生错误：{str(e)}")
+    
+    def _deduplicate_brushes(self):
+        """查找笔刷库中内容相同的笔刷，并可将重复文件替换为链接"""
+        try:
+            if not self.reader.initialize():
+                messagebox.showerror("错误", "读取器初始化失败")
+                return
+            
+            self.status_var.set("正在查找重复笔刷...")
+            self.root.update_idletasks()
+            deduplicator = BrushDeduplicator(self.reader)
+            duplicate_sets = deduplicator.find_duplicates()
+            if not duplicate_sets:
+                messagebox.showinfo("查找重复笔刷", "没有发现重复的笔刷")
+                self.status_var.set("没有发现重复的笔刷")
+                return
+            
+            # 报告可能很长，对话框中只显示前20组
+            report_lines = deduplicator.generate_report(duplicate_sets).splitlines()
+            report = '\n'.join(report_lines[:21])
+            if len(report_lines) > 21:
+                report += f"\n……（还有 {len(report_lines) - 21} 组）"
+            
+            if not messagebox.askyesno("查找重复笔刷", report + "\n\n是否将重复文件替换为指向保留文件的链接？"):
+                return
+            
+            if not self._take_snapshot("去重前"):
+                return
+            result = deduplicator.link_duplicates(duplicate_sets)
+            if not result['files'] and not result['relinked']:
+                messagebox.showerror("错误", "替换重复笔刷失败，笔刷库已恢复原状")
+                self.status_var.set("去重失败")
+                return
+            self._commit_mirror()
+            messagebox.showinfo(
+                "去重完成",
+                f"已将 {result['files']} 个重复文件替换为链接，回收 {result['bytes']} 字节"
+            )
+            self.status_var.set("去重完成")
+            self._refresh_structure()
+        
+        except Exception as e:
+            messagebox.showerror("错误", f"去重过程中发生错误：{str(e)}")
+    
+    def _deduplicate_resources(self):
+        """查找近似重复的形状和纹理，并可将笔刷改为引用保留的资源"""
+        try:
+            if not self.reader.initialize():
+                messagebox.showerror("错误", "读取器初始化失败")
+                return
+            
+            self.status_var.set("正在查找相似资源...")
+            self.root.update_idletasks()
+            deduplicator = ResourceDeduplicator(self.reader)
+            clusters = deduplicator.find_clusters(cache_path=self.config.exe_dir / "phash_cache.json")
+            if not clusters:
+                messagebox.showinfo("查找相似资源", "没有发现近似重复的形状或纹理")
+                self.status_var.set("没有发现相似资源")
+                return
+            
+            # 报告可能很长，对话框中只显示前20组
+            report_lines = deduplicator.generate_report(clusters).splitlines()
+            report = '\n'.join(report_lines[:21])
+            if len(report_lines) > 21:
+                report += f"\n……（还有 {len(report_lines) - 21} 组）"
+            
+            if not messagebox.askyesno("查找相似资源", report + "\n\n是否将笔刷改为引用保留的资源？（不会删除资源文件）"):
+                return
+            
+            if not self._take_snapshot("改写资源引用前"):
+                return
+            result = deduplicator.rewrite_references(clusters)
+            self._commit_mirror()
+            message = f"已改写 {result['files']} 个笔刷"
+            if result['skipped']:
+                message += f"，{result['skipped']} 个笔刷因编码无法改写而跳过"
+            messagebox.showinfo("改写完成", message)
+            self.status_var.set("资源引用已改写")
+            self._refresh_structure()
+        
+        except Exception as e:
+            messagebox.showerror("错误", f"查找相似资源时发生错误：{str(e)}")
+    
+    def _bulk_edit(self):
+        """按名称和条件筛选笔刷，批量修改参数（先预览，确认后一次写入）"""
+        if not self.reader.initialize():
+            messagebox.showerror("错误", "读取器初始化失败")
+            return
+        editor = BulkEditor(self.reader)
+        selected = self._selected_group_numbers()
+        
+        window = tk.Toplevel(self.root)
+        window.title("批量修改参数")
+        form = ttk.Frame(window, padding=10)
+        form.pack(fill='x')
+        
+        scope_var = tk.StringVar(value='selected' if selected else 'all')
+        ttk.Label(form, text="范围:").grid(row=0, column=0, sticky='w')
+        scope_frame = ttk.Frame(form)
+        scope_frame.grid(row=0, column=1, sticky='w')
+        ttk.Radiobutton(scope_frame, text=f"选中的笔刷组（{len(selected)} 个）", variable=scope_var,
+                        value='selected', state='normal' if selected else 'disabled').pack(side='left')
+        ttk.Radiobutton(scope_frame, text="整个笔刷库", variable=scope_var, value='all').pack(side='left', padx=10)
+        
+        name_var = tk.StringVar()
+        where_var = tk.StringVar()
+        operations_var = tk.StringVar()
+        for row, (label, variable, hint) in enumerate((
+                ("名称:", name_var, "通配符，例如 *铅笔*，留空表示全部"),
+                ("条件:", where_var, "例如 density>50, texnam~paper，留空表示全部"),
+                ("修改:", operations_var, "例如 size=20; density*0.8; oldkey->newkey")), start=1):
+            ttk.Label(form, text=label).grid(row=row, column=0, sticky='w', pady=2)
+            ttk.Entry(form, textvariable=variable, width=50).grid(row=row, column=1, sticky='we', pady=2)
+            ttk.Label(form, text=hint, foreground='gray').grid(row=row, column=2, sticky='w', padx=5)
+        
+        text = tk.Text(window, width=90, height=20, wrap='none')
+        text.pack(fill='both', expand=True, padx=10)
+        
+        def build_plan():
+            try:
+                operations = parse_operations(operations_var.get())
+                conditions = parse_conditions(where_var.get())
+            except ValueError as e:
+                messagebox.showerror("错误", str(e), parent=window)
+                return None
+            if not operations:
+                messagebox.showerror("错误", "请输入修改操作", parent=window)
+                return None
+            return editor.plan(operations, group_numbers=selected if scope_var.get() == 'selected' else None,
+                               name_pattern=name_var.get().strip() or None, conditions=conditions)
+        
+        def show_preview():
+            plan = build_plan()
+            if plan is None:
+                return
+            text.delete('1.0', tk.END)
+            text.insert(tk.END, editor.generate_report(plan, limit=200))
+        
+        def execute():
+            # 重新计算，以免预览后文件或输入已有变化
+            plan = build_plan()
+            if plan is None:
+                return
+            if not plan.edits:
+                messagebox.showinfo("批量修改参数", "没有需要修改的笔刷", parent=window)
+                return
+            message = f"将修改 {len(plan.edits)} 个笔刷，是否继续？"
+            if plan.shared:
+                message += f"\n\n{len(plan.shared)} 个笔刷还被其他笔刷组使用，不会被修改（详见预览）。"
+            if not messagebox.askyesno("批量修改参数", message, parent=window):
+                return
+            try:
+                if not self._take_snapshot("批量修改前", parent=window):
+                    return
+                success = editor.apply(plan)
+                self._commit_mirror()
+            except Exception as e:
+                messagebox.showerror("错误", f"批量修改时发生错误：{str(e)}", parent=window)
+                return
+            if not success:
+                messagebox.showerror("错误", "批量修改失败，笔刷库已恢复原状", parent=window)
+                return
+            messagebox.showinfo("修改完成", f"已修改 {len(plan.edits)} 个笔刷", parent=window)
+            self.status_var.set(f"已批量修改 {len(plan.edits)} 个笔刷")
+            self._refresh_structure()
+            window.destroy()
+        
+        button_frame = ttk.Frame(window, padding=10)
+        button_frame.pack(fill='x')
+        ttk.Button(button_frame, text="预览", command=show_preview).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="执行", command=execute).pack(side='left', padx=5)
+    
+    def _query_parameters(self):
+        """按任意参数筛选、排序和分组查询整个笔刷库，并可导出结果"""
+        try:
+            if not self.reader.initialize():
+                messagebox.showerror("错误", "读取器初始化失败")
+                return
+            self.status_var.set("正在加载笔刷参数...")
+            self.root.update_idletasks()
+            table = self.reader.load_brush_table(self.config.exe_dir / "brush_table_cache.json")
+        except Exception as e:
+            messagebox.showerror("错误", f"加载笔刷参数时发生错误：{str(e)}")
+            return
+        self.status_var.set(f"已加载 {len(table)} 个笔刷的 {len(table.columns)} 个参数")
+        
+        window = tk.Toplevel(self.root)
+        window.title("参数查询")
+        form = ttk.Frame(window, padding=10)
+        form.pack(fill='x')
+        keys = table.keys()
+        
+        where_var = tk.StringVar()
+        sort_var = tk.StringVar(value='id')
+        descending_var = tk.BooleanVar(value=False)
+        group_var = tk.StringVar()
+        ttk.Label(form, text="条件:").grid(row=0, column=0, sticky='w')
+        ttk.Entry(form, textvariable=where_var, width=50).grid(row=0, column=1, columnspan=3, sticky='we')
+        ttk.Label(form, text="例如 texnam=paper, density>50", foreground='gray').grid(row=0, column=4, sticky='w', padx=5)
+        ttk.Label(form, text="排序:").grid(row=1, column=0, sticky='w', pady=2)
+        ttk.Combobox(form, textvariable=sort_var, values=['id'] + keys, width=15).grid(row=1, column=1, sticky='w')
+        ttk.Checkbutton(form, text="降序", variable=descending_var).grid(row=1, column=2, sticky='w')
+        ttk.Label(form, text="分组:").grid(row=2, column=0, sticky='w', pady=2)
+        ttk.Combobox(form, textvariable=group_var, values=[''] + keys, width=15).grid(row=2, column=1, sticky='w')
+        
+        tree_frame = ttk.Frame(window)
+        tree_frame.pack(fill='both', expand=True, padx=10)
+        tree = ttk.Treeview(tree_frame, show='headings', height=20)
+        tree.pack(side='left', fill='both', expand=True)
+        scrollbar = ttk.Scrollbar(tree_frame, orient='vertical', command=tree.yview)
+        scrollbar.pack(side='left', fill='y')
+        tree.configure(yscrollcommand=scrollbar.set)
+        result_var = tk.StringVar()
+        ttk.Label(window, textvariable=result_var).pack(anchor='w', padx=10)
+        # 最近一次查询的结果，导出时使用
+        state = {'result': table}
+        
+        def show_rows(columns, rows):
+            tree.delete(*tree.get_children())
+            tree['columns'] = columns
+            for column in columns:
+                tree.heading(column, text=column)
+                tree.column(column, width=120 if column == 'name' else 80)
+            for row in rows:
+                tree.insert('', tk.END, values=['' if value is None else value for value in row])
+        
+        def run_query():
+            try:
+                conditions = parse_conditions(where_var.get())
+            except ValueError as e:
+                messagebox.showerror("错误", str(e), parent=window)
+                return
+            result = table.filter(conditions)
+            if sort_var.get():
+                result = result.sort(sort_var.get(), descending=descending_var.get())
+            state['result'] = result
+            
+            if group_var.get():
+                groups = result.group_by(group_var.get())
+                show_rows((group_var.get(), '数量'), [(value, len(rows)) for value, rows in groups])
+                result_var.set(f"{len(result)} 个笔刷，{len(groups)} 组")
+                return
+            # 表格中最多显示1000行，导出时包括全部结果
+            shown_keys = (['name'] + [key for key in keys if key != 'name'])[:12]
+            records = result.take(slice(0, 1000)).records(shown_keys)
+            show_rows(['id'] + shown_keys, [list(record.values()) for record in records])
+            result_var.set(f"{len(result)} 个笔刷" + ("（显示前1000个）" if len(result) > 1000 else ""))
+        
+        def export(kind):
+            from tkinter import filedialog
+            path = filedialog.asksaveasfilename(parent=window, defaultextension=f".{kind}",
+                                                filetypes=[(kind.upper(), f"*.{kind}")], initialfile=f"brushes.{kind}")
+            if not path:
+                return
+            result = state['result']
+            exporter = result.export_json if kind == 'json' else result.export_csv
+            if exporter(Path(path)):
+                messagebox.showinfo("导出完成", f"已导出 {len(result)} 个笔刷到 {path}", parent=window)
+            else:
+                messagebox.showerror("错误", "导出失败", parent=window)
+        
+        button_frame = ttk.Frame(window, padding=10)
+        button_frame.pack(fill='x')
+        ttk.Button(button_frame, text="查询", command=run_query).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="导出CSV", command=lambda: export('csv')).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="导出JSON", command=lambda: export('json')).pack(side='left', padx=5)
+        run_query()
+    
+    def _check_library(self):
+        """检查笔刷库的完整性，并可自动修复 _0.saitset 中的问题"""
+        try:
+            if not self.reader.initialize():
+                messagebox.showerror("错误", "读取器初始化失败")
+                return
+            
+            self.status_var.set("正在检查笔刷库...")
+            self.root.update_idletasks()
+            checker = LibraryChecker(self.reader)
+            report = checker.check()
+            
+            # 报告可能很长，对话框中每类只显示前5个问题
+            text = checker.generate_report(report, limit=5)
+            self.status_var.set(f"检查完成，发现 {len(report.issues)} 个问题")
+            repairable = report.repairable()
+            if not repairable:
+                messagebox.showinfo("检查笔刷库", text)
+                return
+            
+            if not messagebox.askyesno("检查笔刷库", text + f"\n\n是否自动修复 {len(repairable)} 个可修复的问题？"):
+                return
+            
+            if not self._take_snapshot("修复笔刷库前"):
+                return
+            repaired = checker.repair(report)
+            self._commit_mirror()
+            if repaired < 0:
+                messagebox.showerror("错误", "修复失败，笔刷库已恢复原状")
+                return
+            messagebox.showinfo("修复完成", f"已修复 {repaired} 个问题")
+            self.status_var.set("修复完成")
+            self._refresh_structure()
+        
+        except Exception as e:
+            messagebox.showerror("错误", f"检查过程中发生错误：{str(e)}")
+    
+    def _show_disk_usage(self):
+        """显示各笔刷组的磁盘占用（总占用、独占和共享），可按列排序并导出"""
+        try:
+            if not self.reader.initialize():
+                messagebox.showerror("错误", "读取器初始化失败")
+                return
+            self.status_var.set("正在统计磁盘占用...")
+            self.root.update_idletasks()
+            usage_stats = LibraryUsage(self.reader)
+            report = usage_stats.compute()
+        except Exception as e:
+            messagebox.showerror("错误", f"统计磁盘占用时发生错误：{str(e)}")
+            return
+        self.status_var.set(f"{len(report.groups)} 个笔刷组共引用 {format_size(report.referenced_bytes)}，"
+                            f"未被引用的文件 {format_size(report.unreferenced_bytes)}")
+        
+        window = tk.Toplevel(self.root)
+        window.title("磁盘占用")
+        columns = ('group_number', 'name', 'total', 'exclusive', 'shared') + tuple(USAGE_CATEGORIES)
+        headings = {'group_number': '序号', 'name': '名称', 'total': '总占用', 'exclusive': '独占', 'shared': '共享',
+                    'nrm': '笔刷文件'}
+        tree = ttk.Treeview(window, columns=columns, show='headings', height=20)
+        for column in columns:
+            tree.column(column, width=160 if column == 'name' else 90, anchor='w' if column == 'name' else 'e')
+        tree.pack(side='left', fill='both', expand=True, padx=(10, 0), pady=5)
+        scrollbar = ttk.Scrollbar(window, orient='vertical', command=tree.yview)
+        scrollbar.pack(side='left', fill='y', pady=5)
+        tree.configure(yscrollcommand=scrollbar.set)
+        
+        # 当前排序 [列, 是否降序]；点击列标题切换排序，再次点击同一列反转顺序
+        sort_state = ['total', True]
+        
+        def fill():
+            tree.delete(*tree.get_children())
+            column, reverse = sort_state
+            if column in USAGE_CATEGORIES:
+                groups = sorted(report.groups, key=lambda usage: usage.categories[column].total, reverse=reverse)
+            else:
+                groups = report.sorted_groups(column, reverse)
+            for usage in groups:
+                tree.insert('', tk.END, values=(
+                    usage.group_number, usage.name, format_size(usage.total),
+                    format_size(usage.exclusive), format_size(usage.shared),
+                    *(format_size(usage.categories[category].total) for category in USAGE_CATEGORIES)))
+            for name in columns:
+                arrow = (' ▼' if reverse else ' ▲') if name == column else ''
+                tree.heading(name, text=headings.get(name, name) + arrow, command=lambda name=name: sort_by(name))
+        
+        def sort_by(column):
+            sort_state[:] = [column, not sort_state[1] if sort_state[0] == column else column not in ('group_number', 'name')]
+            fill()
+        
+        def export(kind):
+            from tkinter import filedialog
+            path = filedialog.asksaveasfilename(parent=window, defaultextension=f".{kind}",
+                                                filetypes=[(kind.upper(), f"*.{kind}")], initialfile=f"disk_usage.{kind}")
+            if not path:
+                return
+            sort_key = sort_state[0] if sort_state[0] not in USAGE_CATEGORIES else 'total'
+            exporter = usage_stats.export_json if kind == 'json' else usage_stats.export_csv
+            if exporter(report, Path(path), sort_key):
+                messagebox.showinfo("导出完成", f"已导出到 {path}", parent=window)
+            else:
+                messagebox.showerror("错误", "导出失败", parent=window)
+        
+        button_frame = ttk.Frame(window)
+        button_frame.pack(side='left', fill='y', padx=10, pady=5)
+        ttk.Button(button_frame, text="导出CSV", command=lambda: export('csv')).pack(pady=5)
+        ttk.Button(button_frame, text="导出JSON", command=lambda: export('json')).pack(pady=5)
+        fill()
+    
+    def _sync_library(self):
+        """与另一个SAI设置目录双向同步笔刷组"""
+        try:
+            if not self.reader.initialize():
+                messagebox.showerror("错误", "读取器初始化失败")
+                return
+            
+            from tkinter import filedialog
+            path = filedialog.askdirectory(title="请选择要同步的另一个SYSTEMAX Software Development文件夹")
+            if not path:
+                return
+            other = SystemaxReader.from_path(Path(path))
+            if not other.saitset_path.exists():
+                messagebox.showerror("错误", f"找不到文件 {other.saitset_path}")
+                return
+            
+            self.status_var.set("正在比较笔刷库...")
+            self.root.update_idletasks()
+            preview = LibrarySync(self.reader, other).sync(dry_run=True)
+            if preview.failed:
+                messagebox.showerror("错误", "比较笔刷库失败")
+                return
+            report = LibrarySync.generate_report(preview)
+            if not preview.files:
+                messagebox.showinfo("同步笔刷库", report)
+                self.status_var.set("笔刷库已同步")
+                return
+            if not messagebox.askyesno("同步笔刷库", report + "\n\n是否开始同步？"):
+                return
+            
+            if not self._take_snapshot("同步前"):
+                return
+            result = LibrarySync(self.reader, other).sync()
+            self._commit_mirror()
+            if result.failed:
+                messagebox.showerror("错误", "同步失败，笔刷库已恢复原状")
+                return
+            messagebox.showinfo("同步完成", LibrarySync.generate_report(result))
+            self.status_var.set("同步完成")
+            self._refresh_structure()
+        
+        except Exception as e:
+            messagebox.showerror("错误", f"同步过程中发生错误：{str(e)}")
+    
     def _show_warning_message(self):
         """显示警告提示窗口"""
         warning_window = tk.Toplevel()
@@ -760,7 +1544,9 @@ SAI笔刷工具使用说明
             "2. 如果只是普通担心，想留个备份以防万一，请备份：\n"
             "   SYSTEMAX Software Development\\SAIv2\\settings\\custool\n\n"
             "3. 如果你和我一样神经大条，至少备份：\n"
-            "   SYSTEMAX Software Development\\SAIv2\\settings\\custool\\nrm"
+            "   SYSTEMAX Software Development\\SAIv2\\settings\\custool\\nrm\n\n"
+            "本软件在每次导入或删除前会自动为笔刷库创建快照（保存在软件目录的 backups 文件夹），\n"
+            "可以在“导出笔刷”页面的“恢复备份”中恢复整个笔刷库或单个笔刷组。"
         )
         
         # 创建标签并设置字体
@@ -781,4 +1567,4 @@ SAI笔刷工具使用说明
 
 if __name__ == "__main__":
     app = SAIBrushTool()
-    app.run()
\ No newline at end of file
+    app.run()
@@ -0,0 +1,238 @@
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from read_Systemax import SystemaxReader
+from resource_index import RESOURCE_EXTENSIONS
+
+# 问题类别及说明
+CHECK_CATEGORIES = {
+    'missing_grp': '_0.saitset 引用的笔刷组文件不存在',
+    'unlisted_grp': '笔刷组文件未列入 _0.saitset',
+    'missing_dat': '笔刷组引用的dat文件不存在',
+    'dangling_link': '链接指向的dat文件不存在',
+    'link_cycle': '链接形成循环',
+    'missing_resource': '笔刷引用的形状或纹理文件不存在',
+    'orphan_file': '没有被任何笔刷组引用的dat/lnk文件',
+}
+
+# 可以自动修复的类别：只修改 _0.saitset，不删除任何笔刷文件
+REPAIRABLE_CATEGORIES = ('missing_grp', 'unlisted_grp')
+
+@dataclass
+class CheckIssue:
+    """检查发现的一个问题"""
+    category: str
+    path: str                            # 相关文件（相对 SAIv2/settings）
+    detail: str
+    group_number: Optional[int] = None   # 相关的笔刷组序号
+
+@dataclass
+class CheckReport:
+    """笔刷库检查结果"""
+    issues: List[CheckIssue] = field(default_factory=list)
+    file_count: int = 0
+    elapsed: float = 0.0
+    
+    def counts(self) -> Dict[str, int]:
+        """各类别的问题数量（按 CHECK_CATEGORIES 的顺序）"""
+        counts = {}
+        for issue in self.issues:
+            counts[issue.category] = counts.get(issue.category, 0) + 1
+        return {category: counts[category] for category in CHECK_CATEGORIES if category in counts}
+    
+    def repairable(self) -> List[CheckIssue]:
+        """可以自动修复的问题"""
+        return [issue for issue in self.issues if issue.category in REPAIRABLE_CATEGORIES]
+
+class LibraryChecker:
+    """笔刷库完整性检查
+    
+    nrm目录只列出一次，_0.saitset、每个grp、dat和lnk都只读取一次，
+    资源文件通过缓存的目录列表查找，建立完整的引用关系后统一检查。
+    """
+    
+    def __init__(self, reader: SystemaxReader):
+        """
+        Args:
+            reader: 已初始化的SystemaxReader
+        """
+        self.reader = reader
+        self.nrm_path = reader.library_path
+    
+    def _list_nrm(self):
+        """列出nrm目录下的grp序号、dat编号和lnk编号"""
+        grp_numbers, dat_ids, lnk_ids = set(), set(), set()
+        with os.scandir(self.nrm_path) as it:
+            for entry in it:
+                stem, ext = os.path.splitext(entry.name)
+                if ext == '.saitgrp' and stem.startswith('_') and stem[1:].isdigit():
+                    grp_numbers.add(int(stem[1:]))
+                elif stem.isdigit():
+                    if ext == '.saitdat':
+                        dat_ids.add(int(stem))
+                    elif ext == '.saitlnk':
+                        lnk_ids.add(int(stem))
+        return grp_numbers, dat_ids, lnk_ids
+    
+    def check(self) -> CheckReport:
+        """
+        检查整个笔刷库
+        
+        Returns:
+            CheckReport: 检查结果
+        """
+        start = time.perf_counter()
+        report = CheckReport()
+        issues = report.issues
+        grp_numbers, dat_ids, lnk_ids = self._list_nrm()
+        report.file_count = len(grp_numbers) + len(dat_ids) + len(lnk_ids) + 1
+        
+        # 1. _0.saitset 与笔刷组文件
+        saitset = self.reader.load_saitset()
+        listed = saitset.groups() if saitset is not None else []
+        for group_number in dict.fromkeys(listed):
+            if group_number not in grp_numbers:
+                issues.append(CheckIssue('missing_grp', f"custool/nrm/_{group_number}.saitgrp",
+                                         f"_0.saitset 中的笔刷组 {group_number} 没有对应的grp文件", group_number))
+        for group_number in sorted(grp_numbers - set(listed)):
+            issues.append(CheckIssue('unlisted_grp', f"custool/nrm/_{group_number}.saitgrp",
+                                     f"笔刷组 {group_number} 不在 _0.saitset 中，SAI中不会显示", group_number))
+        
+        # 2. 一次读取所有dat的资源字段和所有链接
+        fields = self.reader.get_dat_extractor().extract_all()
+        links = fields.links
+        
+        def resolve(dat_id: int):
+            """按SAI的顺序（先dat后lnk）解析编号，返回 (实际dat编号, 问题类别, 经过的编号)"""
+            chain = []
+            while dat_id not in dat_ids:
+                if dat_id in chain:
+                    return None, 'link_cycle', chain
+                chain.append(dat_id)
+                if dat_id not in links:
+                    return None, 'dangling_link' if len(chain) > 1 else 'missing_dat', chain
+                dat_id = links[dat_id]
+            return dat_id, None, chain
+        
+        # 3. 笔刷组引用
+        reachable: Set[int] = set()
+        used_dats: Dict[int, int] = {}   # 实际dat编号 -> 第一个引用它的笔刷组
+        for group_number in sorted(grp_numbers):
+            document = self.reader.load_group(group_number)
+            for _, index, dat_value in document.entries() if document else []:
+                actual, problem, chain = resolve(dat_value)
+                reachable.update(chain)
+                if actual is not None:
+                    reachable.add(actual)
+                    used_dats.setdefault(actual, group_number)
+                elif problem == 'missing_dat' and dat_value not in lnk_ids:
+                    issues.append(CheckIssue('missing_dat', f"custool/nrm/_{group_number}.saitgrp",
+                                             f"笔刷组 {group_number} 的第 {index} 项引用的 {dat_value} 不存在", group_number))
+        
+        # 4. 链接
+        for lnk_id in sorted(lnk_ids):
+            if lnk_id in dat_ids:
+                continue  # 同编号的dat优先，链接不会被使用
+            if lnk_id not in links:
+                issues.append(CheckIssue('dangling_link', f"custool/nrm/{lnk_id}.saitlnk", "链接文件中没有tarid"))
+                continue
+            _, problem, chain = resolve(lnk_id)
+            if problem == 'link_cycle':
+                issues.append(CheckIssue('link_cycle', f"custool/nrm/{lnk_id}.saitlnk",
+                                         " -> ".join(str(dat_id) for dat_id in chain + [links[chain[-1]]])))
+            elif problem:
+                issues.append(CheckIssue('dangling_link', f"custool/nrm/{lnk_id}.saitlnk",
+                                         f"指向的 {chain[-1]} 不存在"))
+        
+        # 5. 资源文件
+        resource_index = self.reader.get_resource_index()
+        missing_resources: Dict[str, List[int]] = {}
+        for dat_id in sorted(used_dats):
+            targets = self.reader.resource_targets(fields.get(dat_id, 'fomcat'), fields.get(dat_id, 'fomnam'),
+                                                   fields.get(dat_id, 'texcat'), fields.get(dat_id, 'texnam'))
+            for target in targets:
+                rel_dir, resource_name = target.rsplit('/', 1)
+                for ext in RESOURCE_EXTENSIONS[rel_dir][0]:
+                    if resource_index.find(rel_dir, f"{resource_name}{ext}") is None:
+                        missing_resources.setdefault(f"{target}{ext}", []).append(dat_id)
+        for path, users in sorted(missing_resources.items()):
+            issues.append(CheckIssue('missing_resource', path,
+                                     f"被 {len(users)} 个笔刷引用，例如 {users[0]}.saitdat（笔刷组 {used_dats[users[0]]}）",
+                                     used_dats[users[0]]))
+        
+        # 6. 没有被引用的文件
+        for dat_id in sorted((dat_ids | lnk_ids) - reachable):
+            for ext in ('.saitdat', '.saitlnk'):
+                if dat_id in (dat_ids if ext == '.saitdat' else lnk_ids):
+                    issues.append(CheckIssue('orphan_file', f"custool/nrm/{dat_id}{ext}", "没有被任何笔刷组引用"))
+        
+        report.elapsed = time.perf_counter() - start
+        return report
+    
+    def repair(self, report: CheckReport) -> int:
+        """
+        自动修复可以安全修复的问题：从 _0.saitset 中移除不存在的笔刷组，把未列入的笔刷组加回 _0.saitset
+        
+        所有修改通过预写日志一次写入。
+        
+        Args:
+            report: check 的结果
+        
+        Returns:
+            int: 修复的问题数量，失败返回-1
+        """
+        issues = report.repairable()
+        if not issues:
+            return 0
+        remove = {issue.group_number for issue in issues if issue.category == 'missing_grp'}
+        add = [issue.group_number for issue in issues if issue.category == 'unlisted_grp']
+        
+        if not self.reader.update_saitset(add=add, remove=remove):
+            return -1
+        for group_number in sorted(remove):
+            print(f"已从 _0.saitset 移除不存在的笔刷组 {group_number}")
+        for group_number in add:
+            print(f"已将笔刷组 {group_number} 加入 _0.saitset")
+        return len(issues)
+    
+    def generate_report(self, report: CheckReport, limit: int = 20) -> str:
+        """
+        生成检查结果的文本报告
+        
+        Args:
+            report: check 的结果
+            limit: 每个类别最多列出的问题数量
+        
+        Returns:
+            str: 报告文本
+        """
+        counts = report.counts()
+        output = [f"检查了 {report.file_count} 个文件，用时 {report.elapsed:.2f} 秒，"
+                  f"发现 {len(report.issues)} 个问题"]
+        if not counts:
+            output.append("笔刷库没有发现问题")
+            return '\n'.join(output)
+        
+        for category, count in counts.items():
+            repairable = "（可自动修复）" if category in REPAIRABLE_CATEGORIES else ""
+            output.append(f"\n{CHECK_CATEGORIES[category]}: {count} 个{repairable}")
+            issues = [issue for issue in report.issues if issue.category == category]
+            for issue in issues[:limit]:
+                output.append(f"- {issue.path}: {issue.detail}")
+            if len(issues) > limit:
+                output.append(f"……（还有 {len(issues) - limit} 个）")
+        return '\n'.join(output)
+
+if __name__ == '__main__':
+    # python library_check.py [--repair]
+    reader = SystemaxReader()
+    if reader.initialize():
+        checker = LibraryChecker(reader)
+        result = checker.check()
+        print(checker.generate_report(result))
+        if result.repairable() and '--repair' in sys.argv[1:]:
+            print(f"已修复 {checker.repair(result)} 个问题")
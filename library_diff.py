@@ -0,0 +1,329 @@
+import hashlib
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from brush_dedup import BrushDeduplicator
+from read_Systemax import SystemaxReader
+from sai_codec import read_lines
+
+# 差异状态及说明
+DIFF_STATUS = {
+    'added': '新增',
+    'removed': '删除',
+    'modified': '修改',
+    'renamed': '重命名',
+    'renumbered': '重新编号',
+}
+
+@dataclass
+class BrushSignature:
+    """笔刷组中一个笔刷的内容签名"""
+    index: int
+    dat_id: int                        # 实际dat编号（已解析链接）
+    name: Optional[str]
+    fingerprint: Optional[str]         # dat内容指纹，dat不存在时为None
+
+@dataclass
+class GroupSignature:
+    """笔刷组的内容签名"""
+    group_number: int
+    name: str
+    brushes: List[BrushSignature] = field(default_factory=list)
+    
+    @property
+    def content_fingerprint(self) -> str:
+        """只与各笔刷内容及顺序有关的指纹，与笔刷组名称和编号无关"""
+        joined = '\n'.join(brush.fingerprint or f"missing:{brush.dat_id}" for brush in self.brushes)
+        return hashlib.sha1(joined.encode('utf-8')).hexdigest()
+
+@dataclass
+class BrushChange:
+    """单个笔刷的变化"""
+    status: str                        # DIFF_STATUS 中的键
+    name: Optional[str]
+    old_id: Optional[int] = None
+    new_id: Optional[int] = None
+    changed_keys: List[str] = field(default_factory=list)
+
+@dataclass
+class GroupChange:
+    """单个笔刷组的变化，status为None表示笔刷组本身没有变化（可能有笔刷重新编号）"""
+    status: Optional[str]
+    name: str
+    old_number: Optional[int] = None
+    new_number: Optional[int] = None
+    old_name: Optional[str] = None
+    brushes: List[BrushChange] = field(default_factory=list)
+
+@dataclass
+class LibraryDiff:
+    """两个笔刷库之间的差异"""
+    groups: List[GroupChange] = field(default_factory=list)
+    unchanged: int = 0                 # 完全相同的笔刷组数量
+    
+    def counts(self) -> Dict[str, int]:
+        """笔刷组和笔刷各状态的数量，例如 {'group_added': 1, 'brush_renumbered': 20}"""
+        counts = {}
+        for group in self.groups:
+            if group.status:
+                counts[f"group_{group.status}"] = counts.get(f"group_{group.status}", 0) + 1
+            for brush in group.brushes:
+                counts[f"brush_{brush.status}"] = counts.get(f"brush_{brush.status}", 0) + 1
+        return counts
+
+class LibraryDiffer:
+    """按内容比较两个笔刷库（或快照）
+    
+    两边的dat编号通常不同，因此不逐个比较文件，而是为每个dat计算内容指纹（按大小和修改时间缓存），
+    为每个笔刷组计算由名称和各笔刷指纹组成的签名，再按内容和名称匹配笔刷组和笔刷。
+    """
+    
+    def __init__(self, old_reader: SystemaxReader, new_reader: SystemaxReader,
+                 cache_dir: Optional[Path] = None):
+        """
+        Args:
+            old_reader: 旧笔刷库的读取器
+            new_reader: 新笔刷库的读取器
+            cache_dir: 指纹缓存目录，None表示不使用缓存
+        """
+        self.old_reader = old_reader
+        self.new_reader = new_reader
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+    
+    def cache_path(self, reader: SystemaxReader) -> Optional[Path]:
+        """每个笔刷库使用单独的指纹缓存文件"""
+        if not self.cache_dir:
+            return None
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        key = hashlib.sha1(str(reader.library_path.resolve()).encode('utf-8')).hexdigest()[:16]
+        return self.cache_dir / f"{key}.json"
+    
+    def signatures(self, reader: SystemaxReader) -> Tuple[Dict[int, GroupSignature], BrushDeduplicator]:
+        """
+        计算笔刷库中所有笔刷组的签名
+        
+        Args:
+            reader: 读取器
+        
+        Returns:
+            Tuple[Dict[int, GroupSignature], BrushDeduplicator]: ({笔刷组序号: 签名}, 计算指纹使用的对象)
+        """
+        deduplicator = BrushDeduplicator(reader, ignore_keys=())
+        fingerprints = deduplicator.fingerprint_all(self.cache_path(reader))
+        
+        groups = {}
+        all_values = set()
+        for group_number in reader.list_group_numbers():
+            document = reader.load_group(group_number)
+            if document is None or not len(document):
+                continue
+            name = document.get('name') or f"group_{group_number}"
+            values = [(index, dat_value) for _, index, dat_value in document.entries()]
+            groups[group_number] = (name, values)
+            all_values.update(dat_value for _, dat_value in values)
+        
+        # 一次读取所有引用的笔刷名称和链接
+        fields = reader.extract_dat_fields(sorted(all_values))
+        signatures = {}
+        for group_number, (name, values) in groups.items():
+            signature = GroupSignature(group_number=group_number, name=name)
+            for index, dat_value in values:
+                actual = dat_value
+                seen = {actual}
+                while actual in fields.links and fields.links[actual] not in seen:
+                    actual = fields.links[actual]
+                    seen.add(actual)
+                signature.brushes.append(BrushSignature(
+                    index=index,
+                    dat_id=actual,
+                    name=fields.lookup(dat_value, 'name'),
+                    fingerprint=fingerprints.get(actual)
+                ))
+            signatures[group_number] = signature
+        return signatures, deduplicator
+    
+    @staticmethod
+    def pair(old_items: List[Tuple[object, int]], new_items: List[Tuple[object, int]],
+             old_left: set, new_left: set) -> List[Tuple[int, int]]:
+        """
+        按键配对尚未匹配的项目，同一个键有多个项目时优先配对编号相同的项目
+        
+        Args:
+            old_items: [(键, 旧编号)]
+            new_items: [(键, 新编号)]
+            old_left: 尚未匹配的旧编号（配对成功后移除）
+            new_left: 尚未匹配的新编号（配对成功后移除）
+        
+        Returns:
+            List[Tuple[int, int]]: [(旧编号, 新编号)]
+        """
+        buckets: Dict[object, List[int]] = {}
+        for key, number in new_items:
+            if number in new_left:
+                buckets.setdefault(key, []).append(number)
+        
+        pairs = []
+        for key, number in old_items:
+            candidates = [candidate for candidate in buckets.get(key, []) if candidate in new_left]
+            if number not in old_left or not candidates:
+                continue
+            match = number if number in candidates else candidates[0]
+            pairs.append((number, match))
+            old_left.discard(number)
+            new_left.discard(match)
+        return pairs
+    
+    def _dat_values(self, deduplicator: BrushDeduplicator, dat_id: int) -> Dict[str, str]:
+        """读取dat的所有字段 {键: 值}"""
+        lines = read_lines(deduplicator.nrm_path / f"{dat_id}.saitdat")
+        values = {}
+        for line in lines:
+            line = line.strip()
+            if '=' in line:
+                key, value = line.split('=', 1)
+                values.setdefault(key, value)
+        return values
+    
+    def _diff_brushes(self, old: GroupSignature, new: GroupSignature, old_dedup: BrushDeduplicator,
+                      new_dedup: BrushDeduplicator) -> List[BrushChange]:
+        """比较一对笔刷组中的笔刷"""
+        old_left = set(range(len(old.brushes)))
+        new_left = set(range(len(new.brushes)))
+        changes = []
+        
+        # 内容相同的笔刷：只可能重新编号
+        for i, j in self.pair([(brush.fingerprint, i) for i, brush in enumerate(old.brushes) if brush.fingerprint],
+                              [(brush.fingerprint, j) for j, brush in enumerate(new.brushes) if brush.fingerprint],
+                              old_left, new_left):
+            if old.brushes[i].dat_id != new.brushes[j].dat_id:
+                changes.append(BrushChange('renumbered', new.brushes[j].name,
+                                           old.brushes[i].dat_id, new.brushes[j].dat_id))
+        
+        # 名称相同、内容不同的笔刷：列出变化的参数
+        for i, j in self.pair([(brush.name, i) for i, brush in enumerate(old.brushes) if brush.name],
+                              [(brush.name, j) for j, brush in enumerate(new.brushes) if brush.name],
+                              old_left, new_left):
+            old_values = self._dat_values(old_dedup, old.brushes[i].dat_id)
+            new_values = self._dat_values(new_dedup, new.brushes[j].dat_id)
+            changed_keys = sorted(key for key in old_values.keys() | new_values.keys()
+                                  if old_values.get(key) != new_values.get(key))
+            changes.append(BrushChange('modified', new.brushes[j].name, old.brushes[i].dat_id,
+                                       new.brushes[j].dat_id, changed_keys))
+        
+        for i in sorted(old_left):
+            changes.append(BrushChange('removed', old.brushes[i].name, old_id=old.brushes[i].dat_id))
+        for j in sorted(new_left):
+            changes.append(BrushChange('added', new.brushes[j].name, new_id=new.brushes[j].dat_id))
+        return changes
+    
+    def diff(self) -> LibraryDiff:
+        """
+        比较两个笔刷库
+        
+        笔刷组依次按 名称+内容、内容、名称 匹配：名称和内容都相同的是未变化或重新编号，
+        只有内容相同的是重命名，只有名称相同的是修改，其余为新增或删除。
+        
+        Returns:
+            LibraryDiff: 差异
+        """
+        old_groups, old_dedup = self.signatures(self.old_reader)
+        new_groups, new_dedup = self.signatures(self.new_reader)
+        old_left = set(old_groups)
+        new_left = set(new_groups)
+        result = LibraryDiff()
+        
+        def items(groups: Dict[int, GroupSignature], key) -> List[Tuple[object, int]]:
+            return [(key(signature), number) for number, signature in sorted(groups.items())]
+        
+        full_key = lambda signature: (signature.name, signature.content_fingerprint)
+        content_key = lambda signature: signature.content_fingerprint
+        name_key = lambda signature: signature.name
+        
+        for key, status in ((full_key, 'renumbered'), (content_key, 'renamed'), (name_key, 'modified')):
+            for old_number, new_number in self.pair(items(old_groups, key), items(new_groups, key),
+                                                    old_left, new_left):
+                old, new = old_groups[old_number], new_groups[new_number]
+                brushes = self._diff_brushes(old, new, old_dedup, new_dedup)
+                group_status = status
+                if status == 'renumbered' and old_number == new_number:
+                    group_status = None
+                change = GroupChange(group_status, new.name, old_number, new_number,
+                                     old_name=old.name if old.name != new.name else None, brushes=brushes)
+                if group_status is None and not brushes:
+                    result.unchanged += 1
+                else:
+                    result.groups.append(change)
+        
+        for number in sorted(old_left):
+            old = old_groups[number]
+            result.groups.append(GroupChange('removed', old.name, old_number=number, brushes=[
+                BrushChange('removed', brush.name, old_id=brush.dat_id) for brush in old.brushes]))
+        for number in sorted(new_left):
+            new = new_groups[number]
+            result.groups.append(GroupChange('added', new.name, new_number=number, brushes=[
+                BrushChange('added', brush.name, new_id=brush.dat_id) for brush in new.brushes]))
+        
+        result.groups.sort(key=lambda change: (change.new_number if change.new_number is not None
+                                               else change.old_number))
+        return result
+    
+    def generate_report(self, diff: LibraryDiff, limit: int = 10) -> str:
+        """
+        生成差异的文本报告
+        
+        Args:
+            diff: diff 的结果
+            limit: 每个笔刷组最多列出的笔刷变化数量
+        
+        Returns:
+            str: 报告文本
+        """
+        counts = diff.counts()
+        group_summary = '，'.join(f"{DIFF_STATUS[status]} {counts[f'group_{status}']}"
+                                  for status in DIFF_STATUS if f"group_{status}" in counts)
+        brush_summary = '，'.join(f"{DIFF_STATUS[status]} {counts[f'brush_{status}']}"
+                                  for status in DIFF_STATUS if f"brush_{status}" in counts)
+        output = [f"笔刷组：{group_summary or '没有变化'}（{diff.unchanged} 个完全相同）",
+                  f"笔刷：{brush_summary or '没有变化'}"]
+        
+        for group in diff.groups:
+            if group.status == 'added':
+                output.append(f"\n+ 新增笔刷组 {group.new_number}: {group.name}（{len(group.brushes)} 个笔刷）")
+                continue
+            if group.status == 'removed':
+                output.append(f"\n- 删除笔刷组 {group.old_number}: {group.name}（{len(group.brushes)} 个笔刷）")
+                continue
+            
+            title = f"笔刷组 {group.new_number}: {group.name}"
+            if group.old_number != group.new_number:
+                title += f"（原编号 {group.old_number}）"
+            if group.old_name:
+                title += f"（原名称 {group.old_name}）"
+            output.append(f"\n* {DIFF_STATUS.get(group.status, '笔刷重新编号')} {title}")
+            for brush in group.brushes[:limit]:
+                if brush.status == 'added':
+                    output.append(f"  + {brush.name}（{brush.new_id}.saitdat）")
+                elif brush.status == 'removed':
+                    output.append(f"  - {brush.name}（{brush.old_id}.saitdat）")
+                elif brush.status == 'renumbered':
+                    output.append(f"  # {brush.name}: {brush.old_id} -> {brush.new_id}")
+                else:
+                    keys = ', '.join(brush.changed_keys[:8])
+                    if len(brush.changed_keys) > 8:
+                        keys += ' ...'
+                    output.append(f"  * {brush.name}（{brush.old_id} -> {brush.new_id}）: {keys}")
+            if len(group.brushes) > limit:
+                output.append(f"  ……（还有 {len(group.brushes) - limit} 个）")
+        return '\n'.join(output)
+
+if __name__ == '__main__':
+    # python library_diff.py 旧SAI路径 新SAI路径（可以是快照目录）
+    if len(sys.argv) != 3:
+        print("用法: python library_diff.py 旧SAI路径 新SAI路径")
+        sys.exit(1)
+    old_reader = SystemaxReader.from_path(Path(sys.argv[1]))
+    new_reader = SystemaxReader.from_path(Path(sys.argv[2]))
+    differ = LibraryDiffer(old_reader, new_reader, old_reader.config.exe_dir / 'fingerprint_cache')
+    print(differ.generate_report(differ.diff()))
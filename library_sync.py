@@ -0,0 +1,318 @@
+import hashlib
+import json
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from brush_dedup import BrushDeduplicator
+from library_diff import GroupSignature, LibraryDiffer
+from mutation_journal import JournalStep
+from read_Systemax import SystemaxReader
+from resource_index import RESOURCE_EXTENSIONS
+from sai_codec import SaiDocument
+
+@dataclass
+class SyncSide:
+    """同步的一侧笔刷库"""
+    reader: SystemaxReader
+    groups: Dict[int, GroupSignature] = field(default_factory=dict)
+    dedup: Optional[BrushDeduplicator] = None
+    fingerprints: Dict[int, str] = field(default_factory=dict)   # dat编号 -> 指纹
+
+@dataclass
+class SyncResult:
+    """同步结果"""
+    to_a: List[str] = field(default_factory=list)        # 复制或更新到A侧的笔刷组名称
+    to_b: List[str] = field(default_factory=list)        # 复制或更新到B侧的笔刷组名称
+    conflicts: List[str] = field(default_factory=list)   # 两侧都修改过、未同步的笔刷组名称
+    files: int = 0                                       # 复制或写入的文件数量
+    reused: int = 0                                      # 通过链接使用对方已有相同内容dat的笔刷数量
+    removed: int = 0                                     # 删除的被覆盖笔刷组不再使用的dat和lnk数量
+    failed: bool = False
+
+class LibrarySync:
+    """两个SAI设置目录之间的笔刷组双向同步
+    
+    笔刷组按名称对应。只在一侧存在的笔刷组复制到另一侧；两侧内容不同时，
+    根据上次同步时记录的内容指纹判断哪一侧修改过，只有一侧修改的同步到另一侧，两侧都修改的作为冲突跳过。
+    复制时为笔刷组和dat重新分配编号，缺少的资源文件一并复制；对方已有相同内容的dat时，
+    与导入查重相同，创建指向它的.saitlnk，每个笔刷组仍引用自己的编号。
+    覆盖已有的笔刷组时，旧笔刷组使用、而其他笔刷组和新内容都不再使用的dat和lnk一并删除。
+    每一侧的所有修改（包括一次 _0.saitset 更新）通过该侧的预写日志一次执行。
+    删除不会同步：只在一侧存在的笔刷组总是复制到另一侧。
+    """
+    
+    def __init__(self, reader_a: SystemaxReader, reader_b: SystemaxReader, state_path: Optional[Path] = None):
+        """
+        Args:
+            reader_a: A侧（通常是本机）笔刷库的读取器
+            reader_b: B侧（另一台电脑或共享文件夹）笔刷库的读取器
+            state_path: 同步状态文件，None时使用exe同目录下的 sync_state.json
+        """
+        self.a = SyncSide(reader_a)
+        self.b = SyncSide(reader_b)
+        self.state_path = Path(state_path) if state_path else reader_a.config.exe_dir / 'sync_state.json'
+        self.cache_dir = reader_a.config.exe_dir / 'fingerprint_cache'
+        roots = sorted(str(reader.library_path.resolve()) for reader in (reader_a, reader_b))
+        self._state_key = hashlib.sha1('\n'.join(roots).encode('utf-8')).hexdigest()[:16]
+    
+    def _load_state(self) -> Dict[str, str]:
+        """读取上次同步时各笔刷组的内容指纹 {笔刷组名称: 指纹}"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get(self._state_key, {})
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"读取同步状态时出错: {str(e)}")
+            return {}
+    
+    def _save_state(self, synced: Dict[str, str]) -> None:
+        try:
+            state = {}
+            if self.state_path.exists():
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            state[self._state_key] = synced
+            with open(self.state_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+        except Exception as e:
+            print(f"保存同步状态时出错: {str(e)}")
+    
+    def _load_side(self, side: SyncSide, differ: LibraryDiffer) -> None:
+        """计算一侧所有笔刷组的签名和所有dat的指纹"""
+        side.groups, side.dedup = differ.signatures(side.reader)
+        side.fingerprints = side.dedup.fingerprint_all(differ.cache_path(side.reader))
+    
+    def plan(self) -> Tuple[List[Tuple[GroupSignature, Optional[int]]], List[Tuple[GroupSignature, Optional[int]]],
+                            List[str], Dict[str, str]]:
+        """
+        比较两侧笔刷组，决定同步方向
+        
+        Returns:
+            Tuple: (复制到B侧的 [(A侧笔刷组, B侧要替换的笔刷组序号或None)],
+                    复制到A侧的 [(B侧笔刷组, A侧要替换的笔刷组序号或None)],
+                    冲突的笔刷组名称, 同步后两侧相同的笔刷组 {名称: 指纹})
+        """
+        differ = LibraryDiffer(self.a.reader, self.b.reader, self.cache_dir)
+        self._load_side(self.a, differ)
+        self._load_side(self.b, differ)
+        last_synced = self._load_state()
+        
+        a_left = set(self.a.groups)
+        b_left = set(self.b.groups)
+        to_b, to_a, conflicts = [], [], []
+        synced = {}
+        
+        # 名称和内容都相同的笔刷组已经同步
+        full_key = lambda signature: (signature.name, signature.content_fingerprint)
+        for a_number, b_number in differ.pair(
+                [(full_key(signature), number) for number, signature in sorted(self.a.groups.items())],
+                [(full_key(signature), number) for number, signature in sorted(self.b.groups.items())],
+                a_left, b_left):
+            synced[self.a.groups[a_number].name] = self.a.groups[a_number].content_fingerprint
+        
+        # 名称相同、内容不同：根据上次同步的指纹判断哪一侧修改过
+        for a_number, b_number in differ.pair(
+                [(signature.name, number) for number, signature in sorted(self.a.groups.items())],
+                [(signature.name, number) for number, signature in sorted(self.b.groups.items())],
+                a_left, b_left):
+            group_a, group_b = self.a.groups[a_number], self.b.groups[b_number]
+            previous = last_synced.get(group_a.name)
+            if previous == group_b.content_fingerprint:
+                to_b.append((group_a, b_number))
+                synced[group_a.name] = group_a.content_fingerprint
+            elif previous == group_a.content_fingerprint:
+                to_a.append((group_b, a_number))
+                synced[group_b.name] = group_b.content_fingerprint
+            else:
+                conflicts.append(group_a.name)
+                if previous:
+                    synced[group_a.name] = previous
+        
+        # 只在一侧存在的笔刷组
+        for number in sorted(a_left):
+            to_b.append((self.a.groups[number], None))
+            synced[self.a.groups[number].name] = self.a.groups[number].content_fingerprint
+        for number in sorted(b_left):
+            to_a.append((self.b.groups[number], None))
+            synced[self.b.groups[number].name] = self.b.groups[number].content_fingerprint
+        return to_b, to_a, conflicts, synced
+    
+    def _transfer(self, src: SyncSide, dst: SyncSide, groups: List[Tuple[GroupSignature, Optional[int]]],
+                  result: SyncResult) -> Optional[List[JournalStep]]:
+        """
+        生成把src侧笔刷组复制到dst侧的步骤
+        
+        Args:
+            src: 源
+            dst: 目标
+            groups: [(源笔刷组, 目标中要替换的笔刷组序号或None)]
+            result: 同步结果（累加文件数量）
+        
+        Returns:
+            Optional[List[JournalStep]]: 步骤，没有需要同步的内容时返回空列表，失败返回None
+        """
+        if not groups:
+            return []
+        src_nrm = src.reader.library_path
+        dst_nrm = dst.reader.library_path
+        dst_settings = dst.reader.sai_path / 'SAIv2' / 'settings'
+        
+        # 目标中每种内容编号最小的dat，用于去重
+        dst_index: Dict[str, int] = {}
+        for dat_id, fingerprint in dst.fingerprints.items():
+            if fingerprint not in dst_index or dat_id < dst_index[fingerprint]:
+                dst_index[fingerprint] = dat_id
+        next_dat = max(dst.dedup.list_ids('.saitdat') + dst.dedup.list_ids('.saitlnk'), default=0) + 1
+        next_group = max(dst.reader.list_group_numbers(), default=0) + 1
+        
+        src_ids = sorted({brush.dat_id for group, _ in groups for brush in group.brushes})
+        fields = src.reader.extract_dat_fields(src_ids)
+        src_resources = src.reader.get_resource_index()
+        dst_resources = dst.reader.get_resource_index()
+        
+        steps = []
+        link_template = None
+        copied_resources = set()
+        new_groups = []
+        replaced_groups = []
+        linked_dats = set()   # 新链接指向的目标中已有的dat
+        for group, dst_number in groups:
+            missing = [brush.dat_id for brush in group.brushes if brush.fingerprint is None]
+            if missing:
+                print(f"警告: 笔刷组 {group.name} 引用的 {missing[0]}.saitdat 不存在，跳过该笔刷组")
+                continue
+            
+            dat_map: Dict[int, int] = {}   # 源dat编号 -> 该笔刷组在目标中引用的编号
+            for brush in group.brushes:
+                if brush.dat_id in dat_map:
+                    continue
+                if brush.fingerprint in dst_index:
+                    # 目标中已有相同内容（包括本次为其他笔刷组复制的），创建链接而不是让两个grp引用同一个dat
+                    if link_template is None:
+                        link_template = dst.dedup.link_template()
+                    dat_map[brush.dat_id] = next_dat
+                    steps.append(JournalStep('write', dst_nrm / f"{next_dat}.saitlnk",
+                                             data=dst.dedup.render_link(link_template, dst_index[brush.fingerprint])))
+                    linked_dats.add(dst_index[brush.fingerprint])
+                    next_dat += 1
+                    result.reused += 1
+                    continue
+                
+                # 复制dat，并补充目标中缺少的资源文件
+                dat_map[brush.dat_id] = next_dat
+                dst_index[brush.fingerprint] = next_dat
+                steps.append(JournalStep('copy', dst_nrm / f"{next_dat}.saitdat",
+                                         source=src_nrm / f"{brush.dat_id}.saitdat"))
+                next_dat += 1
+                targets = src.reader.resource_targets(fields.get(brush.dat_id, 'fomcat'), fields.get(brush.dat_id, 'fomnam'),
+                                                      fields.get(brush.dat_id, 'texcat'), fields.get(brush.dat_id, 'texnam'))
+                for target in targets:
+                    rel_dir, resource_name = target.rsplit('/', 1)
+                    required, optional = RESOURCE_EXTENSIONS[rel_dir]
+                    for ext in required + optional:
+                        filename = f"{resource_name}{ext}"
+                        entry = src_resources.find(rel_dir, filename)
+                        key = f"{rel_dir}/{filename}".casefold()
+                        if entry is None or key in copied_resources or dst_resources.find(rel_dir, filename):
+                            continue
+                        copied_resources.add(key)
+                        steps.append(JournalStep('copy', dst_settings / rel_dir / entry.name, source=entry.path))
+            
+            # 改写grp中的dat编号（只修改映射行，编码和其余内容保持不变）
+            document = SaiDocument.load(src_nrm / f"_{group.group_number}.saitgrp")
+            if document is None or not document.lines:
+                return None
+            brushes = iter(group.brushes)
+            for line_number, _, _ in document.entries():
+                document.set_entry(line_number, dat_map[next(brushes).dat_id])
+            
+            if dst_number is None:
+                dst_number = next_group
+                next_group += 1
+                new_groups.append(dst_number)
+            else:
+                replaced_groups.append(dst_number)
+            steps.append(document.step(dst_nrm / f"_{dst_number}.saitgrp"))
+            (result.to_a if dst is self.a else result.to_b).append(group.name)
+        
+        # 被覆盖的笔刷组原来使用的dat和lnk：不再被其他笔刷组或新链接使用的删除
+        if replaced_groups:
+            references = dst.reader.scan_references()
+            protected = {name for dat_id in linked_dats for name in references.resolve(dat_id)}
+            for name in references.removable_files(replaced_groups):
+                if name not in protected:
+                    steps.append(JournalStep('delete', dst_nrm / name))
+        
+        if new_groups:
+            content = dst.reader.render_saitset(add=new_groups)
+            if content is None:
+                return None
+            steps.append(JournalStep('write', Path(dst.reader.saitset_path), data=content))
+        return steps
+    
+    def sync(self, dry_run: bool = False) -> SyncResult:
+        """
+        双向同步两侧的笔刷组
+        
+        Args:
+            dry_run: 为True时只计算需要同步的内容，不修改任何文件
+        
+        Returns:
+            SyncResult: 同步结果
+        """
+        result = SyncResult()
+        to_b, to_a, conflicts, synced = self.plan()
+        result.conflicts = conflicts
+        
+        steps_b = self._transfer(self.a, self.b, to_b, result)
+        steps_a = self._transfer(self.b, self.a, to_a, result)
+        if steps_a is None or steps_b is None:
+            result.failed = True
+            return result
+        result.files = sum(1 for step in steps_a + steps_b if step.action != 'delete')
+        result.removed = len(steps_a) + len(steps_b) - result.files
+        if dry_run:
+            return result
+        
+        for side, steps in ((self.b, steps_b), (self.a, steps_a)):
+            # 目标中还没有的资源目录先创建（临时文件写在目标文件旁边）
+            for step in steps:
+                if step.action != 'delete':
+                    step.target.parent.mkdir(parents=True, exist_ok=True)
+            if steps and not side.reader.journal.run("sync", steps):
+                print(f"同步到 {side.reader.sai_path} 失败，已恢复原状")
+                result.failed = True
+                return result
+            side.reader.invalidate_references()
+        
+        self._save_state(synced)
+        return result
+    
+    @staticmethod
+    def generate_report(result: SyncResult) -> str:
+        """生成同步结果的文本报告"""
+        output = [f"复制到本机 {len(result.to_a)} 个笔刷组，复制到对方 {len(result.to_b)} 个笔刷组，"
+                  f"共 {result.files} 个文件，{result.reused} 个笔刷通过链接使用已有的相同dat"]
+        if result.removed:
+            output.append(f"删除了被覆盖的笔刷组不再使用的 {result.removed} 个文件")
+        for name in result.to_a:
+            output.append(f"<- {name}")
+        for name in result.to_b:
+            output.append(f"-> {name}")
+        if result.conflicts:
+            output.append(f"\n以下 {len(result.conflicts)} 个笔刷组两侧都修改过，未同步：")
+            output.extend(f"! {name}" for name in result.conflicts)
+        return '\n'.join(output)
+
+if __name__ == '__main__':
+    # python library_sync.py 对方SAI路径 [--dry-run]
+    if len(sys.argv) < 2:
+        print("用法: python library_sync.py 对方SAI路径 [--dry-run]")
+        sys.exit(1)
+    reader = SystemaxReader()
+    if reader.initialize():
+        syncer = LibrarySync(reader, SystemaxReader.from_path(Path(sys.argv[1])))
+        print(syncer.generate_report(syncer.sync(dry_run='--dry-run' in sys.argv[2:])))
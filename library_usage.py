@@ -0,0 +1,279 @@
+import csv
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from read_Systemax import SystemaxReader
+from resource_index import RESOURCE_EXTENSIONS
+
+# 统计类别：nrm目录中的笔刷文件（grp、dat、lnk）和各资源目录
+USAGE_CATEGORIES = ['nrm'] + list(RESOURCE_EXTENSIONS)
+
+# 可以排序的列
+SORT_KEYS = ('group_number', 'name', 'total', 'exclusive', 'shared')
+
+def format_size(size: int) -> str:
+    """把字节数格式化为便于阅读的文本"""
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GB"
+
+@dataclass
+class CategoryUsage:
+    """一个笔刷组在某个类别中的占用"""
+    files: int = 0
+    total: int = 0
+    exclusive: int = 0
+    
+    @property
+    def shared(self) -> int:
+        return self.total - self.exclusive
+
+@dataclass
+class GroupUsage:
+    """一个笔刷组的磁盘占用"""
+    group_number: int
+    name: str
+    total: int = 0                 # 该组引用的所有文件的大小
+    exclusive: int = 0             # 只被该组引用的文件（删除该组可以释放）
+    categories: Dict[str, CategoryUsage] = field(default_factory=dict)
+    
+    @property
+    def shared(self) -> int:
+        return self.total - self.exclusive
+
+@dataclass
+class UsageReport:
+    """整个笔刷库的磁盘占用"""
+    groups: List[GroupUsage] = field(default_factory=list)
+    referenced_bytes: int = 0      # 被至少一个笔刷组引用的文件大小（每个文件只算一次）
+    unreferenced_bytes: int = 0    # nrm和资源目录中没有被引用的文件大小
+    elapsed: float = 0.0
+    
+    def sorted_groups(self, key: str = 'total', reverse: bool = True) -> List[GroupUsage]:
+        """
+        按指定列排序的笔刷组
+        
+        Args:
+            key: SORT_KEYS 中的列名
+            reverse: 是否降序
+        """
+        if key not in SORT_KEYS:
+            raise ValueError(f"不支持的排序列: {key}")
+        return sorted(self.groups, key=lambda usage: getattr(usage, key), reverse=reverse)
+
+class LibraryUsage:
+    """笔刷库磁盘占用统计
+    
+    nrm目录和资源目录各列出一次（资源目录使用缓存的目录列表），每个grp读取一次，
+    所有dat的资源字段和链接一次批量提取；统计每个文件被多少个笔刷组引用，
+    由此一次算出各笔刷组的总占用、独占和共享部分。
+    """
+    
+    def __init__(self, reader: SystemaxReader):
+        """
+        Args:
+            reader: 已初始化的SystemaxReader
+        """
+        self.reader = reader
+        self.nrm_path = reader.library_path
+    
+    def compute(self) -> UsageReport:
+        """
+        统计整个笔刷库
+        
+        Returns:
+            UsageReport: 统计结果
+        """
+        start = time.perf_counter()
+        nrm_sizes: Dict[str, int] = {}
+        with os.scandir(self.nrm_path) as it:
+            for entry in it:
+                if entry.is_file():
+                    nrm_sizes[entry.name] = entry.stat().st_size
+        
+        fields = self.reader.get_dat_extractor().extract_all()
+        links = fields.links
+        resource_index = self.reader.get_resource_index()
+        
+        # 每个笔刷组引用的文件 {(类别, 文件名): 大小}
+        group_files: Dict[int, Dict[Tuple[str, str], int]] = {}
+        names: Dict[int, str] = {}
+        resource_cache: Dict[int, List[Tuple[Tuple[str, str], int]]] = {}
+        for group_number in self.reader.list_group_numbers():
+            grp_name = f"_{group_number}.saitgrp"
+            files = {('nrm', grp_name): nrm_sizes.get(grp_name, 0)}
+            document = self.reader.load_group(group_number)
+            names[group_number] = (document and document.get('name')) or f"笔刷组{group_number}"
+            
+            for _, _, dat_id in document.entries() if document else []:
+                # 与SAI相同，同编号的dat优先，否则沿链接查找
+                seen = set()
+                while dat_id not in seen:
+                    seen.add(dat_id)
+                    if f"{dat_id}.saitdat" in nrm_sizes:
+                        files[('nrm', f"{dat_id}.saitdat")] = nrm_sizes[f"{dat_id}.saitdat"]
+                        break
+                    if f"{dat_id}.saitlnk" in nrm_sizes:
+                        files[('nrm', f"{dat_id}.saitlnk")] = nrm_sizes[f"{dat_id}.saitlnk"]
+                    if dat_id not in links:
+                        dat_id = None
+                        break
+                    dat_id = links[dat_id]
+                if dat_id is None or dat_id not in fields:
+                    continue
+                
+                if dat_id not in resource_cache:
+                    resources = []
+                    targets = self.reader.resource_targets(fields.get(dat_id, 'fomcat'), fields.get(dat_id, 'fomnam'),
+                                                           fields.get(dat_id, 'texcat'), fields.get(dat_id, 'texnam'))
+                    for target in targets:
+                        rel_dir, resource_name = target.rsplit('/', 1)
+                        required, optional = RESOURCE_EXTENSIONS[rel_dir]
+                        for ext in required + optional:
+                            entry = resource_index.find(rel_dir, f"{resource_name}{ext}")
+                            if entry is not None:
+                                resources.append(((rel_dir, entry.name.casefold()), entry.size))
+                    resource_cache[dat_id] = resources
+                files.update(resource_cache[dat_id])
+            group_files[group_number] = files
+        
+        # 统计每个文件被引用的次数
+        ref_counts: Dict[Tuple[str, str], int] = {}
+        for files in group_files.values():
+            for key in files:
+                ref_counts[key] = ref_counts.get(key, 0) + 1
+        
+        report = UsageReport()
+        for group_number, files in group_files.items():
+            usage = GroupUsage(group_number, names[group_number],
+                               categories={category: CategoryUsage() for category in USAGE_CATEGORIES})
+            for key, size in files.items():
+                category = usage.categories[key[0]]
+                category.files += 1
+                category.total += size
+                usage.total += size
+                if ref_counts[key] == 1:
+                    category.exclusive += size
+                    usage.exclusive += size
+            report.groups.append(usage)
+        
+        all_sizes = {('nrm', name): size for name, size in nrm_sizes.items()
+                     if name.endswith(('.saitgrp', '.saitdat', '.saitlnk'))}
+        for rel_dir in RESOURCE_EXTENSIONS:
+            for name, entry in resource_index.files(rel_dir).items():
+                all_sizes[(rel_dir, name)] = entry.size
+        report.referenced_bytes = sum(all_sizes.get(key, 0) for key in ref_counts)
+        report.unreferenced_bytes = sum(size for key, size in all_sizes.items() if key not in ref_counts)
+        report.elapsed = time.perf_counter() - start
+        return report
+    
+    @staticmethod
+    def _rows(report: UsageReport, sort_key: str = 'total') -> List[Dict[str, object]]:
+        """展开为表格行（每个类别的总占用和独占各一列）"""
+        rows = []
+        for usage in report.sorted_groups(sort_key, reverse=sort_key not in ('group_number', 'name')):
+            row = {'group_number': usage.group_number, 'name': usage.name, 'total': usage.total,
+                   'exclusive': usage.exclusive, 'shared': usage.shared}
+            for category in USAGE_CATEGORIES:
+                row[f"{category}_total"] = usage.categories[category].total
+                row[f"{category}_exclusive"] = usage.categories[category].exclusive
+            rows.append(row)
+        return rows
+    
+    def export_csv(self, report: UsageReport, output_path: Path, sort_key: str = 'total') -> bool:
+        """
+        导出为CSV（UTF-8 BOM，Excel可以直接打开）
+        
+        Args:
+            report: compute 的结果
+            output_path: 输出文件
+            sort_key: 排序列
+        
+        Returns:
+            bool: 是否成功
+        """
+        try:
+            rows = self._rows(report, sort_key)
+            fieldnames = list(rows[0]) if rows else list(SORT_KEYS)
+            with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(rows)
+            return True
+        except Exception as e:
+            print(f"导出CSV时出错: {str(e)}")
+            return False
+    
+    def export_json(self, report: UsageReport, output_path: Path, sort_key: str = 'total') -> bool:
+        """
+        导出为JSON
+        
+        Args:
+            report: compute 的结果
+            output_path: 输出文件
+            sort_key: 排序列
+        
+        Returns:
+            bool: 是否成功
+        """
+        try:
+            groups = []
+            for usage in report.sorted_groups(sort_key, reverse=sort_key not in ('group_number', 'name')):
+                data = asdict(usage)
+                data['shared'] = usage.shared
+                for category, category_usage in usage.categories.items():
+                    data['categories'][category]['shared'] = category_usage.shared
+                groups.append(data)
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump({'referenced_bytes': report.referenced_bytes,
+                           'unreferenced_bytes': report.unreferenced_bytes,
+                           'groups': groups}, f, ensure_ascii=False, indent=1)
+            return True
+        except Exception as e:
+            print(f"导出JSON时出错: {str(e)}")
+            return False
+    
+    def generate_report(self, report: UsageReport, sort_key: str = 'total', limit: Optional[int] = 20) -> str:
+        """
+        生成文本报告
+        
+        Args:
+            report: compute 的结果
+            sort_key: 排序列
+            limit: 最多列出的笔刷组数量，None表示全部
+        
+        Returns:
+            str: 报告文本
+        """
+        output = [f"{len(report.groups)} 个笔刷组共引用 {format_size(report.referenced_bytes)}，"
+                  f"未被引用的文件 {format_size(report.unreferenced_bytes)}，用时 {report.elapsed:.2f} 秒"]
+        groups = report.sorted_groups(sort_key, reverse=sort_key not in ('group_number', 'name'))
+        for usage in groups[:limit]:
+            details = '，'.join(f"{category} {format_size(category_usage.total)}"
+                               for category, category_usage in usage.categories.items() if category_usage.total)
+            output.append(f"- [{usage.group_number}] {usage.name}: 共 {format_size(usage.total)}，"
+                          f"独占 {format_size(usage.exclusive)}，共享 {format_size(usage.shared)}（{details}）")
+        if limit is not None and len(groups) > limit:
+            output.append(f"……（还有 {len(groups) - limit} 个笔刷组）")
+        return '\n'.join(output)
+
+if __name__ == '__main__':
+    # python library_usage.py [输出文件.csv|.json]
+    reader = SystemaxReader()
+    if reader.initialize():
+        usage_stats = LibraryUsage(reader)
+        result = usage_stats.compute()
+        print(usage_stats.generate_report(result))
+        if len(sys.argv) > 1:
+            output = Path(sys.argv[1])
+            if output.suffix.lower() == '.json':
+                usage_stats.export_json(result, output)
+            else:
+                usage_stats.export_csv(result, output)
@@ -0,0 +1,193 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from resource_index import LIBRARY_DIRS
+
+# inotify 事件
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ATTRIB
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+class LibraryWatcher:
+    """监视笔刷库目录的变化
+    
+    Linux上使用inotify，其他平台按间隔比较目录中文件的 (大小, 修改时间)。
+    短时间内的一批变化会合并后再通知，回调在后台线程中执行，参数为变化文件的相对路径集合，
+    例如 {'custool/nrm/12.saitdat', 'brushtex/paper.bmp'}。
+    """
+    
+    def __init__(self, sai_path: Path, callback: Callable[[Set[str]], None],
+                 debounce: float = 0.5, poll_interval: float = 1.0):
+        """
+        Args:
+            sai_path: SAI路径（包含 SAIv2 文件夹）
+            callback: 变化通知回调
+            debounce: 最后一次变化后等待多少秒再通知
+            poll_interval: 轮询模式的检查间隔（秒）
+        """
+        self.sai_path = Path(sai_path)
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.mode: Optional[str] = None  # 'inotify' 或 'poll'
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pending: Set[str] = set()
+        self._last_event = 0.0
+    
+    def _watch_dirs(self) -> List[Tuple[str, Path]]:
+        """返回存在的监视目录 [(相对路径, 绝对路径)]"""
+        result = []
+        for rel_dir in LIBRARY_DIRS:
+            folder = self.sai_path / 'SAIv2' / 'settings' / rel_dir
+            if folder.is_dir():
+                result.append((rel_dir, folder))
+        return result
+    
+    def start(self) -> bool:
+        """
+        启动后台监视线程
+        
+        Returns:
+            bool: 是否成功启动
+        """
+        if self._thread and self._thread.is_alive():
+            return True
+        if not self._watch_dirs():
+            print(f"错误：找不到需要监视的目录 {self.sai_path}")
+            return False
+        
+        self._stop.clear()
+        fd = self._init_inotify() if sys.platform.startswith('linux') else None
+        if fd is not None:
+            self.mode = 'inotify'
+            target = lambda: self._run_inotify(*fd)
+        else:
+            self.mode = 'poll'
+            target = self._run_poll
+        self._thread = threading.Thread(target=target, name='LibraryWatcher', daemon=True)
+        self._thread.start()
+        return True
+    
+    def stop(self) -> None:
+        """停止监视"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+    
+    def _record(self, rel_path: str) -> None:
+        """记录一次变化"""
+        self._pending.add(rel_path)
+        self._last_event = time.monotonic()
+    
+    def _flush_if_quiet(self) -> None:
+        """距离最后一次变化已超过debounce时通知回调"""
+        if self._pending and time.monotonic() - self._last_event >= self.debounce:
+            changes, self._pending = self._pending, set()
+            try:
+                self.callback(changes)
+            except Exception as e:
+                print(f"处理笔刷库变化时出错: {str(e)}")
+    
+    def _wait_timeout(self, interval: float) -> float:
+        """计算下一次等待时间：有待通知的变化时只等到debounce结束"""
+        if not self._pending:
+            return interval
+        remaining = self.debounce - (time.monotonic() - self._last_event)
+        return max(0.01, min(interval, remaining))
+    
+    # ---- inotify ----
+    
+    def _init_inotify(self) -> Optional[Tuple[int, Dict[int, str]]]:
+        """初始化inotify，不可用时返回None"""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+            if fd < 0:
+                return None
+            watches = {}
+            for rel_dir, folder in self._watch_dirs():
+                wd = libc.inotify_add_watch(fd, os.fsencode(str(folder)), WATCH_MASK)
+                if wd < 0:
+                    os.close(fd)
+                    return None
+                watches[wd] = rel_dir
+            return fd, watches
+        except (OSError, AttributeError):
+            return None
+    
+    def _run_inotify(self, fd: int, watches: Dict[int, str]) -> None:
+        """inotify事件循环"""
+        try:
+            while not self._stop.is_set():
+                readable, _, _ = select.select([fd], [], [], self._wait_timeout(0.2))
+                if readable:
+                    try:
+                        data = os.read(fd, 64 * 1024)
+                    except BlockingIOError:
+                        data = b''
+                    offset = 0
+                    while offset + _EVENT_HEADER.size <= len(data):
+                        wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                        offset += _EVENT_HEADER.size
+                        name = data[offset:offset + name_len].rstrip(b'\0').decode(sys.getfilesystemencoding(), 'replace')
+                        offset += name_len
+                        if mask & IN_Q_OVERFLOW:
+                            # 事件队列溢出，无法知道具体文件，通知所有目录
+                            for rel_dir in watches.values():
+                                self._record(f"{rel_dir}/")
+                        elif wd in watches and name:
+                            self._record(f"{watches[wd]}/{name}")
+                self._flush_if_quiet()
+        finally:
+            os.close(fd)
+    
+    # ---- 轮询 ----
+    
+    @staticmethod
+    def _snapshot(folder: Path) -> Dict[str, Tuple[int, int]]:
+        """列出目录中的文件 {文件名: (大小, 修改时间)}"""
+        files = {}
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        return files
+    
+    def _run_poll(self) -> None:
+        """轮询循环：每次只列目录（Windows上scandir自带文件大小和修改时间，不需要逐个stat）"""
+        snapshots = {rel_dir: self._snapshot(folder) for rel_dir, folder in self._watch_dirs()}
+        next_poll = time.monotonic() + self.poll_interval
+        while not self._stop.wait(self._wait_timeout(max(0.0, next_poll - time.monotonic()))):
+            if time.monotonic() >= next_poll:
+                for rel_dir, folder in self._watch_dirs():
+                    current = self._snapshot(folder)
+                    previous = snapshots.get(rel_dir, {})
+                    for name in current.keys() | previous.keys():
+                        if current.get(name) != previous.get(name):
+                            self._record(f"{rel_dir}/{name}")
+                    snapshots[rel_dir] = current
+                next_poll = time.monotonic() + self.poll_interval
+            self._flush_if_quiet()
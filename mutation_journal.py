@@ -0,0 +1,242 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+@dataclass
+class JournalStep:
+    """笔刷库修改操作中的一个步骤"""
+    action: str                      # 'write'：写入文本或字节，'copy'：复制文件，'delete'：删除文件
+    target: Path
+    source: Optional[Path] = None    # copy 的源文件
+    content: Optional[str] = None    # write 的文本内容
+    newline: Optional[str] = None    # write 使用的换行符，与 open() 的 newline 参数相同
+    data: Optional[bytes] = None     # write 的原始字节（保留原编码时使用，优先于content）
+
+class MutationJournal:
+    """笔刷库修改操作的预写日志
+    
+    一次操作的所有步骤先作为一条记录写入日志并fsync，然后才修改文件：
+    被覆盖或删除的文件先硬链接（不支持时复制）到操作的备份目录，新内容先写入临时文件再原子替换。
+    程序在操作中途退出时，下次启动调用 recover 即可按日志把该操作涉及的文件恢复原状，
+    所需时间只与该操作的文件数量有关，与笔刷库大小无关。
+    
+    导入、删除、批量修改、去重、同步、修复和恢复单个笔刷组都通过日志执行。
+    以下写入不经过日志：影子目录推送（shadow_mirror，每个文件单独原子替换，不能整体回滚）、
+    创建快照（只写快照目录）和整体恢复快照（恢复前先创建安全快照）。
+    """
+    
+    LOG_FILE = 'journal.log'
+    
+    def __init__(self, journal_dir: Path):
+        """
+        Args:
+            journal_dir: 日志目录（保存日志文件和各操作的备份）
+        """
+        self.journal_dir = Path(journal_dir)
+        self.log_path = self.journal_dir / self.LOG_FILE
+    
+    def _append(self, record: dict) -> None:
+        """追加一条日志记录并fsync"""
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+    
+    @staticmethod
+    def _write_synced(path: str, data: bytes) -> None:
+        """写入文件并在关闭前fsync"""
+        with open(path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    @staticmethod
+    def _copy_synced(source, path: str) -> None:
+        """复制文件（保留修改时间等信息）并在关闭前fsync"""
+        with open(source, 'rb') as src, open(path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+        shutil.copystat(source, path)
+    
+    @staticmethod
+    def _sync_dirs(paths: List[Path]) -> None:
+        """
+        fsync这些文件所在的目录，使其中的新建、替换和删除落盘
+        
+        Windows不能打开目录进行fsync，NTFS的元数据由文件系统日志保证，因此跳过。
+        """
+        if os.name == 'nt':
+            return
+        for directory in {str(Path(path).parent) for path in paths}:
+            try:
+                fd = os.open(directory, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.fsync(fd)
+            except OSError as e:
+                print(f"同步目录 {directory} 时出错: {str(e)}")
+            finally:
+                os.close(fd)
+    
+    def run(self, name: str, steps: List[JournalStep]) -> bool:
+        """
+        按日志执行一次操作，中途出错时立即回滚
+        
+        Args:
+            name: 操作名称，例如 "import"
+            steps: 操作步骤
+        
+        Returns:
+            bool: 是否全部成功
+        """
+        op_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        backup_dir = self.journal_dir / op_id
+        records = []
+        for i, step in enumerate(steps):
+            target = Path(step.target)
+            records.append({
+                'a': step.action,
+                't': str(target),
+                'had': target.exists(),
+                'b': str(backup_dir / str(i)),
+                'tmp': str(target.with_name(f"{target.name}.{op_id}.tmp"))
+            })
+        
+        try:
+            # 1. 先记录完整的操作
+            self._append({'op': op_id, 'name': name, 'steps': records})
+            
+            # 2. 备份将被覆盖或删除的文件，准备新内容的临时文件
+            backup_dir.mkdir(parents=True, exist_ok=True)
+            written = []
+            for step, record in zip(steps, records):
+                if record['had']:
+                    # 硬链接与原文件是同一份数据，只有复制出的备份需要fsync
+                    try:
+                        os.link(record['t'], record['b'])
+                    except OSError:
+                        self._copy_synced(record['t'], record['b'])
+                    written.append(Path(record['b']))
+                if step.action == 'write':
+                    if step.data is not None:
+                        data = step.data
+                    else:
+                        # 与文本模式写入相同：newline为None时使用系统换行符
+                        newline = os.linesep if step.newline is None else step.newline
+                        text = step.content if newline in ('', '\n') else step.content.replace('\n', newline)
+                        data = text.encode('utf-8')
+                    self._write_synced(record['tmp'], data)
+                    written.append(Path(record['tmp']))
+                elif step.action == 'copy':
+                    self._copy_synced(step.source, record['tmp'])
+                    written.append(Path(record['tmp']))
+            self._sync_dirs(written)
+            
+            # 3. 执行修改
+            for step, record in zip(steps, records):
+                if step.action == 'delete':
+                    if os.path.exists(record['t']):
+                        os.unlink(record['t'])
+                else:
+                    os.replace(record['tmp'], record['t'])
+            self._sync_dirs([Path(record['t']) for record in records])
+            
+            # 4. 提交
+            self._append({'op': op_id, 'done': 'commit'})
+            shutil.rmtree(backup_dir, ignore_errors=True)
+            self._compact()
+            return True
+        
+        except Exception as e:
+            print(f"执行操作 {name} 时出错，正在回滚: {str(e)}")
+            self._rollback(op_id, records)
+            return False
+    
+    def _rollback(self, op_id: str, records: List[dict]) -> None:
+        """按日志记录把一次操作涉及的文件恢复原状（可重复执行）"""
+        for record in reversed(records):
+            try:
+                if os.path.exists(record['tmp']):
+                    os.unlink(record['tmp'])
+                if record['had']:
+                    # 没有备份说明该步骤尚未执行
+                    if os.path.exists(record['b']):
+                        os.replace(record['b'], record['t'])
+                elif os.path.exists(record['t']):
+                    os.unlink(record['t'])
+            except OSError as e:
+                print(f"回滚 {record['t']} 时出错: {str(e)}")
+        try:
+            self._append({'op': op_id, 'done': 'rollback'})
+        except OSError as e:
+            print(f"写入日志时出错: {str(e)}")
+        shutil.rmtree(self.journal_dir / op_id, ignore_errors=True)
+        self._compact()
+    
+    def _read_log(self) -> List[dict]:
+        """读取日志记录，忽略写入中途被打断的最后一行"""
+        records = []
+        try:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return records
+    
+    def _compact(self) -> None:
+        """所有操作都已结束时清空日志"""
+        pending = self.pending_operations()
+        if not pending:
+            try:
+                os.unlink(self.log_path)
+            except FileNotFoundError:
+                pass
+    
+    def pending_operations(self) -> List[dict]:
+        """
+        返回尚未提交或回滚的操作
+        
+        Returns:
+            List[dict]: 操作记录 {'op', 'name', 'steps'}
+        """
+        operations = {}
+        for record in self._read_log():
+            if 'steps' in record:
+                operations[record['op']] = record
+            elif 'done' in record:
+                operations.pop(record['op'], None)
+        return list(operations.values())
+    
+    def recover(self) -> int:
+        """
+        回滚上次中途中断的操作，应在读取笔刷库之前调用
+        
+        Returns:
+            int: 回滚的操作数量
+        """
+        if not self.log_path.exists():
+            return 0
+        pending = self.pending_operations()
+        for operation in pending:
+            print(f"发现未完成的操作 {operation['name']}（{operation['op']}），正在回滚")
+            self._rollback(operation['op'], operation['steps'])
+        self._compact()
+        
+        # 日志记录写入前就中断的操作可能留下空的备份目录
+        if not self.log_path.exists():
+            for entry in os.listdir(self.journal_dir):
+                if (self.journal_dir / entry).is_dir():
+                    shutil.rmtree(self.journal_dir / entry, ignore_errors=True)
+        return len(pending)
@@ -1,12 +1,21 @@
 import os
 import numpy as np
 from tkinter import filedialog, Tk
-from dataclasses import dataclass
-from typing import List, Dict, Tuple, Optional
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional, Iterable
 import graphviz
 from pathlib import Path
 import shutil
+import hashlib
+import json
+from brush_refs import BrushReferences
+from brush_table import BrushTable, BrushTableLoader
 from config_manager import ConfigManager
+from dat_fields import DatFieldExtractor, DatFieldTable
+from mutation_journal import JournalStep, MutationJournal
+from resource_index import BRUSHFOM_DIRS, BRUSHTEX_DIR, RESOURCE_DIRS, RESOURCE_EXTENSIONS, ResourceIndex
+from sai_codec import SaiDocument, decode_lines, read_lines
+from saitset import SaitsetModel
 import sys
 
 @dataclass
@@ -17,6 +26,22 @@ class BrushData:
     indices: np.ndarray
     sub_brushes: Dict[int, str] = None  # 添加子笔刷字典，存储 {索引: 笔刷名称}
 
+# 导出文件夹中的导出清单
+EXPORT_MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+
+@dataclass
+class ExportPlan:
+    """单个笔刷组的导出计划"""
+    group_number: int
+    name: str
+    grp_path: Path
+    grp_data: bytes                    # 链接已替换为实际dat编号的grp内容（原编码和换行符）
+    dat_ids: List[int]                 # 需要复制的实际dat编号
+    brushes: List[Tuple[int, int, Optional[str]]]  # [(索引, 实际dat编号, 笔刷名称)]
+    resources: Dict[str, List[Path]]   # {资源目录: [源文件]}
+    warnings: List[str] = field(default_factory=list)
+
 class SystemaxReader:
     """SAI文件读取器"""
     
@@ -27,18 +52,21 @@ class SystemaxReader:
         self.config = ConfigManager()  # 添加配置管理器
         self.folder_path: Optional[str] = None
         self._base_path: Optional[str] = None
-        # 添加形状和纹理的基础路径
-        self._brushfom_paths = {
-            1: "SAIv2/settings/brushfom/blotmap",
-            2: "SAIv2/settings/brushfom/bristle",
-            3: "SAIv2/settings/brushfom/brshape",
-            4: "SAIv2/settings/scatter"
-        }
-        self._brushtex_path = "SAIv2/settings/brushtex"
         self.brushes: List[BrushData] = []
+        self._dat_extractor: Optional[DatFieldExtractor] = None
+        self._resource_index: Optional[ResourceIndex] = None
+        self._brush_table_loader: Optional[BrushTableLoader] = None
+        # 监视模式使用的反向索引：dat/lnk编号 -> 引用它的笔刷组序号
+        self._dat_groups: Optional[Dict[int, set]] = None
+        self._group_refs: Dict[int, set] = {}
+        # 删除等修改操作的预写日志
+        self.journal = MutationJournal(self.config.exe_dir / "journal")
     
     def initialize(self) -> bool:
         """初始化读取器"""
+        # 回滚上次中途中断的修改操作
+        self.journal.recover()
+        
         # 从配置中获取SAI路径
         saved_path = self.config.get_sai_path()
         
@@ -51,6 +79,10 @@ class SystemaxReader:
             
         self.nrm_path = self.sai_path / "SAIv2" / "settings" / "custool" / "nrm"
         self.saitset_path = self.nrm_path / "_0.saitset"
+        if not self.folder_path:
+            self.folder_path = str(self.sai_path)
+        if not self._base_path:
+            self._base_path = str(self.nrm_path)
         
         if not self.nrm_path.exists():
             print(f"错误：找不到目录 {self.nrm_path}")
@@ -62,27 +94,45 @@ class SystemaxReader:
             
         return True
     
-    def _read_file_with_encodings(self, file_path: str) -> Optional[List[str]]:
+    @classmethod
+    def from_path(cls, sai_path: Path) -> 'SystemaxReader':
         """
-        使用多种编码尝试读取文件
+        创建指向指定SAI路径的读取器（例如快照或另一台电脑的设置目录），不使用配置文件中的路径
         
         Args:
-            file_path: 文件路径
-            
-        Returns:
-            Optional[List[str]]: 文件行列表，读取失败返回None
+            sai_path: SAI路径（包含 SAIv2 文件夹）
         """
-        encodings = ['utf-8', 'shift-jis', 'cp932', 'latin1']
+        reader = cls()
+        reader.sai_path = Path(sai_path)
+        reader.folder_path = str(sai_path)
+        reader.nrm_path = reader.sai_path / 'SAIv2' / 'settings' / 'custool' / 'nrm'
+        reader.saitset_path = reader.nrm_path / '_0.saitset'
+        reader._base_path = str(reader.nrm_path)
+        return reader
+    
+    @property
+    def library_path(self) -> Optional[Path]:
+        """实际读取的nrm目录（镜像模式下是本地镜像中的目录）"""
+        return Path(self._base_path) if self._base_path else None
+    
+    @library_path.setter
+    def library_path(self, path) -> None:
+        self._base_path = str(path)
+    
+    def load_group(self, group_number: int) -> Optional[SaiDocument]:
+        """
+        读取笔刷组文件，映射部分用 SaiDocument.entries() 解析
         
-        for encoding in encodings:
-            try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    return f.readlines()
-            except UnicodeDecodeError:
-                continue
+        Args:
+            group_number: 笔刷组序号
         
-        print(f"无法读取文件 {file_path}")
-        return None
+        Returns:
+            Optional[SaiDocument]: 文档，文件不存在或读取失败返回None
+        """
+        grp_path = Path(self._base_path) / f"_{group_number}.saitgrp"
+        if not grp_path.exists():
+            return None
+        return SaiDocument.load(grp_path)
     
     def _read_saitset(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
         """
@@ -91,28 +141,22 @@ class SystemaxReader:
         Returns:
             Tuple[Optional[np.ndarray], Optional[np.ndarray]]: (values_array, indices_array)
         """
-        if not self.saitset_path:
+        model = self.load_saitset()
+        if model is None:
             return None, None
-            
-        values = []
-        indices = []
-        reading_values = False
-        
-        lines = self._read_file_with_encodings(str(self.saitset_path))
-        if not lines:
-            return None, None
-            
-        for line in lines:
-            line = line.strip()
-            if line == '.':
-                reading_values = not reading_values
-                continue
-            if reading_values and line:
-                index, value = line.split('=')
-                indices.append(int(index))
-                values.append(int(value))
+        entries = model.entries()
+        return np.array([value for _, value in entries]), np.array([index for index, _ in entries])
+    
+    def load_saitset(self) -> Optional[SaitsetModel]:
+        """
+        读取_0.saitset，返回可以批量修改后一次写回的模型
         
-        return np.array(values), np.array(indices)
+        Returns:
+            Optional[SaitsetModel]: 模型，读取失败返回None
+        """
+        if not self.saitset_path:
+            return None
+        return SaitsetModel.load(Path(self.saitset_path))
     
     def _read_saitink(self, ink_value: int, grp_value: int) -> Optional[int]:
         """
@@ -127,7 +171,7 @@ class SystemaxReader:
         """
         ink_file = os.path.join(self._base_path, f"{ink_value}.saitlnk")
         try:
-            lines = self._read_file_with_encodings(ink_file)
+            lines = read_lines(ink_file)
             if not lines:
                 print(f"警告: 在处理 _{grp_value}.saitgrp 时无法读取 {ink_value}.saitlnk")
                 return None
@@ -157,7 +201,7 @@ class SystemaxReader:
         """
         dat_file = os.path.join(self._base_path, f"{dat_value}.saitdat")
         try:
-            lines = self._read_file_with_encodings(dat_file)
+            lines = read_lines(dat_file)
             if lines:
                 for line in lines:
                     line = line.strip()
@@ -186,7 +230,22 @@ class SystemaxReader:
             print(f"错误: 处理文件 {dat_value}.saitdat 时发生异常: {str(e)}")
             return None
     
-    def _read_brush_data(self, value: int) -> Optional[BrushData]:
+    def extract_dat_fields(self, dat_ids: Optional[List[int]] = None) -> DatFieldTable:
+        """
+        批量提取.saitdat中的名称和资源字段
+        
+        Args:
+            dat_ids: dat编号列表（会同时读取链接目标），None表示整个笔刷库
+        
+        Returns:
+            DatFieldTable: 按列存放的提取结果
+        """
+        extractor = self.get_dat_extractor()
+        if dat_ids is None:
+            return extractor.extract_all()
+        return extractor.extract(dat_ids)
+    
+    def read_brush_data(self, value: int) -> Optional[BrushData]:
         """
         读取单个笔刷组数据
         
@@ -196,38 +255,27 @@ class SystemaxReader:
         Returns:
             Optional[BrushData]: 笔刷数据对象
         """
-        grp_file = os.path.join(self._base_path, f"_{value}.saitgrp")
         try:
-            lines = self._read_file_with_encodings(grp_file)
-            if not lines:
+            document = self.load_group(value)
+            if not document:
                 print(f"错误: 无法读取笔刷组文件 _{value}.saitgrp")
                 return None
                 
             # 读取笔刷组名称
-            brush_name = None
-            values = []
-            indices = []
+            brush_name = document.get('name')
+            entries = document.entries()
+            indices = [index for _, index, _ in entries]
+            values = [dat_value for _, _, dat_value in entries]
             sub_brushes = {}
-            reading_values = False
-            
-            for line in lines:
-                line = line.strip()
-                if line.startswith('name=U:'):
-                    brush_name = line.split('U:')[1]
-                elif line == '.':
-                    reading_values = not reading_values
-                    continue
-                elif reading_values and line:
-                    index, dat_value = line.split('=')
-                    index = int(index)
-                    dat_value = int(dat_value)
-                    indices.append(index)
-                    values.append(dat_value)
                     
-                    # 读取对应的.saitdat文件中的笔刷名称
-                    sub_brush_name = self._read_saitdat(dat_value, value)  # 传入当前grp文件编号
-                    if sub_brush_name:
-                        sub_brushes[index] = sub_brush_name
+            # 一次批量读取该组所有.saitdat中的笔刷名称
+            fields = self.extract_dat_fields(values)
+            for index, dat_value in zip(indices, values):
+                sub_brush_name = fields.lookup(dat_value, 'name')
+                if sub_brush_name:
+                    sub_brushes[index] = sub_brush_name
+                else:
+                    print(f"警告: 在处理 _{value}.saitgrp 时无法读取 {dat_value}.saitdat 或其链接文件")
             
             if not brush_name:
                 print(f"错误: 在文件 _{value}.saitgrp 中找不到笔刷组名称")
@@ -259,11 +307,146 @@ class SystemaxReader:
             
         self.brushes = []
         for value in values_array:
-            brush_data = self._read_brush_data(value)
+            brush_data = self.read_brush_data(value)
             if brush_data:
                 self.brushes.append(brush_data)
         
         return self.brushes
+    
+    def list_group_numbers(self) -> List[int]:
+        """
+        列出nrm目录下所有笔刷组文件的序号（只列目录，不读取文件内容）
+        
+        新笔刷组的序号从1开始分配（_0 是 _0.saitset 使用的名称），但旧版本导入时可能创建过 _0.saitgrp，
+        这里仍然列出，以免该笔刷组从列表、搜索索引和监视中消失。
+        
+        Returns:
+            List[int]: 按序号排序的笔刷组序号列表
+        """
+        numbers = []
+        try:
+            for name in os.listdir(self._base_path):
+                if name.startswith('_') and name.endswith('.saitgrp'):
+                    try:
+                        numbers.append(int(name[1:-len('.saitgrp')]))
+                    except ValueError:
+                        continue
+        except (OSError, TypeError) as e:
+            print(f"列出笔刷组时出错: {str(e)}")
+        return sorted(numbers)
+    
+    def read_group_summary(self, group_number: int) -> Optional[Tuple[str, int]]:
+        """
+        读取笔刷组名称和包含的笔刷数量，不读取任何dat文件
+        
+        Args:
+            group_number: 笔刷组序号
+        
+        Returns:
+            Optional[Tuple[str, int]]: (笔刷组名称, 笔刷数量)，读取失败返回None
+        """
+        document = self.load_group(group_number)
+        if not document:
+            return None
+        return document.get('name') or f"group_{group_number}", len(document.entries())
+    
+    def get_dat_extractor(self) -> DatFieldExtractor:
+        """获取当前笔刷库的字段提取器"""
+        if self._dat_extractor is None or self._dat_extractor.nrm_path != Path(self._base_path):
+            self._dat_extractor = DatFieldExtractor(self._base_path)
+        return self._dat_extractor
+    
+    def load_brush_table(self, cache_path: Optional[Path] = None) -> BrushTable:
+        """
+        加载整个笔刷库所有.saitdat参数的列式表（只重新读取变化过的文件）
+        
+        Args:
+            cache_path: 磁盘缓存文件，None表示只使用内存中的上一次结果
+        
+        Returns:
+            BrushTable: 参数表，可以筛选、排序、分组和导出
+        """
+        if self._brush_table_loader is None or self._brush_table_loader.nrm_path != Path(self._base_path):
+            self._brush_table_loader = BrushTableLoader(self._base_path)
+        return self._brush_table_loader.load(cache_path)
+    
+    def _index_group_refs(self, group_number: int) -> None:
+        """重新记录一个笔刷组引用的dat/lnk编号（包括链接目标）"""
+        for dat_id in self._group_refs.pop(group_number, ()):
+            groups = self._dat_groups.get(dat_id)
+            if groups is not None:
+                groups.discard(group_number)
+                if not groups:
+                    del self._dat_groups[dat_id]
+        
+        document = self.load_group(group_number)
+        if not document:
+            return
+        
+        values = {dat_value for _, _, dat_value in document.entries()}
+        refs = values | set(self.get_dat_extractor().link_targets(values).values())
+        
+        self._group_refs[group_number] = refs
+        for dat_id in refs:
+            self._dat_groups.setdefault(dat_id, set()).add(group_number)
+    
+    def apply_changes(self, changes) -> set:
+        """
+        根据监视到的文件变化增量更新读取器，返回受影响的笔刷组
+        
+        Args:
+            changes: 变化文件的相对路径（相对于 SAIv2/settings），例如 'custool/nrm/12.saitdat'；
+                     以'/'结尾表示整个目录都可能变化
+        
+        Returns:
+            set: 受影响的笔刷组序号（包括已被删除的笔刷组）
+        """
+        if self._dat_groups is None:
+            # 第一次调用时建立反向索引，此时索引已反映最新状态
+            self._dat_groups = {}
+            self._group_refs = {}
+            for group_number in self.list_group_numbers():
+                self._index_group_refs(group_number)
+        
+        affected = set()
+        for path in changes:
+            rel_dir, _, name = path.rpartition('/')
+            if rel_dir != 'custool/nrm':
+                continue
+            if not name:
+                # 无法确定具体文件，所有笔刷组都可能变化
+                affected |= set(self._group_refs) | set(self.list_group_numbers())
+                continue
+            
+            stem, ext = os.path.splitext(name)
+            if ext == '.saitgrp' and stem.startswith('_') and stem[1:].isdigit():
+                if int(stem[1:]) > 0:
+                    affected.add(int(stem[1:]))
+            elif ext in ('.saitdat', '.saitlnk') and stem.isdigit():
+                affected |= self._dat_groups.get(int(stem), set())
+        
+        for group_number in affected:
+            self._index_group_refs(group_number)
+        
+        # 整体加载的笔刷数据无法按组更新，下次使用时重新逐组读取
+        if affected and self.brushes:
+            self.brushes = []
+        return affected
+    
+    def invalidate_references(self, group_numbers: Optional[Iterable[int]] = None) -> None:
+        """
+        在本程序修改笔刷库之后更新读取器的缓存，字段提取器、参数表和资源索引会按修改时间自行更新
+        
+        Args:
+            group_numbers: 被修改（包括新建和删除）的笔刷组序号，None表示不确定，下次使用时重新建立反向索引
+        """
+        self.brushes = []
+        if group_numbers is None or self._dat_groups is None:
+            self._dat_groups = None
+            self._group_refs = {}
+            return
+        for group_number in group_numbers:
+            self._index_group_refs(group_number)
 
     def generate_text_structure(self) -> str:
         """
@@ -275,12 +458,47 @@ class SystemaxReader:
         if not self.brushes:
             return "没有找到笔刷数据"
             
-        output = []
-        output.append("笔刷结构:")
-        output.append("=" * 50)
+        return "".join(self.iter_text_structure())
+        
+    def _iter_brush_data(self):
+        """
+        逐个产生笔刷组数据：已调用read_all_brushes时使用缓存，否则按saitset顺序逐个从磁盘读取，
+        读取的数据不会保留在内存中
+        
+        Yields:
+            BrushData: 笔刷数据对象
+        """
+        if self.brushes:
+            yield from self.brushes
+            return
+        
+        if not self.saitset_path and not self.initialize():
+            return
+        values_array, _ = self._read_saitset()
+        if values_array is None:
+            return
+        for value in values_array:
+            brush_data = self.read_brush_data(value)
+            if brush_data:
+                yield brush_data
+    
+    def iter_text_structure(self):
+        """
+        以生成器形式产生笔刷结构文本，每个笔刷组一个文本块
+        
+        所有文本块直接拼接（"".join）即为 generate_text_structure 的结果。
         
-        for i, brush in enumerate(self.brushes, 1):
+        Yields:
+            str: 文本块
+        """
+        has_brushes = False
+        for i, brush in enumerate(self._iter_brush_data(), 1):
+            if not has_brushes:
+                has_brushes = True
+                yield "笔刷结构:\n" + "=" * 50
+            
             # 添加笔刷组信息
+            output = []
             output.append(f"\n【笔刷组 {i}】{brush.name}")
             output.append("├─基本信息:")
             output.append(f"│  ├─包含笔刷数量: {len(brush.values)}")
@@ -296,89 +514,256 @@ class SystemaxReader:
                 output[-1] = output[-1].replace("├", "└")
             
             output.append("-" * 50)
+            yield "\n" + "\n".join(output)
         
-        return "\n".join(output)
-
-    def _export_related_files(self, file_id: int, export_dir: Path, files_copied: set, dat_mapping: dict) -> None:
+        if not has_brushes:
+            yield "没有找到笔刷数据"
+    
+    @staticmethod
+    def _dot_quote(text: str) -> str:
+        """将文本转义为DOT格式的带引号字符串"""
+        return '"' + str(text).replace('\\', '\\\\').replace('"', '\\"') + '"'
+    
+    def resource_targets(self, fom_category: Optional[int], fom_name: Optional[str],
+                         tex_category: Optional[int], tex_name: Optional[str]) -> List[str]:
         """
-        导出与指定ID相关的所有文件，包括链接文件，并维护文件映射关系
+        根据fomcat/fomnam/texcat/texnam计算笔刷引用的资源（相对settings目录，不含扩展名）
+        
+        Returns:
+            List[str]: 资源列表，例如 ['brushfom/brshape/xxx', 'brushtex/yyy']
+        """
+        targets = []
+        if fom_name and fom_category in BRUSHFOM_DIRS:
+            targets.append(f"{BRUSHFOM_DIRS[fom_category]}/{fom_name}")
+        if tex_category == 1 and tex_name:
+            targets.append(f"{BRUSHTEX_DIR}/{tex_name}")
+        return targets
+    
+    def iter_dependency_dot(self, group_numbers: Optional[List[int]] = None, hub_threshold: int = 0):
+        """
+        以流式方式生成笔刷库依赖关系图（DOT格式）
+        
+        只遍历一次 saitset -> grp -> (lnk ->) dat -> 形状/纹理，每个文件只读取一次，
+        节点和边在发现时立即输出，不在内存中构建整张图。
         
         Args:
-            file_id: 文件ID
-            export_dir: 导出目录
-            files_copied: 已复制文件的集合（避免重复复制）
-            dat_mapping: 原始ID到新ID的映射字典
+            group_numbers: 只输出这些笔刷组，None表示整个笔刷库
+            hub_threshold: 被不少于该数量的笔刷共享的资源会折叠为一个汇总节点，
+                           由笔刷组直接指向它（边上标注引用次数）；0表示不折叠
+        
+        Yields:
+            str: DOT文本行
         """
-        # 如果文件已经处理过，直接返回
-        if file_id in dat_mapping:
+        if not self._base_path and not self.initialize():
             return
+        base_path = Path(self._base_path)
         
-        # 处理 .saitdat 文件
-        dat_file = Path(self._base_path) / f"{file_id}.saitdat"
-        if dat_file.exists() and str(dat_file) not in files_copied:
-            # 分配新的ID
-            new_id = max(dat_mapping.values(), default=0) + 1
-            dat_mapping[file_id] = new_id
-            
-            # 使用新ID复制文件
-            new_dat_file = export_dir / f"{new_id}.saitdat"
-            shutil.copy2(dat_file, new_dat_file)
-            files_copied.add(str(dat_file))
-            print(f"已导出: {dat_file.name} -> {new_dat_file.name}")
+        values_array, _ = self._read_saitset()
+        if values_array is None:
             return
+        selected = set(group_numbers) if group_numbers else None
         
-        # 处理 .saitlnk 文件
-        lnk_file = Path(self._base_path) / f"{file_id}.saitlnk"
-        if lnk_file.exists() and str(lnk_file) not in files_copied:
-            try:
-                # 读取链接文件内容
-                lines = self._read_file_with_encodings(str(lnk_file))
-                if lines:
-                    for line in lines:
-                        if line.strip().startswith('tarid=I:'):
-                            target_id = int(line.strip().split('I:')[1])
-                            # 递归导出目标文件
-                            self._export_related_files(target_id, export_dir, files_copied, dat_mapping)
-                            break
-            except Exception as e:
-                print(f"处理链接文件 {lnk_file.name} 时发生错误: {str(e)}")
-
-    def _update_grp_content(self, grp_content: str, dat_mapping: dict) -> str:
+        # 一次性列出nrm目录，避免逐个exists()
+        try:
+            existing = set(os.listdir(base_path))
+        except OSError as e:
+            print(f"错误: 无法列出目录 {base_path}: {e}")
+            return
+        
+        q = self._dot_quote
+        yield "digraph sai_library {"
+        yield "  rankdir=LR;"
+        yield '  node [shape=box, fontname="Microsoft YaHei"];'
+        yield '  saitset [label="_0.saitset", shape=folder];'
+        
+        emitted_dats = set()
+        link_targets = {}  # lnk编号 -> 沿链接找到的实际dat编号（None表示无法解析）
+        
+        def is_link(dat_id) -> bool:
+            """与SAI相同，同编号的dat优先，只有dat不存在时才使用lnk"""
+            return f"{dat_id}.saitdat" not in existing and f"{dat_id}.saitlnk" in existing
+        resource_refs = {}  # 资源 -> [(笔刷组, dat编号)]，仅在折叠模式下缓存
+        emitted_resources = set()
+        
+        for grp_value in values_array:
+            grp_value = int(grp_value)
+            if selected is not None and grp_value not in selected:
+                continue
+            
+            grp_name = f"_{grp_value}.saitgrp"
+            if grp_name not in existing:
+                yield f'  g{grp_value} [label={q(grp_name + " (缺失)")}, color=red];'
+                yield f"  saitset -> g{grp_value};"
+                continue
+            
+            document = self.load_group(grp_value)
+            brush_name = document.get('name') if document else None
+            entries = [(index, dat_value) for _, index, dat_value in document.entries()] if document else []
+            
+            yield f'  g{grp_value} [label={q(f"{grp_value}: {brush_name or grp_name}")}, shape=tab];'
+            yield f"  saitset -> g{grp_value};"
+            
+            for index, dat_value in entries:
+                node = f"l{dat_value}" if is_link(dat_value) else f"d{dat_value}"
+                target = dat_value
+                
+                # 沿整条链接链查找实际的dat（每一级都先找dat再找lnk），每个链接节点只输出一次
+                chain = []
+                while is_link(target) and target not in link_targets:
+                    if target in chain:
+                        target = None  # 循环链接
+                        break
+                    chain.append(target)
+                    next_id = self._read_saitink(target, grp_value)
+                    yield f'  l{target} [label={q(f"{target}.saitlnk")}, shape=cds];'
+                    if next_id is not None:
+                        yield f"  l{target} -> {'l' if is_link(next_id) else 'd'}{next_id};"
+                    target = next_id
+                if target in link_targets:
+                    target = link_targets[target]
+                for lnk_id in chain:
+                    link_targets[lnk_id] = target
+                yield f'  g{grp_value} -> {node} [label="{index}"];'
+                
+                if target is None or target in emitted_dats:
+                    continue
+                emitted_dats.add(target)
+                
+                dat_name = f"{target}.saitdat"
+                if dat_name not in existing:
+                    yield f'  d{target} [label={q(dat_name + " (缺失)")}, color=red];'
+                    continue
+                
+                dat_document = SaiDocument.load(base_path / dat_name)
+                fields = dat_document.fields() if dat_document else {}
+                yield f'  d{target} [label={q(f"{target}: " + fields.get("name", dat_name))}, shape=note];'
+                
+                try:
+                    fom_category = int(fields.get('fomcat', 0))
+                    tex_category = int(fields.get('texcat', 0))
+                except ValueError:
+                    fom_category, tex_category = 0, 0
+                for resource in self.resource_targets(fom_category, fields.get('fomnam'),
+                                                      tex_category, fields.get('texnam')):
+                    if hub_threshold > 0:
+                        resource_refs.setdefault(resource, []).append((grp_value, target))
+                        continue
+                    if resource not in emitted_resources:
+                        emitted_resources.add(resource)
+                        yield f"  {q('r:' + resource)} [label={q(resource)}, shape=ellipse];"
+                    yield f"  d{target} -> {q('r:' + resource)};"
+        
+        # 折叠模式：共享次数达到阈值的资源只保留笔刷组级别的汇总边
+        for resource, refs in resource_refs.items():
+            if len(refs) >= hub_threshold:
+                yield (f"  {q('r:' + resource)} [label={q(f'{resource} (共享 x{len(refs)})')}, "
+                       f"shape=doubleoctagon, style=filled, fillcolor=lightyellow];")
+                per_group = {}
+                for grp_value, _ in refs:
+                    per_group[grp_value] = per_group.get(grp_value, 0) + 1
+                for grp_value, count in per_group.items():
+                    yield f'  g{grp_value} -> {q("r:" + resource)} [style=dashed, label="x{count}"];'
+            else:
+                yield f"  {q('r:' + resource)} [label={q(resource)}, shape=ellipse];"
+                for _, dat_value in refs:
+                    yield f"  d{dat_value} -> {q('r:' + resource)};"
+        
+        yield "}"
+    
+    def export_dependency_graph(self, output_path: str, group_numbers: Optional[List[int]] = None,
+                                fmt: str = 'svg', hub_threshold: int = 0) -> Optional[Path]:
         """
-        更新grp文件内容，使用新的dat文件映射
+        导出笔刷库依赖关系图
+        
+        DOT文本逐行写入磁盘，然后交给graphviz渲染，适用于上万节点的大型笔刷库。
         
         Args:
-            grp_content: 原始grp文件内容
-            dat_mapping: 原始ID到新ID的映射字典
-            
+            output_path: 输出文件路径（不含扩展名时自动添加）
+            group_numbers: 只导出这些笔刷组，None表示整个笔刷库
+            fmt: 输出格式，'dot' 只生成DOT文件，其他值（如'svg'、'png'）交给graphviz渲染
+            hub_threshold: 共享资源折叠阈值，见 iter_dependency_dot
+        
         Returns:
-            str: 更新后的grp文件内容
+            Optional[Path]: 生成的文件路径，失败返回None
         """
-        lines = grp_content.splitlines()
-        updated_lines = []
-        in_brush_section = False
-        current_brush = None
+        try:
+            dot_path = Path(output_path)
+            if dot_path.suffix.lower() != '.dot':
+                dot_path = dot_path.with_suffix('.dot')
+            dot_path.parent.mkdir(parents=True, exist_ok=True)
+            
+            with open(dot_path, 'w', encoding='utf-8', newline='\n') as f:
+                for line in self.iter_dependency_dot(group_numbers, hub_threshold):
+                    f.write(line)
+                    f.write('\n')
+            print(f"已生成依赖关系图: {dot_path}")
+            
+            if fmt == 'dot':
+                return dot_path
+            
+            rendered = graphviz.render('dot', fmt, str(dot_path))
+            print(f"已渲染依赖关系图: {rendered}")
+            return Path(rendered)
         
-        for line in lines:
-            if line == '.':
-                in_brush_section = not in_brush_section
-                updated_lines.append(line)
-                continue
-            
-            if in_brush_section and line.startswith('dataid='):
-                # 更新dataid
-                old_id = int(line.split('=')[1])
-                if old_id in dat_mapping:
-                    line = f"dataid={dat_mapping[old_id]}"
+        except graphviz.ExecutableNotFound:
+            print("错误: 未找到graphviz的dot程序，请安装graphviz或使用fmt='dot'")
+            return None
+        except Exception as e:
+            print(f"导出依赖关系图失败: {e}")
+            return None
+    
+    def render_saitset(self, add: List[int] = (), remove=()) -> Optional[bytes]:
+        """
+        生成加入或移除笔刷组后的_0.saitset内容（不写入文件），其余行逐字节保持不变
+        
+        Args:
+            add: 要加入的笔刷组序号，依次接在索引部分末尾
+            remove: 要移除的笔刷组序号
+        
+        Returns:
+            Optional[bytes]: 新的文件内容（原编码），失败返回None
+        """
+        model = self.load_saitset()
+        if model is None:
+            return None
+        model.remove(remove)
+        model.append(add)
+        return model.encode()
             
-            updated_lines.append(line)
+    def update_saitset(self, add: List[int] = (), remove=(), order: Optional[List[int]] = None,
+                       renumber: bool = False) -> bool:
+        """
+        批量修改_0.saitset并通过预写日志一次写回
         
-        return '\n'.join(updated_lines)
+        Args:
+            add: 要加入的笔刷组序号，依次接在索引部分末尾（已存在的跳过）
+            remove: 要移除的笔刷组序号
+            order: 新的笔刷组顺序，未列出的笔刷组保持原有相对顺序排在后面；指定时索引会重新编号
+            renumber: 是否把索引重新编为0, 1, 2, ...
+        
+        Returns:
+            bool: 是否成功
+        """
+        model = self.load_saitset()
+        if model is None:
+            return False
+        model.remove(remove)
+        model.append(add)
+        if order is not None:
+            model.reorder(order)
+        elif renumber:
+            model.renumber()
+        if not model.save(journal=self.journal):
+            print("更新 _0.saitset 失败，已恢复原状")
+            return False
+        return True
 
     def get_brush_group_info(self, group_number: int) -> Optional[dict]:
         """
         获取笔刷组信息,包括实际使用的dat文件编号(处理链接关系)
         
+        与SAI相同，grp引用的编号先找同编号的.saitdat，没有时再读取.saitlnk并沿tarid继续查找。
+        
         Args:
             group_number: 笔刷组序号
             
@@ -386,199 +771,240 @@ class SystemaxReader:
             Optional[dict]: 包含笔刷组信息的字典
         """
         try:
-            grp_path = Path(self._base_path) / f"_{group_number}.saitgrp"
+            base_path = Path(self._base_path)
+            grp_path = base_path / f"_{group_number}.saitgrp"
             if not grp_path.exists():
                 return None
+            document = SaiDocument.load(grp_path)
+            if document is None:
+                return None
             
-            # 读取grp文件内容
-            content = grp_path.read_text(encoding='utf-8')
-            dat_numbers = []
-            reading_values = False
-            
-            # 解析grp文件,获取所有dat编号
-            for line in content.splitlines():
-                line = line.strip()
-                if line == '.':
-                    reading_values = not reading_values
-                    continue
-                if reading_values and line:
-                    _, dat_value = line.split('=')
-                    dat_numbers.append(int(dat_value))
-            
-            # 处理链接关系,获取实际的dat文件编号
             actual_dat_numbers = []
-            for dat_number in dat_numbers:
-                lnk_path = Path(self._base_path) / f"{dat_number}.saitlnk"
-                if lnk_path.exists():
-                    # 如果是链接文件,读取目标dat编号
-                    lnk_content = lnk_path.read_text(encoding='utf-8')
-                    for line in lnk_content.splitlines():
-                        if line.startswith('tarid=I:'):
-                            target_id = int(line.split('I:')[1])
-                            actual_dat_numbers.append(target_id)
-                            break
-                else:
-                    # 如果不是链接文件,直接使用原始编号
-                    actual_dat_numbers.append(dat_number)
+            lnk_numbers = []
+            for _, _, dat_number in document.entries():
+                seen = set()
+                while dat_number is not None and dat_number not in seen:
+                    seen.add(dat_number)
+                    if (base_path / f"{dat_number}.saitdat").exists():
+                        actual_dat_numbers.append(dat_number)
+                        break
+                    lnk_path = base_path / f"{dat_number}.saitlnk"
+                    if not lnk_path.exists():
+                        break
+                    lnk_numbers.append(dat_number)
+                    lnk_document = SaiDocument.load(lnk_path)
+                    dat_number = lnk_document.get_int('tarid') if lnk_document is not None else None
             
             return {
                 'grp_path': grp_path,
-                'dat_numbers': actual_dat_numbers  # 返回实际的dat文件编号列表
+                'dat_numbers': actual_dat_numbers,  # 返回实际的dat文件编号列表
+                'lnk_numbers': lnk_numbers          # 经过的链接文件编号
             }
             
         except Exception as e:
             print(f"获取笔刷组信息时出错: {str(e)}")
             return None
 
-    def export_brush_group(self, group_number: int) -> bool:
-        """导出笔刷组"""
-        try:
-            # 获取exe所在目录
-            if getattr(sys, 'frozen', False):
-                exe_dir = Path(os.path.dirname(sys.executable))
-            else:
-                exe_dir = Path(os.path.dirname(os.path.abspath(__file__)))
-            
-            # 创建导出目录
-            export_dir = exe_dir / "exported_brushes"
-            export_dir.mkdir(exist_ok=True)
-            
-            # 获取笔刷组信息
-            group_info = self.get_brush_group_info(group_number)
-            if not group_info:
+    def scan_references(self) -> BrushReferences:
+        """
+        读取笔刷组、dat和lnk之间的引用关系（每次调用都重新读取）
+        
+        Returns:
+            BrushReferences: 引用关系
+        """
+        return BrushReferences.scan(self._base_path)
+    
+    def get_resource_index(self) -> ResourceIndex:
+        """
+        返回资源目录的文件列表缓存，并重新列出修改时间有变化的目录
+        
+        每次操作开始时调用一次，之后的资源查找不区分大小写且不再访问磁盘。
+        """
+        settings_path = self.sai_path / "SAIv2" / "settings"
+        if self._resource_index is None or self._resource_index.settings_path != settings_path:
+            self._resource_index = ResourceIndex(settings_path)
+        self._resource_index.refresh()
+        return self._resource_index
+    
+    def build_export_plans(self, group_numbers: List[int]) -> List[ExportPlan]:
+        """
+        一次性生成多个笔刷组的导出计划
+        
+        每个grp、dat和lnk文件只读取一次（多个组共用的dat也只读取一次），资源目录只列出一次。
+        
+        Args:
+            group_numbers: 笔刷组序号列表
+        
+        Returns:
+            List[ExportPlan]: 导出计划，找不到的笔刷组不会出现在列表中
+        """
+        groups = []
+        all_ids = set()
+        for group_number in dict.fromkeys(group_numbers):
+            grp_path = Path(self._base_path) / f"_{group_number}.saitgrp"
+            document = SaiDocument.load(grp_path) if grp_path.exists() else None
+            if not document:
                 print(f"找不到笔刷组 {group_number}")
-                return False
-                
-            # 创建笔刷组专属目录
-            group_dir = export_dir / f"brush_group_{group_number}"
-            group_dir.mkdir(exist_ok=True)
-            
-            # 读取grp文件内容
-            grp_content = group_info['grp_path'].read_text(encoding='utf-8')
-            
-            # 解析grp文件内容
-            new_content = []
-            actual_dats = set()  # 需要复制的实际dat文件集合
-            
-            lines = grp_content.splitlines()
-            for line in lines:
-                line = line.strip()
-                if line == '.':
-                    new_content.append(line)
+                continue
+            values = document.entries()
+            groups.append((group_number, grp_path, document, values))
+            all_ids.update(dat_value for _, _, dat_value in values)
+        
+        fields = self.extract_dat_fields(sorted(all_ids))
+        resource_index = self.get_resource_index()
+        
+        plans = []
+        for group_number, grp_path, document, values in groups:
+            name = document.get('name') or f"group_{group_number}"
+            
+            warnings = []
+            dat_ids = []
+            brushes = []
+            for line_number, index, dat_value in values:
+                # 沿链接找到实际的dat文件（与SAI相同，同编号的dat优先），grp中直接引用实际编号，导出结果不需要lnk文件
+                actual_dat = dat_value
+                seen = {actual_dat}
+                while (actual_dat not in fields and actual_dat in fields.links
+                       and fields.links[actual_dat] not in seen):
+                    actual_dat = fields.links[actual_dat]
+                    seen.add(actual_dat)
+                if actual_dat != dat_value:
+                    document.set_entry(line_number, actual_dat)
+                if actual_dat not in fields:
+                    warnings.append(f"找不到笔刷文件 {actual_dat}.saitdat")
                     continue
-                
-                if '=' in line:
-                    index, dat_value = line.split('=')
-                    original_dat = int(dat_value)
-                    
-                    # 检查是否存在链接文件
-                    lnk_path = Path(self.nrm_path) / f"{original_dat}.saitlnk"
-                    if lnk_path.exists():
-                        try:
-                            lnk_content = lnk_path.read_text(encoding='utf-8')
-                            for lnk_line in lnk_content.splitlines():
-                                if lnk_line.startswith('tarid=I:'):
-                                    # 获取实际的dat编号
-                                    actual_dat = int(lnk_line.split('I:')[1])
-                                    # 使用实际的dat编号替换原始编号
-                                    new_content.append(f"{index}={actual_dat}")
-                                    actual_dats.add(actual_dat)
-                                    print(f"替换映射: {index}={original_dat} -> {index}={actual_dat}")
-                                    break
-                        except Exception as e:
-                            print(f"读取链接文件出错 {lnk_path}: {e}")
-                            new_content.append(line)
-                            actual_dats.add(original_dat)
-                    else:
-                        new_content.append(line)
-                        actual_dats.add(original_dat)
-            
-            # 写入新的grp文件
-            grp_dest = group_dir / group_info['grp_path'].name
-            grp_dest.write_text('\n'.join(new_content), encoding='utf-8')
-            print(f"已更新并保存笔刷组文件: {grp_dest.name}")
-            
-            # 复制实际的dat文件
-            for actual_dat in actual_dats:
-                dat_path = Path(self.nrm_path) / f"{actual_dat}.saitdat"
-                if dat_path.exists():
-                    shutil.copy2(dat_path, group_dir / dat_path.name)
-                    print(f"已复制笔刷文件: {dat_path.name}")
-            
-            # 复制资源文件
-            resource_files = self.get_brush_resource_files(group_number)
-            for path, files in resource_files.items():
-                if files:
-                    # 创建资源类型目录
-                    resource_dir = group_dir / path
-                    resource_dir.mkdir(parents=True, exist_ok=True)
-                    
-                    # 复制文件
-                    for file in files:
-                        src = self.sai_path / "SAIv2" / "settings" / path / file
-                        if src.exists():
-                            shutil.copy2(src, resource_dir / file)
-                            print(f"已复制资源文件: {file} 到 {path}")
-            
-            print(f"笔刷组 {group_number} 已导出到 {group_dir}")
-            return True
-            
-        except Exception as e:
-            print(f"导出笔刷组失败: {e}")
-            return False
-
-    def _copy_brush_resource(self, source_dir: Path, target_dir: Path, resource_name: str, extensions: List[str]) -> None:
+                brushes.append((index, actual_dat, fields.get(actual_dat, 'name')))
+                if actual_dat not in dat_ids:
+                    dat_ids.append(actual_dat)
+            
+            resources = {}
+            for dat_id in dat_ids:
+                targets = self.resource_targets(fields.get(dat_id, 'fomcat'), fields.get(dat_id, 'fomnam'),
+                                                fields.get(dat_id, 'texcat'), fields.get(dat_id, 'texnam'))
+                for target in targets:
+                    rel_dir, resource_name = target.rsplit('/', 1)
+                    required, optional = RESOURCE_EXTENSIONS[rel_dir]
+                    for ext in required + optional:
+                        entry = resource_index.find(rel_dir, f"{resource_name}{ext}")
+                        if entry is not None:
+                            source = entry.path
+                            files = resources.setdefault(rel_dir, [])
+                            if source not in files:
+                                files.append(source)
+                        elif ext in required:
+                            warnings.append(f"找不到资源文件 {rel_dir}/{resource_name}{ext}")
+            
+            plans.append(ExportPlan(
+                group_number=group_number,
+                name=name,
+                grp_path=grp_path,
+                grp_data=document.encode(),
+                dat_ids=dat_ids,
+                brushes=brushes,
+                resources=resources,
+                warnings=list(dict.fromkeys(warnings))
+            ))
+        return plans
+    
+    @staticmethod
+    def _copy_with_hash(source: Path, target: Path) -> dict:
         """
-        复制笔刷资源文件（形状或纹理）
+        复制文件并同时计算SHA-1，源文件只读取一次
         
-        Args:
-            source_dir: 源目录
-            target_dir: 目标目录
-            resource_name: 资源名称
-            extensions: 需要复制的文件扩展名列表
-        """
-        for ext in extensions:
-            source_file = source_dir / f"{resource_name}{ext}"
-            if source_file.exists():
-                shutil.copy2(source_file, target_dir)
-                print(f"已导出资源: {source_file.name}")
-            else:
-                print(f"警告: 找不到资源文件 {source_file}")
-
-    def _update_dat_references(self, grp_content: str, old_to_new: Dict[int, int]) -> str:
+        Returns:
+            dict: {'size': 大小, 'sha1': 十六进制哈希}
         """
-        更新.saitgrp文件中的dat引用，保持原有格式
+        digest = hashlib.sha1()
+        size = 0
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            while True:
+                chunk = src.read(1024 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                dst.write(chunk)
+                size += len(chunk)
+        shutil.copystat(source, target)
+        return {'size': size, 'sha1': digest.hexdigest()}
+    
+    def export_brush_groups(self, group_numbers: List[int], export_base: Optional[Path] = None) -> Dict[int, Path]:
+        """
+        导出多个笔刷组
+        
+        每个笔刷组导出到 exported_brushes/group_{序号}_{名称}，包含grp文件（链接已替换为实际dat编号）、
+        实际使用的dat文件以及按SAI目录结构存放的资源文件，可直接作为导入文件夹使用。
+        导出清单（manifest.json）记录笔刷组结构、资源列表以及每个文件的大小和哈希，
+        导入时可以直接用它预览并校验文件，不需要逐个读取dat。
         
         Args:
-            grp_content: 原始文件内容
-            old_to_new: 旧序号到新序号的映射
-            
+            group_numbers: 笔刷组序号列表
+            export_base: 导出目录，默认为exe同目录下的 exported_brushes
+        
         Returns:
-            str: 更新后的文件内容
+            Dict[int, Path]: 导出成功的笔刷组 {序号: 导出目录}
         """
-        lines = grp_content.splitlines()
-        updated_lines = []
-        in_values_section = False
+        if export_base is None:
+            export_base = self.config.exe_dir / "exported_brushes"
+        exported = {}
+        try:
+            plans = self.build_export_plans(group_numbers)
+        except Exception as e:
+            print(f"生成导出计划时出错: {str(e)}")
+            return exported
         
-        for line in lines:
-            line = line.rstrip()  # 只移除尾部空白
-            if line == '.':
-                in_values_section = not in_values_section
-                updated_lines.append(line)
-                continue
+        for plan in plans:
+            try:
+                safe_name = plan.name.replace(':', '_').replace('/', '_').replace('\\', '_')
+                export_path = Path(export_base) / f"group_{plan.group_number}_{safe_name}"
+                export_path.mkdir(parents=True, exist_ok=True)
                 
-            if in_values_section and '=' in line:
-                index, old_value = line.split('=')
-                old_value = int(old_value)
-                if old_value in old_to_new:
-                    updated_lines.append(f"{index}={old_to_new[old_value]}")
-                else:
-                    updated_lines.append(line)
-            else:
-                updated_lines.append(line)
+                # 旧的导出清单在写入新文件之前删除，中途失败时不会留下与文件不一致的清单
+                manifest_path = export_path / EXPORT_MANIFEST
+                if manifest_path.exists():
+                    manifest_path.unlink()
+                
+                files = {}
+                with open(export_path / plan.grp_path.name, 'wb') as f:
+                    f.write(plan.grp_data)
+                files[plan.grp_path.name] = {'size': len(plan.grp_data), 'sha1': hashlib.sha1(plan.grp_data).hexdigest()}
                 
-        # 确保只有一个换行符在文件末尾
-        return '\n'.join(updated_lines).rstrip() + '\n'
+                for dat_id in plan.dat_ids:
+                    files[f"{dat_id}.saitdat"] = self._copy_with_hash(Path(self._base_path) / f"{dat_id}.saitdat",
+                                                                      export_path / f"{dat_id}.saitdat")
+                
+                for rel_dir, sources in plan.resources.items():
+                    target_dir = export_path / rel_dir
+                    target_dir.mkdir(parents=True, exist_ok=True)
+                    for source in sources:
+                        files[f"{rel_dir}/{source.name}"] = self._copy_with_hash(source, target_dir / source.name)
+                
+                manifest = {
+                    'version': MANIFEST_VERSION,
+                    'group': {'number': plan.group_number, 'name': plan.name, 'grp': plan.grp_path.name},
+                    'brushes': [{'index': index, 'dat': dat_id, 'name': name} for index, dat_id, name in plan.brushes],
+                    'links': {},  # 导出时链接已解析为实际dat
+                    'resources': {rel_dir: [source.name for source in sources]
+                                  for rel_dir, sources in plan.resources.items()},
+                    'files': files,
+                    'warnings': plan.warnings
+                }
+                with open(manifest_path, 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f, ensure_ascii=False, indent=1)
+                
+                file_count = len(files)
+                for warning in plan.warnings:
+                    print(f"警告: 笔刷组 {plan.group_number}: {warning}")
+                print(f"笔刷组 {plan.group_number} 已导出到 {export_path}（{file_count} 个文件）")
+                exported[plan.group_number] = export_path
+            
+            except Exception as e:
+                print(f"导出笔刷组 {plan.group_number} 时出错: {str(e)}")
+        
+        return exported
+    
+    def export_brush_group(self, group_number: int) -> bool:
+        """导出笔刷组"""
+        return group_number in self.export_brush_groups([group_number])
 
     def delete_brush_group(self, group_number: int) -> bool:
         """
@@ -590,51 +1016,69 @@ class SystemaxReader:
         Returns:
             bool: 删除是否成功
         """
+        return self.delete_brush_groups([group_number])
+    
+    def delete_brush_groups(self, group_numbers: List[int], resource_files: Optional[dict] = None) -> bool:
+        """
+        一次删除多个笔刷组
+        
+        笔刷组自己的.saitlnk会被删除；dat（包括链接指向的dat）只有在没有其他笔刷组或链接引用时才会删除，
+        因此导入查重、去重或同步后共用dat的笔刷组互不影响。
+        _0.saitset 只修改并写入一次，所有文件（包括要一并删除的资源文件）的删除和写入作为一次预写日志操作执行。
+        
+        Args:
+            group_numbers: 笔刷组序号
+            resource_files: 一并删除的资源文件 {目录: [文件名]}（get_brush_resource_files 的格式），None表示不删除
+        
+        Returns:
+            bool: 删除是否成功（找不到的笔刷组跳过）
+        """
         try:
-            # 获取笔刷组信息
-            group_info = self.get_brush_group_info(group_number)
-            if not group_info:
-                print(f"找不到笔刷组 {group_number}")
+            existing = []
+            for group_number in dict.fromkeys(group_numbers):
+                if (Path(self._base_path) / f"_{group_number}.saitgrp").exists():
+                    existing.append(group_number)
+                else:
+                    print(f"找不到笔刷组 {group_number}")
+            if not existing:
                 return False
             
-            # 删除关联的dat文件
-            for dat_number in group_info['dat_numbers']:
-                dat_path = Path(self._base_path) / f"{dat_number}.saitdat"
-                if dat_path.exists():
-                    dat_path.unlink()
-                    print(f"已删除: {dat_path.name}")
-            
-            # 删除grp文件
-            group_info['grp_path'].unlink()
-            print(f"已删除: {group_info['grp_path'].name}")
-            
-            # 更新saitset文件
-            saitset_path = Path(self.saitset_path)
-            with open(saitset_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+            steps = []
+            deleted = []
             
-            # 找到并删除对应的索引行
-            new_lines = []
-            in_index_section = False
-            for line in lines:
-                if line.strip() == '.':
-                    in_index_section = not in_index_section
-                    new_lines.append(line)
-                    continue
-                
-                if in_index_section:
-                    if '=' in line:
-                        index, value = line.strip().split('=')
-                        if int(value) != group_number:
-                            new_lines.append(line)
-                else:
-                    new_lines.append(line)
+            # 删除只被这些笔刷组使用的dat和lnk文件
+            for name in self.scan_references().removable_files(existing):
+                path = Path(self._base_path) / name
+                steps.append(JournalStep('delete', path))
+                deleted.append(path)
             
-            # 写回文件
-            with open(saitset_path, 'w', encoding='utf-8', newline='\n') as f:
-                f.writelines(new_lines)
+            # 删除grp文件
+            for group_number in existing:
+                grp_path = Path(self._base_path) / f"_{group_number}.saitgrp"
+                steps.append(JournalStep('delete', grp_path))
+                deleted.append(grp_path)
+            
+            # 从saitset中一次移除这些笔刷组
+            saitset_content = self.render_saitset(remove=existing)
+            if saitset_content is None:
+                return False
+            steps.append(JournalStep('write', Path(self.saitset_path), data=saitset_content))
+            
+            # 相关的资源文件
+            if resource_files:
+                resource_steps = self._resource_delete_steps(resource_files)
+                steps.extend(resource_steps)
+                deleted.extend(step.target for step in resource_steps)
+            
+            # 所有修改记录到日志后一次执行，中途出错时自动回滚
+            name = f"delete_group {existing[0]}" if len(existing) == 1 else f"delete_groups {len(existing)}"
+            if not self.journal.run(name, steps):
+                print("删除笔刷组失败，已恢复原状")
+                return False
             
-            print("笔刷组删除成功")
+            for path in deleted:
+                print(f"已删除: {path.name}")
+            print(f"已删除 {len(existing)} 个笔刷组")
             return True
             
         except Exception as e:
@@ -656,79 +1100,30 @@ class SystemaxReader:
             if not group_info:
                 return {}
             
-            resources = {
-                'brushfom/blotmap': set(),
-                'brushfom/bristle': set(),
-                'brushfom/brshape': set(),
-                'brushtex': set(),
-                'scatter': set()
-            }
+            resources = {rel_dir: set() for rel_dir in RESOURCE_DIRS}
             
-            # 记录已处理的dat文件,避免重复处理
-            processed_dats = set()
+            # 一次批量读取该组所有dat的资源字段（dat_numbers 已经是沿链接找到的实际dat）
+            fields = self.extract_dat_fields(group_info['dat_numbers'])
             
-            # 从笔刷文件中读取资源引用
-            for dat_number in group_info['dat_numbers']:
-                if dat_number in processed_dats:
+            for dat_id in dict.fromkeys(group_info['dat_numbers']):
+                if dat_id not in fields:
                     continue
                 
-                processed_dats.add(dat_number)
-                dat_path = Path(self._base_path) / f"{dat_number}.saitdat"
-                
-                # 检查是否存在链接文件
-                lnk_path = Path(self._base_path) / f"{dat_number}.saitlnk"
-                if lnk_path.exists():
-                    try:
-                        lnk_content = lnk_path.read_text(encoding='utf-8')
-                        for line in lnk_content.splitlines():
-                            if line.startswith('tarid=I:'):
-                                target_id = int(line.split('I:')[1])
-                                if target_id not in processed_dats:
-                                    processed_dats.add(target_id)
-                                    # 使用目标dat文件
-                                    dat_path = Path(self._base_path) / f"{target_id}.saitdat"
-                                break
-                    except Exception as e:
-                        print(f"读取链接文件时出错: {str(e)}")
-                
-                # 读取dat文件内容
-                if dat_path.exists():
-                    try:
-                        content = dat_path.read_text(encoding='utf-8')
-                        fom_category = None
-                        fom_name = None
-                        tex_category = None
-                        tex_name = None
-                        
-                        for line in content.splitlines():
-                            if line.startswith('fomcat=I:'):
-                                fom_category = int(line.split('I:')[1])
-                            elif line.startswith('fomnam=U:'):
-                                fom_name = line.split('U:')[1]
-                            elif line.startswith('texcat=I:'):
-                                tex_category = int(line.split('I:')[1])
-                            elif line.startswith('texnam=U:'):
-                                tex_name = line.split('U:')[1]
-                        
-                        # 根据fomcat和texcat添加资源文件
-                        if fom_name:
-                            if fom_category == 1:
-                                resources['brushfom/blotmap'].add(f"{fom_name}.bmp")
-                            elif fom_category == 2:
-                                resources['brushfom/bristle'].add(f"{fom_name}.bmp")
-                                resources['brushfom/bristle'].add(f"{fom_name}.ini")
-                            elif fom_category == 3:
-                                resources['brushfom/brshape'].add(f"{fom_name}.bmp")
-                                resources['brushfom/brshape'].add(f"{fom_name}.ini")
-                            elif fom_category == 4:
-                                resources['scatter'].add(f"{fom_name}.bmp")
-                                resources['scatter'].add(f"{fom_name}.ini")
-                        
-                        if tex_category == 1 and tex_name:
-                            resources['brushtex'].add(f"{tex_name}.bmp")
-                            
-                    except Exception as e:
-                        print(f"读取资源文件时出错: {str(e)}")
+                # 根据fomcat和texcat添加资源文件：必需的和可选的扩展名都列出
+                for target in self.resource_targets(fields.get(dat_id, 'fomcat'), fields.get(dat_id, 'fomnam'),
+                                                    fields.get(dat_id, 'texcat'), fields.get(dat_id, 'texnam')):
+                    rel_dir, _, name = target.rpartition('/')
+                    required, optional = RESOURCE_EXTENSIONS[rel_dir]
+                    resources[rel_dir].update(f"{name}{ext}" for ext in required + optional)
+            
+            # 使用磁盘上的实际文件名（资源文件名不区分大小写）
+            resource_index = self.get_resource_index()
+            for rel_dir, files in resources.items():
+                actual_names = set()
+                for filename in files:
+                    entry = resource_index.find(rel_dir, filename)
+                    actual_names.add(entry.name if entry else filename)
+                resources[rel_dir] = actual_names
             
             return resources
             
@@ -736,6 +1131,22 @@ class SystemaxReader:
             print(f"获取资源文件列表时出错: {str(e)}")
             return {}
 
+    def _resource_delete_steps(self, resource_files: dict) -> List[JournalStep]:
+        """
+        生成删除资源文件的步骤（不存在的文件跳过）
+        
+        Args:
+            resource_files: 资源文件信息 {目录: [文件名]}
+        """
+        settings_path = Path(self.folder_path) / "SAIv2" / "settings"
+        steps = []
+        for rel_path, files in resource_files.items():
+            for filename in sorted(files):
+                file_path = settings_path / rel_path / filename
+                if file_path.exists():
+                    steps.append(JournalStep('delete', file_path))
+        return steps
+    
     def delete_brush_resources(self, resource_files: dict) -> bool:
         """
         删除笔刷相关的资源文件
@@ -747,24 +1158,16 @@ class SystemaxReader:
             bool: 删除是否成功
         """
         try:
-            base_path = Path(self.folder_path)
-            deleted_files = []
-            
-            for rel_path, files in resource_files.items():
-                full_path = base_path / "SAIv2" / "settings" / rel_path
-                if not full_path.exists():
-                    continue
-                    
-                for filename in files:
-                    file_path = full_path / filename
-                    if file_path.exists():
-                        file_path.unlink()
-                        deleted_files.append(str(file_path.relative_to(base_path)))
+            steps = self._resource_delete_steps(resource_files)
+            if steps and not self.journal.run("delete_resources", steps):
+                print("删除资源文件失败，已恢复原状")
+                return False
             
-            if deleted_files:
+            if steps:
+                base_path = Path(self.folder_path)
                 print("已删除以下资源文件:")
-                for file in deleted_files:
-                    print(f"- {file}")
+                for step in steps:
+                    print(f"- {step.target.relative_to(base_path)}")
             
             return True
             
@@ -772,6 +1175,27 @@ class SystemaxReader:
             print(f"删除资源文件时出错: {str(e)}")
             return False
 
+@dataclass
+class ImportPlan:
+    """导入文件夹的读取结果，预览和导入共用，避免重复读取文件"""
+    import_path: Path
+    grp_file: Path
+    grp_document: Optional[SaiDocument]    # .saitgrp原始内容
+    brush_data: BrushData                  # 预览用的笔刷组结构
+    dat_lines: Dict[int, List[str]]        # dat编号 -> 文件行
+    link_documents: Dict[int, SaiDocument] # lnk编号 -> 文件内容
+    link_map: Dict[int, int]               # lnk编号 -> 目标dat编号
+    resources: Dict[str, List[Path]]       # 资源目录 -> 资源文件
+    file_stats: Dict[str, Tuple[int, int]] # 相对路径 -> (大小, 修改时间)，用于检查预览后文件是否变化
+    total_bytes: int = 0
+    warnings: List[str] = field(default_factory=list)
+    manifest: Optional[dict] = None        # 根据导出清单生成、尚未读取dat/lnk时为清单内容
+    
+    @property
+    def new_ids_needed(self) -> List[int]:
+        """需要分配新编号的dat/lnk编号"""
+        return sorted(set(self.dat_lines) | set(self.link_documents))
+
 class BrushImporter:
     """SAI笔刷导入器"""
     
@@ -782,6 +1206,12 @@ class BrushImporter:
         self.brush_data: Optional[BrushData] = None
         self.saitset_path: Optional[Path] = None
         self.config = ConfigManager()
+        self.imported_grp_number: Optional[int] = None  # 最近一次成功导入的笔刷组序号
+        self.plan: Optional[ImportPlan] = None  # 预览时生成、导入时复用的导入计划
+        self.journal = MutationJournal(self.config.exe_dir / "journal")  # 导入操作的预写日志
+        
+        # 资源目录映射 {导入文件夹中的相对路径: SAI目录中的相对路径}
+        self._resource_paths = {rel_dir: f"SAIv2/settings/{rel_dir}" for rel_dir in RESOURCE_DIRS}
     
     def initialize(self, select_import_folder: bool = False) -> bool:
         """初始化导入器
@@ -790,6 +1220,9 @@ class BrushImporter:
             select_import_folder (bool, optional): 是否选择导入文件夹. Defaults to False.
         """
         try:
+            # 回滚上次中途中断的修改操作
+            self.journal.recover()
+            
             # 从配置中获取SAI路径
             saved_path = self.config.get_sai_path()
             
@@ -818,7 +1251,7 @@ class BrushImporter:
 
     def _get_unused_grp_number(self) -> int:
         """
-        获取未使用的最小grp序列号
+        获取未使用的最小grp序列号（从1开始；_0 是 _0.saitset 使用的名称，不分配给新笔刷组）
         """
         used_numbers = set()
         for file in self.nrm_path.glob("_*.saitgrp"):
@@ -829,131 +1262,109 @@ class BrushImporter:
                 continue
         
         # 寻找未使用的最小序列号
-        for num in range(1000):
+        for num in range(1, 1000):
             if num not in used_numbers:
                 return num
         
         raise ValueError("没有可用的序列号")
 
-    def _update_saitset(self, new_grp_number: int) -> bool:
+    def _render_saitset(self, new_grp_number: int) -> Optional[bytes]:
         """
-        更新_0.saitset文件，添加新的笔刷组引用
+        生成添加了新笔刷组引用的_0.saitset内容（不写入文件）
         
         Args:
             new_grp_number: 新的笔刷组序号
-            
+        
         Returns:
-            bool: 更新是否成功
+            Optional[bytes]: 新的文件内容（原编码），失败返回None
         """
-        try:
-            # 读取现有内容
-            with open(self.saitset_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 分割文件内容
-            parts = content.split('.')
-            if len(parts) != 3:
-                print("错误：saitset文件格式不正确")
-                return False
-            
-            # 解析头部、索引部分和尾部
-            header = parts[0].strip()
-            indices = parts[1].strip()
-            footer = parts[2].strip()
-            
-            # 处理索引部分
-            index_lines = [line.strip() for line in indices.split('\n') if line.strip()]
-            last_index = -1
-            
-            # 找到最后一个索引
-            for line in index_lines:
-                if '=' in line:
-                    index = int(line.split('=')[0])
-                    last_index = max(last_index, index)
-            
-            # 添加新的索引
-            new_index = last_index + 1
-            index_lines.append(f"{new_index}={new_grp_number}")
-            
-            # 重建文件内容，保持原有格式
-            new_content = (
-                f"{header}\n"
-                f".\n"
-                f"{chr(10).join(index_lines)}\n"
-                f".\n"
-                f"{footer}"
-            )
-            
-            # 写回文件
-            with open(self.saitset_path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
-            
-            print(f"已更新 _0.saitset: 添加了 {new_index}={new_grp_number}")
-            return True
-            
-        except Exception as e:
-            print(f"更新 _0.saitset 时发生错误: {str(e)}")
-            return False
+        model = SaitsetModel.load(self.saitset_path)
+        if model is None:
+            return None
+        new_index = model.append([new_grp_number])
+        if new_index:
+            print(f"_0.saitset 将添加 {new_index[0]}={new_grp_number}")
+        return model.encode()
 
     def _get_highest_dat_number(self) -> int:
         """
-        获取nrm目录下.saitdat文件的最高序号
+        获取nrm目录下.saitdat和.saitlnk文件的最高序号
+        
+        dat和lnk共用编号：SAI按编号先找.saitdat再找.saitlnk，新的dat使用已有lnk的编号时
+        会取代该链接，因此新编号必须分配在两者的最高序号之上。
         
         Returns:
             int: 最高序号
         """
         highest_num = -1
-        for file in self.nrm_path.glob("*.saitdat"):
-            try:
-                num = int(file.stem)
-                highest_num = max(highest_num, num)
-            except ValueError:
-                continue
+        with os.scandir(self.nrm_path) as it:
+            for entry in it:
+                stem, ext = os.path.splitext(entry.name)
+                if ext in ('.saitdat', '.saitlnk') and stem.isdigit():
+                    highest_num = max(highest_num, int(stem))
         return highest_num
 
-    def _update_dat_references(self, grp_content: str, old_to_new: Dict[int, int]) -> str:
+    def _build_dedup_index(self):
         """
-        更新.saitgrp文件中的dat引用，保持原有格式
+        建立目标笔刷库的内容指纹索引，用于导入时查重
         
-        Args:
-            grp_content: 原始文件内容
-            old_to_new: 旧序号到新序号的映射
-            
         Returns:
-            str: 更新后的文件内容
+            Tuple[BrushDeduplicator, Dict[str, int]]: (去重器, {指纹: 已有dat编号})
         """
-        lines = grp_content.splitlines()
-        updated_lines = []
-        in_values_section = False
+        # 在函数内导入，避免与brush_dedup模块循环导入
+        from brush_dedup import BrushDeduplicator
         
-        for line in lines:
-            line = line.rstrip()  # 只移除尾部空白
-            if line == '.':
-                in_values_section = not in_values_section
-                updated_lines.append(line)
-                continue
-                
-            if in_values_section and '=' in line:
-                index, old_value = line.split('=')
-                old_value = int(old_value)
-                if old_value in old_to_new:
-                    updated_lines.append(f"{index}={old_to_new[old_value]}")
-                else:
-                    updated_lines.append(line)
-            else:
-                updated_lines.append(line)
-                
-        # 确保只有一个换行符在文件末尾
-        return '\n'.join(updated_lines).rstrip() + '\n'
-
-    def import_brushes(self) -> bool:
-        """执行笔刷导入过程"""
+        reader = SystemaxReader()
+        reader.config = self.config
+        reader._base_path = str(self.nrm_path)
+        deduplicator = BrushDeduplicator(reader)
+        cache_path = self.config.exe_dir / 'dat_index_cache.json'
+        return deduplicator, deduplicator.build_index(cache_path)
+    
+    def import_brushes(self, dedup: bool = True) -> bool:
+        """
+        执行笔刷导入过程
+        
+        直接执行预览时生成的导入计划（self.plan），只重新检查文件状态以发现预览之后的修改；
+        没有计划或文件已变化时重新生成计划。
+        
+        Args:
+            dedup: 为True时，与笔刷库中已有笔刷内容相同的dat不再复制，而是创建指向已有dat的.saitlnk
+        """
         try:
+            # 1. 获取导入计划
+            plan = self.plan
+            if plan is None or plan.import_path != self.import_path:
+                plan = self.build_import_plan()
+            elif self._scan_import_files(plan.import_path) != plan.file_stats:
+                print("导入文件夹在预览后发生了变化，重新读取")
+                plan = self.build_import_plan()
+            if plan is None:
+                return False
+            
+            # 根据导出清单生成的计划：读取文件的同时校验哈希，不一致时按实际文件重新生成计划
+            if plan.manifest is not None and not self._load_manifest_files(plan):
+                print("文件内容与导出清单不一致，重新扫描导入文件夹")
+                plan = self.build_import_plan(use_manifest=False)
+                if plan is None:
+                    return False
+                plan.warnings.append("文件内容与导出清单不一致，已按实际文件导入")
+            self.plan = plan
+            
+            if not plan.dat_lines:
+                print("错误：找不到必要的文件")
+                return False
+            
+            print(f"导入计划: {len(plan.dat_lines)} 个dat文件, {len(plan.link_map)} 个链接文件, "
+                  f"共 {plan.total_bytes} 字节")
+            for warning in plan.warnings:
+                print(f"警告: {warning}")
+            
             # 获取未使用的最小序列号
             new_grp_number = self._get_unused_grp_number()
             print(f"新笔刷组将使用序号: {new_grp_number}")
             
-            # 2. 获取dat文件最高序号并处理dat文件
+            # 2. 获取dat文件最高序号
             highest_dat = self._get_highest_dat_number()
             if highest_dat < 0:
                 print("错误：无法确定当前最高dat序号")
@@ -961,175 +1372,375 @@ class BrushImporter:
             
             next_dat = highest_dat + 1
             
-            # 3. 收集并处理文件
-            dat_files = list(self.import_path.glob("*.saitdat"))
-            grp_files = list(self.import_path.glob("*.saitgrp"))
-            
-            if not dat_files or not grp_files:
-                print("错误：找不到必要的文件")
-                return False
-            
-            # 4. 创建序号映射和处理链接文件
+            # 3. 为计划中的每个dat/lnk编号分配新编号
             old_to_new = {}
-            processed_dats = set()  # 记录已处理的dat文件
-            
-            # 首先处理直接的dat文件
-            for dat_file in dat_files:
-                old_num = int(dat_file.stem)
-                old_to_new[old_num] = next_dat
+            for old_id in plan.new_ids_needed:
+                old_to_new[old_id] = next_dat
                 next_dat += 1
-                processed_dats.add(old_num)
             
-            # 处理链接文件
-            for dat_file in dat_files:
-                old_num = int(dat_file.stem)
-                lnk_file = self.import_path / f"{old_num}.saitlnk"
-                
-                if lnk_file.exists():
-                    try:
-                        # 读取链接文件内容
-                        content = lnk_file.read_text(encoding='utf-8')
-                        for line in content.splitlines():
-                            if line.startswith('tarid=I:'):
-                                target_id = int(line.split('I:')[1])
-                                target_dat = self.import_path / f"{target_id}.saitdat"
-                                
-                                # 如果目标文件存在且尚未处理
-                                if target_dat.exists() and target_id not in processed_dats:
-                                    # 分配新的ID并更新映射
-                                    old_to_new[target_id] = next_dat
-                                    next_dat += 1
-                                    processed_dats.add(target_id)
-                                break
-                    except Exception as e:
-                        print(f"处理链接文件 {lnk_file} 时出错: {str(e)}")
+            # 以下各步骤只生成修改计划，最后记录到日志后一次执行
+            steps = []
+            
+            # 4. 复制并重命名dat文件；与已有笔刷相同的dat改为创建链接
+            deduplicator, existing_dats = self._build_dedup_index() if dedup else (None, {})
+            link_template = deduplicator.link_template() if deduplicator else None
+            linked_to = {}  # 新编号 -> 链接指向的已有dat编号
             
-            # 5. 复制并重命名文件
-            for old_id in processed_dats:
-                dat_file = self.import_path / f"{old_id}.saitdat"
+            for old_id, lines in sorted(plan.dat_lines.items()):
+                dat_file = plan.import_path / f"{old_id}.saitdat"
                 new_id = old_to_new[old_id]
                 new_path = self.nrm_path / f"{new_id}.saitdat"
                 
-                # 复制dat文件
-                shutil.copy2(dat_file, new_path)
-                print(f"已复制: {dat_file.name} -> {new_path.name}")
+                fingerprint = deduplicator.fingerprint_lines(lines) if deduplicator else None
                 
-                # 复制对应的lnk文件(如果存在)
-                lnk_file = self.import_path / f"{old_id}.saitlnk"
-                if lnk_file.exists():
+                if fingerprint in existing_dats:
+                    # 创建指向已有dat的链接，grp中的引用仍指向新编号
+                    target_id = existing_dats[fingerprint]
                     new_lnk_path = self.nrm_path / f"{new_id}.saitlnk"
-                    # 读取并更新链接文件内容
-                    content = lnk_file.read_text(encoding='utf-8')
-                    updated_content = []
-                    for line in content.splitlines():
-                        if line.startswith('tarid=I:'):
-                            target_id = int(line.split('I:')[1])
-                            if target_id in old_to_new:
-                                line = f"tarid=I:{old_to_new[target_id]}"
-                        updated_content.append(line)
-                    
-                    # 写入更新后的链接文件
-                    new_lnk_path.write_text('\n'.join(updated_content) + '\n', encoding='utf-8')
-                    print(f"已更新并复制: {lnk_file.name} -> {new_lnk_path.name}")
-            
-            # 6. 更新并复制.saitgrp文件
-            for grp_file in grp_files:
-                with open(grp_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
+                    steps.append(JournalStep('write', new_lnk_path,
+                                             data=deduplicator.render_link(link_template, target_id)))
+                    linked_to[new_id] = target_id
+                    print(f"与已有笔刷相同，已创建链接: {dat_file.name} -> {new_lnk_path.name} -> {target_id}.saitdat")
+                    continue
                 
-                updated_content = self._update_dat_references(content, old_to_new)
+                # 复制dat文件
+                steps.append(JournalStep('copy', new_path, source=dat_file))
+                print(f"已复制: {dat_file.name} -> {new_path.name}")
+                if fingerprint:
+                    existing_dats[fingerprint] = new_id
+            
+            # 5. 写入更新了目标编号的lnk文件
+            for old_id, link_document in sorted(plan.link_documents.items()):
+                new_id = old_to_new[old_id]
+                if new_id in linked_to:
+                    continue
                 
-                new_grp_path = self.nrm_path / f"_{new_grp_number}.saitgrp"
-                with open(new_grp_path, 'w', encoding='utf-8', newline='\n') as f:
-                    f.write(updated_content)
-                print(f"已更新并复制: {grp_file.name} -> {new_grp_path.name}")
+                # 只改写tarid一行，其余内容、编码和换行符不变
+                new_lnk_path = self.nrm_path / f"{new_id}.saitlnk"
+                document = link_document.copy()
+                target_id = plan.link_map.get(old_id)
+                if target_id in old_to_new:
+                    new_target = old_to_new[target_id]
+                    # 目标已被替换为链接时直接指向其最终的dat，避免链接链
+                    document.set('tarid', str(linked_to.get(new_target, new_target)))
+                steps.append(document.step(new_lnk_path))
+                print(f"已更新并复制: {old_id}.saitlnk -> {new_lnk_path.name}")
+            
+            # 6. 更新并复制.saitgrp文件（只改写映射部分中编号有变化的行）
+            grp_document = plan.grp_document.copy()
+            grp_document.remap(old_to_new)
+            new_grp_path = self.nrm_path / f"_{new_grp_number}.saitgrp"
+            steps.append(grp_document.step(new_grp_path))
+            print(f"已更新并复制: {plan.grp_file.name} -> {new_grp_path.name}")
             
             # 7. 更新 _0.saitset 文件
-            if not self._update_saitset(new_grp_number):
+            saitset_content = self._render_saitset(new_grp_number)
+            if saitset_content is None:
                 print("警告：更新 _0.saitset 失败")
                 return False
+            steps.append(JournalStep('write', self.saitset_path, data=saitset_content))
 
             # 8. 复制相关的资源文件
             print("\n开始复制相关资源文件...")
-            self._copy_brush_resources()
+            self._copy_brush_resources(plan.resources, steps)
+            
+            # 9. 记录到日志后执行所有修改，中途出错时自动回滚
+            if not self.journal.run(f"import {plan.import_path.name}", steps):
+                print("导入失败，笔刷库已恢复原状")
+                return False
             
+            self.imported_grp_number = new_grp_number
             print("\n导入完成！")
             print(f"笔刷组已导入为序号: {new_grp_number}")
             print(f"相关的dat文件序号范围: {highest_dat+1} - {next_dat-1}")
+            if linked_to:
+                print(f"其中 {len(linked_to)} 个笔刷与笔刷库中已有笔刷相同，已创建链接而未复制")
             return True
             
         except Exception as e:
             print(f"导入过程中发生错误: {str(e)}")
             return False
 
-    def read_brush_structure(self) -> Optional[BrushData]:
+    def _scan_import_files(self, import_path: Path) -> Dict[str, Tuple[int, int]]:
         """
-        读取笔刷组结构
+        列出导入文件夹及其资源子目录中的文件状态
+        
+        Args:
+            import_path: 导入文件夹
         
         Returns:
-            Optional[BrushData]: 笔刷数据对象
+            Dict[str, Tuple[int, int]]: {相对路径: (大小, 修改时间)}
+        """
+        file_stats = {}
+        for rel_dir in [''] + list(self._resource_paths):
+            folder = import_path / rel_dir
+            if not folder.is_dir():
+                continue
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        key = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                        file_stats[key] = (stat.st_size, stat.st_mtime_ns)
+        return file_stats
+    
+    def _load_manifest(self, file_stats: Dict[str, Tuple[int, int]]) -> Optional[dict]:
+        """
+        读取导入文件夹中的导出清单
+        
+        Args:
+            file_stats: 导入文件夹的文件状态
+        
+        Returns:
+            Optional[dict]: 清单内容；没有清单、版本不符，或清单中的文件名和大小与文件夹不一致时返回None
+        """
+        if EXPORT_MANIFEST not in file_stats:
+            return None
+        try:
+            with open(self.import_path / EXPORT_MANIFEST, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except Exception as e:
+            print(f"读取导出清单时出错: {str(e)}")
+            return None
+        if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+            return None
+        
+        files = manifest.get('files', {})
+        current = {name: stat for name, stat in file_stats.items() if name != EXPORT_MANIFEST}
+        if set(files) != set(current) or any(current[name][0] != info.get('size') for name, info in files.items()):
+            print("导出清单与文件夹中的文件不一致，改为扫描文件夹")
+            return None
+        return manifest
+    
+    def _plan_from_manifest(self, manifest: dict, file_stats: Dict[str, Tuple[int, int]]) -> ImportPlan:
+        """
+        只根据导出清单生成导入计划（不读取grp、dat和lnk，导入时再读取并校验）
+        
+        Args:
+            manifest: 导出清单
+            file_stats: 导入文件夹的文件状态
+        """
+        group = manifest['group']
+        brushes = manifest['brushes']
+        link_map = {int(lnk_id): int(target) for lnk_id, target in manifest.get('links', {}).items()}
+        warnings = list(manifest.get('warnings', []))
+        
+        dat_ids = set()
+        for name in file_stats:
+            stem, ext = os.path.splitext(name)
+            if '/' not in name and ext == '.saitdat' and stem.isdigit():
+                dat_ids.add(int(stem))
+        for brush in brushes:
+            if brush['dat'] not in dat_ids and brush['dat'] not in link_map:
+                warnings.append(f"笔刷组引用的 {brush['dat']}.saitdat 不存在")
+        for lnk_id, target_id in link_map.items():
+            if target_id not in dat_ids and target_id not in link_map:
+                warnings.append(f"{lnk_id}.saitlnk 指向的 {target_id}.saitdat 不存在")
+        
+        resources = {}
+        for rel_dir, names in manifest.get('resources', {}).items():
+            if rel_dir in self._resource_paths and names:
+                resources[rel_dir] = sorted(self.import_path / rel_dir / name for name in names)
+        
+        return ImportPlan(
+            import_path=self.import_path,
+            grp_file=self.import_path / group['grp'],
+            grp_document=None,
+            brush_data=BrushData(
+                name=group['name'],
+                values=np.array([brush['dat'] for brush in brushes]),
+                indices=np.array([brush['index'] for brush in brushes]),
+                sub_brushes={brush['index']: brush['name'] for brush in brushes if brush.get('name')}
+            ),
+            dat_lines={},
+            link_documents={},
+            link_map=link_map,
+            resources=resources,
+            file_stats=file_stats,
+            total_bytes=sum(size for size, _ in file_stats.values()),
+            warnings=warnings,
+            manifest=manifest
+        )
+    
+    def _load_manifest_files(self, plan: ImportPlan) -> bool:
+        """
+        读取根据导出清单生成的计划所需的grp、dat和lnk，同时用清单中的哈希校验所有文件
+        
+        Args:
+            plan: 导入计划，成功时补全其中的文件内容
+        
+        Returns:
+            bool: 所有文件是否与清单一致
+        """
+        grp_document = None
+        dat_lines = {}
+        link_documents = {}
+        link_map = {}
+        for name, info in plan.manifest['files'].items():
+            with open(plan.import_path / name, 'rb') as f:
+                data = f.read()
+            if hashlib.sha1(data).hexdigest() != info.get('sha1'):
+                print(f"校验失败: {name} 的内容与导出清单不一致")
+                return False
+            if '/' in name:
+                continue
+            
+            stem, ext = os.path.splitext(name)
+            if name == plan.grp_file.name:
+                grp_document = SaiDocument.decode(data)
+            elif stem.isdigit() and ext == '.saitdat':
+                dat_lines[int(stem)] = decode_lines(data)
+            elif stem.isdigit() and ext == '.saitlnk':
+                document = SaiDocument.decode(data)
+                link_documents[int(stem)] = document
+                target_id = document.get_int('tarid')
+                if target_id is not None:
+                    link_map[int(stem)] = target_id
+        
+        if not grp_document:
+            print(f"错误: 无法读取笔刷组文件 {plan.grp_file.name}")
+            return False
+        plan.grp_document = grp_document
+        plan.dat_lines = dat_lines
+        plan.link_documents = link_documents
+        plan.link_map = link_map
+        plan.manifest = None
+        return True
+    
+    def build_import_plan(self, use_manifest: bool = True) -> Optional[ImportPlan]:
+        """
+        读取并校验导入文件夹，生成导入计划
+        
+        文件夹只列出一次。有有效的导出清单时只读取清单；否则grp、每个dat和每个lnk都只读取一次。
+        
+        Args:
+            use_manifest: 是否使用导出清单
+        
+        Returns:
+            Optional[ImportPlan]: 导入计划，读取失败返回None
         """
         if not self.import_path:
             print("错误：尚未初始化导入器")
             return None
             
-        # 查找.saitgrp文件
-        grp_files = list(self.import_path.glob("*.saitgrp"))
-        if not grp_files:
+        file_stats = self._scan_import_files(self.import_path)
+        if use_manifest:
+            manifest = self._load_manifest(file_stats)
+            if manifest is not None:
+                try:
+                    return self._plan_from_manifest(manifest, file_stats)
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"导出清单格式不正确，改为扫描文件夹: {str(e)}")
+        grp_names = sorted(name for name in file_stats if name.endswith('.saitgrp') and '/' not in name)
+        if not grp_names:
             print("错误：找不到.saitgrp文件")
             return None
             
-        grp_file = grp_files[0]  # 使用找到的第一个.saitgrp文件
+        grp_file = self.import_path / grp_names[0]  # 使用找到的第一个.saitgrp文件
         print(f"正在读取笔刷组文件: {grp_file}")  # 调试信息
+        warnings = []
+        if len(grp_names) > 1:
+            warnings.append(f"文件夹中有多个.saitgrp文件，只导入 {grp_file.name}")
         
-        try:
-            lines = self._read_file_with_encodings(str(grp_file))
-            if not lines:
-                print(f"错误: 无法读取笔刷组文件 {grp_file.name}")
-                return None
+        grp_document = SaiDocument.load(grp_file)
+        if not grp_document:
+            print(f"错误: 无法读取笔刷组文件 {grp_file.name}")
+            return None
                 
-            # 读取笔刷组名称
-            brush_name = None
-            values = []
-            indices = []
-            sub_brushes = {}
-            reading_values = False
-            
-            for line in lines:
+        # 读取dat和lnk文件
+        dat_lines = {}
+        link_documents = {}
+        link_map = {}
+        for name in file_stats:
+            stem, ext = os.path.splitext(name)
+            if '/' in name or not stem.isdigit():
+                continue
+            if ext == '.saitdat':
+                lines = read_lines(self.import_path / name)
+                if lines is not None:
+                    dat_lines[int(stem)] = lines
+            elif ext == '.saitlnk':
+                document = SaiDocument.load(self.import_path / name)
+                if document is None:
+                    continue
+                link_documents[int(stem)] = document
+                target_id = document.get_int('tarid')
+                if target_id is not None:
+                    link_map[int(stem)] = target_id
+            
+        def dat_name(dat_id: int, depth: int = 0) -> Optional[str]:
+            """读取笔刷名称，必要时沿文件夹内的链接查找"""
+            for line in dat_lines.get(dat_id, []):
                 line = line.strip()
                 if line.startswith('name=U:'):
-                    brush_name = line.split('U:')[1]
-                elif line == '.':
-                    reading_values = not reading_values
-                    continue
-                elif reading_values and line:
-                    index, dat_value = line.split('=')
-                    index = int(index)
-                    dat_value = int(dat_value)
-                    indices.append(index)
-                    values.append(dat_value)
-                    
-                    # 读取对应的.saitdat文件中的笔刷名称
-                    dat_file = self.import_path / f"{dat_value}.saitdat"
-                    if dat_file.exists():
-                        sub_brush_name = self._read_saitdat(dat_file)
-                        if sub_brush_name:
-                            sub_brushes[index] = sub_brush_name
-            
-            # 如果没有找到名称，使用文件夹名称
-            if not brush_name:
-                brush_name = self.import_path.name
+                    return line.split('U:')[1]
+            if dat_id in link_map and depth < len(link_map):
+                return dat_name(link_map[dat_id], depth + 1)
+            return None
+        
+        # 解析grp文件
+        brush_name = grp_document.get('name')
+        values = []
+        indices = []
+        sub_brushes = {}
+        
+        for _, index, dat_value in grp_document.entries():
+            indices.append(index)
+            values.append(dat_value)
             
-            return BrushData(
+            if dat_value not in dat_lines and dat_value not in link_map:
+                warnings.append(f"笔刷组引用的 {dat_value}.saitdat 不存在")
+                continue
+            sub_brush_name = dat_name(dat_value)
+            if sub_brush_name:
+                sub_brushes[index] = sub_brush_name
+                    
+        for lnk_id, target_id in link_map.items():
+            if target_id not in dat_lines and target_id not in link_map:
+                warnings.append(f"{lnk_id}.saitlnk 指向的 {target_id}.saitdat 不存在")
+            
+        # 如果没有找到名称，使用文件夹名称
+        if not brush_name:
+            brush_name = self.import_path.name
+            
+        resources = {}
+        for rel_dir in self._resource_paths:
+            files = [self.import_path / name for name in file_stats if name.startswith(rel_dir + '/')]
+            if files:
+                resources[rel_dir] = sorted(files)
+        
+        return ImportPlan(
+            import_path=self.import_path,
+            grp_file=grp_file,
+            grp_document=grp_document,
+            brush_data=BrushData(
                 name=brush_name,
                 values=np.array(values),
                 indices=np.array(indices),
                 sub_brushes=sub_brushes
-            )
+            ),
+            dat_lines=dat_lines,
+            link_documents=link_documents,
+            link_map=link_map,
+            resources=resources,
+            file_stats=file_stats,
+            total_bytes=sum(size for size, _ in file_stats.values()),
+            warnings=warnings
+        )
             
+    def read_brush_structure(self) -> Optional[BrushData]:
+        """
+        读取笔刷组结构，同时生成供导入使用的导入计划（self.plan）
+        
+        Returns:
+            Optional[BrushData]: 笔刷数据对象
+        """
+        try:
+            self.plan = self.build_import_plan()
         except Exception as e:
-            print(f"错误: 处理文件 {grp_file.name} 时发生异常: {str(e)}")
-            return None
+            print(f"错误: 读取导入文件夹 {self.import_path} 时发生异常: {str(e)}")
+            self.plan = None
+        return self.plan.brush_data if self.plan else None
     
     def generate_text_structure(self) -> str:
         """
@@ -1138,15 +1749,27 @@ class BrushImporter:
         Returns:
             str: 格式化的笔刷结构文本
         """
+        return "".join(self.iter_text_structure())
+    
+    def iter_text_structure(self):
+        """
+        以生成器形式产生导入笔刷组的结构文本
+        
+        所有文本块直接拼接（"".join）即为 generate_text_structure 的结果。
+        
+        Yields:
+            str: 文本块
+        """
         # 读取并保存笔刷数据
         self.brush_data = self.read_brush_structure()
         
         if not self.brush_data:
-            return "没有找到笔刷数据"
+            yield "没有找到笔刷数据"
+            return
+        
+        yield "导入的笔刷结构:\n" + "=" * 50
             
         output = []
-        output.append("导入的笔刷结构:")
-        output.append("=" * 50)
         
         # 添加笔刷组信息
         output.append(f"\n【笔刷组】{self.brush_data.name}")
@@ -1165,7 +1788,12 @@ class BrushImporter:
         
         output.append("-" * 50)
         
-        return "\n".join(output)
+        if self.plan and self.plan.warnings:
+            output.append("警告:")
+            for warning in self.plan.warnings:
+                output.append(f"- {warning}")
+        
+        yield "\n" + "\n".join(output)
 
     def run(self):
         """运行导入工具的主流程"""
@@ -1173,10 +1801,11 @@ class BrushImporter:
             return
         
         print("\n当前笔刷组结构:")
-        structure = self.generate_text_structure()
-        print(structure)
+        for chunk in self.iter_text_structure():
+            sys.stdout.write(chunk)
+        sys.stdout.write("\n")
         
-        if structure == "没有找到笔刷数据":
+        if not self.brush_data:
             return
         
         while True:
@@ -1190,74 +1819,32 @@ class BrushImporter:
             else:
                 print("请输入 y 或 n")
 
-    def _read_file_with_encodings(self, file_path: str) -> Optional[List[str]]:
+    def _copy_brush_resources(self, resources: Optional[Dict[str, List[Path]]] = None,
+                              steps: Optional[List[JournalStep]] = None) -> None:
         """
-        使用多种编码尝试读取文件
+        复制笔刷相关的资源文件（形状、纹理等）到对应目录
         
         Args:
-            file_path: 文件路径
-            
-        Returns:
-            Optional[List[str]]: 文件行列表，读取失败返回None
-        """
-        encodings = ['utf-8', 'shift-jis', 'cp932', 'latin1']
-        
-        for encoding in encodings:
-            try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    return f.readlines()
-            except UnicodeDecodeError:
-                continue
-        
-        print(f"无法读取文件 {file_path}")
-        return None
-
-    def _read_saitdat(self, dat_file: Path) -> Optional[str]:
+            resources: 导入计划中列出的资源文件 {资源目录: [文件路径]}，None时扫描导入文件夹
+            steps: 不为None时不直接复制，而是把复制步骤加入该列表，由预写日志执行
         """
-        读取.saitdat文件中的笔刷名称
-        
-        Args:
-            dat_file: .saitdat文件路径
-            
-        Returns:
-            Optional[str]: 笔刷名称，读取失败返回None
-        """
-        try:
-            lines = self._read_file_with_encodings(str(dat_file))
-            if lines:
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith('name=U:'):
-                        return line.split('U:')[1]
-            
-            print(f"警告: 在文件 {dat_file.name} 中找不到笔刷名称")
-            return None
-            
-        except Exception as e:
-            print(f"错误: 处理文件 {dat_file.name} 时发生异常: {str(e)}")
-            return None
-
-    def _copy_brush_resources(self) -> None:
-        """复制笔刷相关的资源文件（形状、纹理等）到对应目录"""
         if not self.import_path or not self.sai_path:
             return
 
-        # 定义资源目录映射
-        resource_paths = {
-            'brushfom/blotmap': 'SAIv2/settings/brushfom/blotmap',
-            'brushfom/bristle': 'SAIv2/settings/brushfom/bristle',
-            'brushfom/brshape': 'SAIv2/settings/brushfom/brshape',
-            'scatter': 'SAIv2/settings/scatter',
-            'brushtex': 'SAIv2/settings/brushtex'
-        }
+        if resources is None:
+            resources = {}
+            for src_rel_path in self._resource_paths:
+                src_path = self.import_path / src_rel_path
+                if src_path.exists():
+                    resources[src_rel_path] = sorted(src_path.glob('*.*'))
 
+        # 目标目录中已有的文件（不区分大小写）
+        resource_index = ResourceIndex(self.sai_path / "SAIv2" / "settings")
+        resource_index.refresh()
+        
         # 遍历每个资源目录
-        for src_rel_path, dst_rel_path in resource_paths.items():
-            src_path = self.import_path / src_rel_path
-            dst_path = self.sai_path / dst_rel_path
-
-            if not src_path.exists():
-                continue
+        for src_rel_path, src_files in resources.items():
+            dst_path = self.sai_path / self._resource_paths[src_rel_path]
 
             print(f"\n检查资源目录: {src_rel_path}")
 
@@ -1266,15 +1853,18 @@ class BrushImporter:
                 dst_path.mkdir(parents=True, exist_ok=True)
 
                 # 复制目录中的所有文件
-                for src_file in src_path.glob('*.*'):
+                for src_file in src_files:
                     dst_file = dst_path / src_file.name
 
-                    if dst_file.exists():
+                    if resource_index.find(src_rel_path, src_file.name):
                         print(f"发现同名文件，跳过: {src_file.name}")
                         continue
 
                     try:
-                        shutil.copy2(src_file, dst_file)
+                        if steps is not None:
+                            steps.append(JournalStep('copy', dst_file, source=src_file))
+                        else:
+                            shutil.copy2(src_file, dst_file)
                         print(f"已复制: {src_file.name}")
                     except Exception as e:
                         print(f"复制文件 {src_file.name} 时出错: {str(e)}")
@@ -1290,8 +1880,15 @@ class BrushImporter:
 
 # 使用示例
 if __name__ == '__main__':
-    importer = BrushImporter()
-    importer.run()
+    if sys.argv[1:2] == ['structure']:
+        # 逐个笔刷组输出当前笔刷库结构，内存占用不随笔刷库大小增长
+        reader = SystemaxReader()
+        for chunk in reader.iter_text_structure():
+            sys.stdout.write(chunk)
+        sys.stdout.write("\n")
+    else:
+        importer = BrushImporter()
+        importer.run()
 
 # fomcat = 0: 不调用形状，不用管
 # fomcat = 1: 形状调用路径为：SAIv2\settings\brushfom\blotmap
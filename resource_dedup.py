@@ -0,0 +1,408 @@
+import hashlib
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from read_Systemax import SystemaxReader
+from resource_index import RESOURCE_EXTENSIONS
+from sai_codec import SaiDocument
+from thumbnail_cache import read_bmp
+
+# 默认的相似阈值：感知哈希（64位）的汉明距离不超过该值视为近似重复
+PHASH_THRESHOLD = 6
+# 平均亮度（0-255）相差超过该值时不视为重复（纯色图像的感知哈希都相同）
+MEAN_TOLERANCE = 8
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """n点DCT-II变换矩阵"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+_DCT_32 = _dct_matrix(32)
+
+def _area_resize(gray: np.ndarray, n: int) -> np.ndarray:
+    """把灰度图缩放为 n×n：缩小时按区域平均，放大时按最近邻"""
+    for axis in (0, 1):
+        length = gray.shape[axis]
+        if length >= n:
+            edges = np.arange(n + 1) * length // n
+            sums = np.add.reduceat(gray, edges[:-1], axis=axis)
+            counts = np.diff(edges).astype(np.float32)
+            gray = sums / (counts[:, None] if axis == 0 else counts[None, :])
+        else:
+            gray = np.take(gray, np.arange(n) * length // n, axis=axis)
+    return gray
+
+def perceptual_hash(pixels: np.ndarray) -> Tuple[int, float]:
+    """
+    计算图像的DCT感知哈希
+    
+    灰度图缩放到32×32后做二维DCT，取左上角8×8的低频系数，与（不含直流分量的）中位数比较得到64位哈希。
+    
+    Args:
+        pixels: (高, 宽, 3) 的uint8数组
+    
+    Returns:
+        Tuple[int, float]: (64位哈希, 平均亮度)
+    """
+    gray = pixels.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    small = _area_resize(gray, 32)
+    coefficients = (_DCT_32 @ small @ _DCT_32.T)[:8, :8].ravel()
+    bits = coefficients > np.median(coefficients[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big'), float(gray.mean())
+
+class BKTree:
+    """按汉明距离组织的BK树，用于查找距离不超过阈值的哈希，不需要两两比较"""
+    
+    def __init__(self):
+        self._root = None   # [哈希, [条目], {距离: 子节点}]
+    
+    def add(self, value: int, item) -> None:
+        """加入一个哈希（相同的哈希共用一个节点）"""
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = bin(node[0] ^ value).count('1')
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+    
+    def query(self, value: int, radius: int) -> List[Tuple[int, object]]:
+        """
+        查找与value的汉明距离不超过radius的条目
+        
+        Returns:
+            List[Tuple[int, object]]: (距离, 条目)
+        """
+        results = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = bin(node[0] ^ value).count('1')
+            if distance <= radius:
+                results.extend((distance, item) for item in node[1])
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return results
+
+@dataclass
+class ResourceImage:
+    """资源目录中的一个位图"""
+    rel_dir: str
+    name: str            # 磁盘上的文件名（含扩展名）
+    path: Path
+    width: int
+    height: int
+    mean: float
+    phash: int
+    
+    @property
+    def stem(self) -> str:
+        return os.path.splitext(self.name)[0]
+
+@dataclass
+class ResourceCluster:
+    """一组近似重复的资源"""
+    rel_dir: str
+    canonical: str                                         # 保留的资源名称（不含扩展名）
+    duplicates: List[str] = field(default_factory=list)    # 近似重复的资源名称
+    distances: Dict[str, int] = field(default_factory=dict)  # 与保留资源的汉明距离
+    references: Dict[str, List[int]] = field(default_factory=dict)  # 资源名称 -> 引用它的dat编号
+
+class ResourceDeduplicator:
+    """形状和纹理的近似重复检测
+    
+    资源目录通过缓存的目录列表枚举，每个位图的感知哈希按 (文件大小, 修改时间) 缓存；
+    同一目录中尺寸相同的位图放入BK树，按汉明距离查找近邻并合并为重复组。
+    带.ini的资源（bristle、brshape、scatter）只有.ini内容也相同时才视为重复。
+    """
+    
+    def __init__(self, reader: SystemaxReader, threshold: int = PHASH_THRESHOLD):
+        """
+        Args:
+            reader: 已初始化的SystemaxReader
+            threshold: 汉明距离阈值，0表示只查找哈希完全相同的位图
+        """
+        self.reader = reader
+        self.threshold = threshold
+        self.settings_path = Path(reader.folder_path) / "SAIv2" / "settings"
+        self.nrm_path = reader.library_path
+    
+    def hash_all(self, cache_path: Optional[Path] = None) -> List[ResourceImage]:
+        """
+        计算所有资源位图的感知哈希
+        
+        Args:
+            cache_path: 哈希缓存文件，None表示不使用缓存
+        
+        Returns:
+            List[ResourceImage]: 可以解码的位图
+        """
+        cache = {}
+        cache_key = {'settings_path': str(self.settings_path)}
+        if cache_path and cache_path.exists():
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('key') == cache_key:
+                    cache = data.get('entries', {})
+            except Exception as e:
+                print(f"读取哈希缓存时出错: {str(e)}")
+        
+        resource_index = self.reader.get_resource_index()
+        entries = {}
+        images = []
+        for rel_dir in RESOURCE_EXTENSIONS:
+            for entry in resource_index.files(rel_dir).values():
+                if not entry.name.lower().endswith('.bmp'):
+                    continue
+                rel_path = f"{rel_dir}/{entry.name}"
+                cached = cache.get(rel_path)
+                if cached and cached[0] == entry.size and cached[1] == entry.mtime_ns:
+                    values = cached[2:]
+                else:
+                    try:
+                        pixels = read_bmp(entry.path)
+                    except OSError as e:
+                        print(f"读取 {rel_path} 时出错: {str(e)}")
+                        continue
+                    if pixels is None:
+                        values = [0, 0, 0.0, None]
+                    else:
+                        phash, mean = perceptual_hash(pixels)
+                        values = [pixels.shape[1], pixels.shape[0], round(mean, 2), f"{phash:016x}"]
+                entries[rel_path] = [entry.size, entry.mtime_ns] + values
+                if values[3] is not None:
+                    images.append(ResourceImage(rel_dir, entry.name, entry.path, values[0], values[1],
+                                                values[2], int(values[3], 16)))
+        
+        if cache_path and entries != cache:
+            try:
+                with open(cache_path, 'w', encoding='utf-8') as f:
+                    json.dump({'key': cache_key, 'entries': entries}, f)
+            except Exception as e:
+                print(f"保存哈希缓存时出错: {str(e)}")
+        return images
+    
+    def references(self) -> Dict[Tuple[str, str], List[int]]:
+        """
+        统计每个资源被哪些dat引用
+        
+        Returns:
+            Dict[Tuple[str, str], List[int]]: {(资源目录, casefold后的资源名称): [dat编号]}
+        """
+        fields = self.reader.get_dat_extractor().extract_all()
+        refs: Dict[Tuple[str, str], List[int]] = {}
+        for dat_id in fields.ids.tolist():
+            targets = self.reader.resource_targets(fields.get(dat_id, 'fomcat'), fields.get(dat_id, 'fomnam'),
+                                                   fields.get(dat_id, 'texcat'), fields.get(dat_id, 'texnam'))
+            for target in targets:
+                rel_dir, name = target.rsplit('/', 1)
+                refs.setdefault((rel_dir, name.casefold()), []).append(dat_id)
+        return refs
+    
+    def _ini_digest(self, image: ResourceImage) -> Optional[str]:
+        """资源的.ini内容摘要（没有.ini的目录或文件不存在时为None）"""
+        if '.ini' not in RESOURCE_EXTENSIONS[image.rel_dir][0] + RESOURCE_EXTENSIONS[image.rel_dir][1]:
+            return None
+        entry = self.reader.get_resource_index().find(image.rel_dir, f"{image.stem}.ini")
+        if entry is None:
+            return None
+        with open(entry.path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    
+    def _split_cluster(self, images: List[ResourceImage],
+                       refs: Dict[Tuple[str, str], List[int]]) -> List[ResourceCluster]:
+        """
+        从一组连通的近似资源中选出保留资源，只把与它直接相似的资源作为重复
+        
+        并查集会把 A≈B、B≈C 连成一组，但A和C可能相差很远；与保留资源的距离或亮度超出阈值的资源
+        从该组中移出，在剩下的资源中重新选择保留资源并分组。
+        
+        Args:
+            images: 同一目录、尺寸和.ini都相同的连通资源
+            refs: references 的结果
+        
+        Returns:
+            List[ResourceCluster]: 每组中所有重复与保留资源的距离都不超过阈值
+        """
+        clusters = []
+        remaining = list(images)
+        while len(remaining) >= 2:
+            rel_dir = remaining[0].rel_dir
+            users = {image.stem: refs.get((rel_dir, image.stem.casefold()), []) for image in remaining}
+            canonical = min(remaining, key=lambda image: (-len(users[image.stem]), len(image.name), image.name))
+            distances = {image.stem: bin(image.phash ^ canonical.phash).count('1') for image in remaining}
+            duplicates = sorted((image for image in remaining if image is not canonical
+                                 and distances[image.stem] <= self.threshold
+                                 and abs(image.mean - canonical.mean) <= MEAN_TOLERANCE),
+                                key=lambda image: image.name)
+            if duplicates:
+                members = [canonical] + duplicates
+                clusters.append(ResourceCluster(
+                    rel_dir=rel_dir,
+                    canonical=canonical.stem,
+                    duplicates=[image.stem for image in duplicates],
+                    distances={image.stem: distances[image.stem] for image in duplicates},
+                    references={image.stem: users[image.stem] for image in members}
+                ))
+            remaining = [image for image in remaining if image is not canonical and image not in duplicates]
+        return clusters
+    
+    def find_clusters(self, images: Optional[List[ResourceImage]] = None,
+                      cache_path: Optional[Path] = None) -> List[ResourceCluster]:
+        """
+        查找近似重复的资源
+        
+        Args:
+            images: hash_all 的结果，None时重新计算
+            cache_path: 哈希缓存文件
+        
+        Returns:
+            List[ResourceCluster]: 重复组，保留引用最多的资源（相同时保留名称较短的）；
+            每个重复资源与保留资源的距离都不超过阈值
+        """
+        if images is None:
+            images = self.hash_all(cache_path)
+        refs = self.references()
+        
+        # 同一目录、尺寸相同的位图才可能互相替换
+        buckets: Dict[Tuple[str, int, int], List[int]] = {}
+        for i, image in enumerate(images):
+            buckets.setdefault((image.rel_dir, image.width, image.height), []).append(i)
+        
+        parent = list(range(len(images)))
+        
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            tree = BKTree()
+            for i in members:
+                image = images[i]
+                for _, j in tree.query(image.phash, self.threshold):
+                    if abs(images[j].mean - image.mean) <= MEAN_TOLERANCE:
+                        parent[find(i)] = find(j)
+                tree.add(image.phash, i)
+        
+        groups: Dict[int, List[int]] = {}
+        for i in range(len(images)):
+            groups.setdefault(find(i), []).append(i)
+        
+        clusters = []
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            # .ini不同的资源笔刷效果不同，按.ini内容再分组
+            by_ini: Dict[Optional[str], List[ResourceImage]] = {}
+            for i in members:
+                by_ini.setdefault(self._ini_digest(images[i]), []).append(images[i])
+            for same_ini in by_ini.values():
+                clusters.extend(self._split_cluster(same_ini, refs))
+        clusters.sort(key=lambda cluster: (cluster.rel_dir, cluster.canonical))
+        return clusters
+    
+    def rewrite_references(self, clusters: List[ResourceCluster], dry_run: bool = False) -> Dict[str, int]:
+        """
+        把引用重复资源的.saitdat改为引用保留的资源（不删除资源文件）
+        
+        所有修改通过预写日志一次写入；只改写对应的 fomnam/texnam 行，其他行的字节、编码和换行符保持不变。
+        
+        Args:
+            clusters: find_clusters 的结果
+            dry_run: 只统计，不修改文件
+        
+        Returns:
+            Dict[str, int]: {'files': 实际改写的dat数量, 'skipped': 无法读取或新名称无法用原编码表示而跳过的dat数量}
+        """
+        # dat编号 -> [(字段, 新名称)]
+        edits: Dict[int, List[Tuple[str, str]]] = {}
+        for cluster in clusters:
+            key = 'texnam' if cluster.rel_dir == 'brushtex' else 'fomnam'
+            for name in cluster.duplicates:
+                for dat_id in cluster.references.get(name, []):
+                    edits.setdefault(dat_id, []).append((key, cluster.canonical))
+        
+        result = {'files': 0, 'skipped': 0}
+        steps = []
+        for dat_id, changes in sorted(edits.items()):
+            dat_path = self.nrm_path / f"{dat_id}.saitdat"
+            document = SaiDocument.load(dat_path)
+            if document is None:
+                result['skipped'] += 1
+                continue
+            for key, new_name in changes:
+                if document.find(key) is not None:
+                    document.set(key, new_name)
+            if not document.dirty:
+                # 已经引用保留的资源（或没有对应的字段），不需要写入
+                continue
+            try:
+                steps.append(document.step())
+            except UnicodeEncodeError as e:
+                print(f"跳过 {dat_id}.saitdat: 新的名称无法用 {document.encoding} 编码 ({str(e)})")
+                result['skipped'] += 1
+                continue
+            result['files'] += 1
+        
+        if dry_run or not steps:
+            return result
+        if not self.reader.journal.run("resource_dedup", steps):
+            print("改写资源引用失败，已恢复原状")
+            return {'files': 0, 'skipped': result['skipped']}
+        return result
+    
+    def generate_report(self, clusters: List[ResourceCluster]) -> str:
+        """
+        生成近似重复资源的文本报告
+        
+        Args:
+            clusters: find_clusters 的结果
+        
+        Returns:
+            str: 报告文本
+        """
+        if not clusters:
+            return "没有发现近似重复的形状或纹理"
+        
+        summary = self.rewrite_references(clusters, dry_run=True)
+        output = [f"发现 {len(clusters)} 组近似重复的形状或纹理，共 {sum(len(c.duplicates) for c in clusters)} 个重复资源，"
+                  f"{summary['files']} 个笔刷可以改为引用保留的资源"]
+        for cluster in clusters:
+            duplicates = ', '.join(f"{name}（距离 {cluster.distances[name]}，{len(cluster.references.get(name, []))} 个笔刷）"
+                                   for name in cluster.duplicates)
+            output.append(f"- {cluster.rel_dir}: 保留 {cluster.canonical}"
+                          f"（{len(cluster.references.get(cluster.canonical, []))} 个笔刷），重复: {duplicates}")
+        return '\n'.join(output)
+
+if __name__ == '__main__':
+    # python resource_dedup.py [--apply]
+    reader = SystemaxReader()
+    if reader.initialize():
+        deduplicator = ResourceDeduplicator(reader)
+        found = deduplicator.find_clusters(cache_path=reader.config.exe_dir / 'phash_cache.json')
+        print(deduplicator.generate_report(found))
+        if found and '--apply' in sys.argv[1:]:
+            result = deduplicator.rewrite_references(found)
+            print(f"已改写 {result['files']} 个笔刷，跳过 {result['skipped']} 个")
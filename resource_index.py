@@ -0,0 +1,127 @@
+import os
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# 各资源目录（相对 SAIv2/settings）的文件扩展名：(必需, 存在时一并复制)
+RESOURCE_EXTENSIONS = {
+    'brushfom/blotmap': (('.bmp',), ()),
+    'brushfom/bristle': (('.bmp',), ('.ini',)),
+    'brushfom/brshape': (('.bmp', '.ini'), ()),
+    'scatter': (('.bmp', '.ini'), ()),
+    'brushtex': (('.bmp',), ())
+}
+
+# 笔刷资源目录（相对于 SAIv2/settings）
+RESOURCE_DIRS = list(RESOURCE_EXTENSIONS)
+
+# dat中fomcat对应的形状目录，texcat为1时纹理位于 BRUSHTEX_DIR
+BRUSHFOM_DIRS = {
+    1: 'brushfom/blotmap',
+    2: 'brushfom/bristle',
+    3: 'brushfom/brshape',
+    4: 'scatter'
+}
+BRUSHTEX_DIR = 'brushtex'
+
+# 各资源目录在界面上显示的类型名称
+RESOURCE_LABELS = {
+    BRUSHFOM_DIRS[1]: '形状',
+    BRUSHFOM_DIRS[2]: '笔触',
+    BRUSHFOM_DIRS[3]: '笔形',
+    BRUSHFOM_DIRS[4]: '散布',
+    BRUSHTEX_DIR: '纹理'
+}
+
+# 笔刷库的全部目录：笔刷设置和资源（镜像、监视和快照使用）
+LIBRARY_DIRS = ['custool/nrm'] + RESOURCE_DIRS
+
+class ResourceEntry(NamedTuple):
+    """资源目录中的一个文件"""
+    name: str        # 磁盘上的实际文件名
+    path: Path
+    size: int
+    mtime_ns: int
+
+class ResourceIndex:
+    """资源目录的文件列表缓存
+    
+    每个目录列出一次，按 casefold 后的文件名建立查找表，与Windows一样不区分大小写。
+    每次操作开始时调用 refresh，只stat各目录本身，目录修改时间变化（增删或重命名文件）时才重新列出；
+    之后的查找都是内存中的字典查找，不再访问磁盘。
+    """
+    
+    def __init__(self, settings_path: Path):
+        """
+        Args:
+            settings_path: SAIv2/settings 目录
+        """
+        self.settings_path = Path(settings_path)
+        self._dirs: Dict[str, Tuple[Optional[int], Dict[str, ResourceEntry]]] = {}
+    
+    def refresh(self) -> int:
+        """
+        检查各资源目录的修改时间，重新列出有变化的目录
+        
+        Returns:
+            int: 重新列出的目录数量
+        """
+        relisted = 0
+        for rel_dir in RESOURCE_DIRS:
+            folder = self.settings_path / rel_dir
+            try:
+                mtime = os.stat(folder).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            cached = self._dirs.get(rel_dir)
+            if cached is not None and cached[0] == mtime:
+                continue
+            self._dirs[rel_dir] = (mtime, self._list(folder) if mtime is not None else {})
+            relisted += 1
+        return relisted
+    
+    @staticmethod
+    def _list(folder: Path) -> Dict[str, ResourceEntry]:
+        """列出目录 {casefold后的文件名: 文件信息}"""
+        files = {}
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name.casefold()] = ResourceEntry(entry.name, Path(entry.path),
+                                                                     stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        return files
+    
+    def invalidate(self, rel_dir: Optional[str] = None) -> None:
+        """丢弃缓存，下次 refresh 时重新列出（rel_dir为None时丢弃全部）"""
+        if rel_dir is None:
+            self._dirs.clear()
+        else:
+            self._dirs.pop(rel_dir, None)
+    
+    def find(self, rel_dir: str, filename: str) -> Optional[ResourceEntry]:
+        """
+        不区分大小写地查找资源文件
+        
+        Args:
+            rel_dir: 资源目录，例如 'brushtex'
+            filename: 文件名，例如 'Paper.bmp'
+        
+        Returns:
+            Optional[ResourceEntry]: 文件信息，不存在返回None
+        """
+        if rel_dir not in self._dirs:
+            self.refresh()
+        cached = self._dirs.get(rel_dir)
+        if cached is None:
+            return None
+        return cached[1].get(filename.casefold())
+    
+    def files(self, rel_dir: str) -> Dict[str, ResourceEntry]:
+        """返回目录中的所有文件 {casefold后的文件名: 文件信息}"""
+        if rel_dir not in self._dirs:
+            self.refresh()
+        cached = self._dirs.get(rel_dir)
+        return dict(cached[1]) if cached else {}
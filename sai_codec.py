@@ -0,0 +1,403 @@
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from mutation_journal import JournalStep, MutationJournal
+
+# "键=类型:值" 行（.saitdat、.saitlnk以及grp的头部），第一行可能带有UTF-8 BOM
+_FIELD_PATTERN = re.compile(r'^(\ufeff?)([^=\s]+)=([A-Za-z]):(.*)$')
+# 两行 "." 之间的 "索引=编号" 行（.saitgrp、.saitset），保留等号两侧和行尾的空白
+_ENTRY_PATTERN = re.compile(r'^(\s*(-?\d+)\s*=\s*)(-?\d+)(\s*)$')
+
+def parse_entry(text: str) -> Optional[Tuple[int, int]]:
+    """解析 "索引=编号" 行，不是这种格式时返回None"""
+    index, separator, value = text.partition('=')
+    if not separator:
+        return None
+    try:
+        return int(index), int(value)
+    except ValueError:
+        return None
+
+def format_entry(index: int, value: int, original: Optional[str] = None) -> str:
+    """
+    生成 "索引=编号" 行，给出原来的行时保留其中的空白
+    
+    Args:
+        index: 索引
+        value: 编号
+        original: 原来的行（不含换行符）
+    """
+    match = _ENTRY_PATTERN.match(original) if original is not None else None
+    if not match:
+        return f"{index}={value}"
+    return f"{original[:match.start(2)]}{index}{original[match.end(2):match.end(1)]}{value}{match.group(4)}"
+
+@dataclass
+class SaiLine:
+    """文件中的一行"""
+    text: str                      # 不含换行符的内容
+    ending: str                    # 原有的换行符（'\n'、'\r\n'、'\r'，最后一行可能为空）
+    raw: Optional[bytes] = None    # 原始字节（含换行符），修改过的行为None
+
+class SaiDocument:
+    """SAI文本文件（.saitset、.saitgrp、.saitdat、.saitlnk）的无损表示
+    
+    文件按原始字节分行，每行保留原有的换行符和原始字节。只选用能把文件原样编码回去的编码，
+    没有修改的行直接输出原始字节，修改过的行才按原编码重新编码，因此未修改的文件逐字节不变，
+    修改一个值也只会改变对应的那一行。
+    """
+    
+    ENCODINGS = ('utf-8', 'shift-jis', 'cp932', 'latin1')
+    
+    def __init__(self, lines: List[SaiLine], encoding: str = 'utf-8'):
+        """
+        Args:
+            lines: 行
+            encoding: 文件编码
+        """
+        self.lines = lines
+        self.encoding = encoding
+        self.path: Optional[Path] = None
+        self._lines_removed = False
+    
+    @classmethod
+    def decode(cls, data: bytes) -> 'SaiDocument':
+        """
+        解析文件内容（latin1可以表示任何字节，因此总能成功）
+        
+        Args:
+            data: 文件的原始字节
+        
+        Returns:
+            SaiDocument: 文档
+        """
+        for encoding in cls.ENCODINGS:
+            try:
+                if data.decode(encoding).encode(encoding) != data:
+                    continue
+            except (UnicodeDecodeError, UnicodeEncodeError):
+                continue
+            lines = []
+            # bytes.splitlines 只按 \r、\n 分行；这两个字节不会出现在上述编码的多字节字符中
+            for raw in data.splitlines(keepends=True):
+                content = raw.rstrip(b'\r\n')
+                lines.append(SaiLine(content.decode(encoding), raw[len(content):].decode('ascii'), raw))
+            return cls(lines, encoding)
+        return cls([], 'latin1')
+    
+    @classmethod
+    def load(cls, path) -> Optional['SaiDocument']:
+        """
+        读取文件
+        
+        Args:
+            path: 文件路径
+        
+        Returns:
+            Optional[SaiDocument]: 文档，读取失败返回None
+        """
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            print(f"读取 {path} 时出错: {str(e)}")
+            return None
+        document = cls.decode(data)
+        document.path = Path(path)
+        return document
+    
+    @classmethod
+    def from_text(cls, text: str, encoding: str = 'utf-8') -> 'SaiDocument':
+        """由文本创建新文档"""
+        document = cls.decode(text.encode(encoding))
+        document.encoding = encoding
+        return document
+    
+    def copy(self) -> 'SaiDocument':
+        """复制文档（修改副本不影响原文档）"""
+        document = SaiDocument([SaiLine(line.text, line.ending, line.raw) for line in self.lines], self.encoding)
+        document.path = self.path
+        document._lines_removed = self._lines_removed
+        return document
+    
+    def __len__(self) -> int:
+        return len(self.lines)
+    
+    @property
+    def newline(self) -> str:
+        """文件使用的换行符（第一个换行符，没有时为 '\n'）"""
+        return next((line.ending for line in self.lines if line.ending), '\n')
+    
+    @property
+    def dirty(self) -> bool:
+        """是否有修改、插入或删除过的行"""
+        return self._lines_removed or any(line.raw is None for line in self.lines)
+    
+    def text_lines(self, keepends: bool = False) -> List[str]:
+        """
+        各行的文本
+        
+        Args:
+            keepends: 是否保留换行符
+        """
+        return [line.text + line.ending if keepends else line.text for line in self.lines]
+    
+    def encode(self) -> bytes:
+        """
+        生成文件内容：未修改的行使用原始字节，修改过的行按原编码编码
+        
+        Raises:
+            UnicodeEncodeError: 新的内容无法用原编码表示
+        """
+        return b''.join(line.raw if line.raw is not None else (line.text + line.ending).encode(self.encoding)
+                        for line in self.lines)
+    
+    def replace_line(self, line_number: int, text: str) -> bool:
+        """
+        替换一行的内容（保留换行符）
+        
+        Returns:
+            bool: 内容是否有变化
+        """
+        line = self.lines[line_number]
+        if line.text == text:
+            return False
+        line.text = text
+        line.raw = None
+        return True
+    
+    def insert_line(self, line_number: int, text: str) -> None:
+        """
+        在指定位置插入一行，使用文件已有的换行符
+        
+        Args:
+            line_number: 插入位置（len(self) 表示末尾）
+            text: 不含换行符的内容
+        """
+        newline = self.newline
+        ending = newline
+        if line_number == len(self.lines) and self.lines and not self.lines[-1].ending:
+            # 原来的最后一行没有换行符：给它补上换行符，新的最后一行同样不加换行符
+            self.lines[-1].ending = newline
+            self.lines[-1].raw = None
+            ending = ''
+        self.lines.insert(line_number, SaiLine(text, ending))
+    
+    def delete_line(self, line_number: int) -> None:
+        """删除一行"""
+        del self.lines[line_number]
+        self._lines_removed = True
+    
+    # ---- "键=类型:值" 行 ----
+    
+    def find(self, key: str) -> Optional[int]:
+        """返回键第一次出现的行号，没有时返回None"""
+        for line_number, line in enumerate(self.lines):
+            match = _FIELD_PATTERN.match(line.text)
+            if match and match.group(2) == key:
+                return line_number
+        return None
+    
+    def get_field(self, key: str) -> Optional[Tuple[str, str]]:
+        """
+        读取字段
+        
+        Returns:
+            Optional[Tuple[str, str]]: (类型, 值)，没有该键时返回None
+        """
+        line_number = self.find(key)
+        if line_number is None:
+            return None
+        match = _FIELD_PATTERN.match(self.lines[line_number].text)
+        return match.group(3), match.group(4)
+    
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """读取字段的值（第一次出现的），没有该键时返回default"""
+        field_value = self.get_field(key)
+        return field_value[1] if field_value is not None else default
+    
+    def get_int(self, key: str) -> Optional[int]:
+        """读取 I: 类型的整数字段（例如.saitlnk的tarid），没有该键或不是整数时返回None"""
+        field_value = self.get_field(key)
+        if field_value is None or field_value[0] not in ('I', 'i'):
+            return None
+        try:
+            return int(field_value[1])
+        except ValueError:
+            return None
+    
+    def fields(self) -> Dict[str, str]:
+        """所有字段 {键: 值}，同名的键只使用第一次出现的值"""
+        values: Dict[str, str] = {}
+        for line in self.lines:
+            match = _FIELD_PATTERN.match(line.text)
+            if match and match.group(2) not in values:
+                values[match.group(2)] = match.group(4)
+        return values
+    
+    def set(self, key: str, value: str, kind: Optional[str] = None) -> bool:
+        """
+        修改字段的值（保留原有的类型），没有该键时加在 --EOF-- 之前（没有 --EOF-- 时加在末尾）
+        
+        Args:
+            key: 键
+            value: 新的值
+            kind: 新加入的键的类型，None时整数使用 I，其他使用 U
+        
+        Returns:
+            bool: 内容是否有变化
+        """
+        line_number = self.find(key)
+        if line_number is not None:
+            match = _FIELD_PATTERN.match(self.lines[line_number].text)
+            return self.replace_line(line_number, f"{match.group(1)}{key}={match.group(3)}:{value}")
+        if kind is None:
+            kind = 'I' if re.fullmatch(r'-?\d+', value) else 'U'
+        insert_at = next((i for i, line in enumerate(self.lines) if line.text.strip() == '--EOF--'), len(self.lines))
+        self.insert_line(insert_at, f"{key}={kind}:{value}")
+        return True
+    
+    def rename(self, key: str, new_key: str) -> bool:
+        """
+        重命名键（值和类型不变）
+        
+        Returns:
+            bool: 是否重命名（没有该键或新键名已存在时不修改）
+        """
+        line_number = self.find(key)
+        if line_number is None or self.find(new_key) is not None:
+            return False
+        match = _FIELD_PATTERN.match(self.lines[line_number].text)
+        return self.replace_line(line_number, f"{match.group(1)}{new_key}={match.group(3)}:{match.group(4)}")
+    
+    # ---- 两行 "." 之间的 "索引=编号" 行 ----
+    
+    def separators(self) -> List[int]:
+        """所有 "." 行的行号"""
+        return [line_number for line_number, line in enumerate(self.lines) if line.text.strip() == '.']
+    
+    def entries(self) -> List[Tuple[int, int, int]]:
+        """
+        解析映射部分（每遇到 "." 切换一次，与SAI的读取方式相同）
+        
+        Returns:
+            List[Tuple[int, int, int]]: [(行号, 索引, 编号)]
+        """
+        entries = []
+        reading_values = False
+        for line_number, line in enumerate(self.lines):
+            if line.text.strip() == '.':
+                reading_values = not reading_values
+                continue
+            entry = parse_entry(line.text) if reading_values else None
+            if entry is not None:
+                entries.append((line_number, entry[0], entry[1]))
+        return entries
+    
+    def set_entry(self, line_number: int, value: int) -> bool:
+        """
+        修改一行 "索引=编号" 中的编号（保留空白）
+        
+        Returns:
+            bool: 内容是否有变化
+        """
+        text = self.lines[line_number].text
+        entry = parse_entry(text)
+        if entry is None:
+            raise ValueError(f"第 {line_number + 1} 行不是 索引=编号: {text}")
+        return self.replace_line(line_number, format_entry(entry[0], value, text))
+    
+    def remap(self, old_to_new: Dict[int, int]) -> int:
+        """
+        按映射替换映射部分中的编号
+        
+        Args:
+            old_to_new: {旧编号: 新编号}
+        
+        Returns:
+            int: 修改的行数
+        """
+        changed = 0
+        for line_number, _, value in self.entries():
+            if value in old_to_new and self.set_entry(line_number, old_to_new[value]):
+                changed += 1
+        return changed
+    
+    # ---- 写入 ----
+    
+    def step(self, path=None) -> JournalStep:
+        """
+        生成写入文件的预写日志步骤
+        
+        Args:
+            path: 目标文件，None时写回读取的文件
+        """
+        return JournalStep('write', Path(path or self.path), data=self.encode())
+    
+    def save(self, path=None, journal: Optional[MutationJournal] = None) -> bool:
+        """
+        写入文件：通过预写日志写入，或先写临时文件再原子替换；写回原文件且没有修改时不写入
+        
+        Args:
+            path: 目标文件，None时写回读取的文件
+            journal: MutationJournal，None时直接原子替换
+        
+        Returns:
+            bool: 是否成功
+        """
+        path = Path(path or self.path)
+        if not self.dirty and path == self.path:
+            return True
+        try:
+            if journal is not None:
+                if not journal.run(f"write {path.name}", [self.step(path)]):
+                    return False
+            else:
+                data = self.encode()
+                tmp_path = path.with_name(f"{path.name}.tmp")
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"写入 {path} 时发生错误: {str(e)}")
+            return False
+        for line in self.lines:
+            if line.raw is None:
+                line.raw = (line.text + line.ending).encode(self.encoding)
+        self.path = path
+        self._lines_removed = False
+        return True
+
+def decode_lines(data: bytes) -> List[str]:
+    """
+    把文件内容解码并分行，编码的判断与 SaiDocument 相同；与文本模式的 readlines 一样，换行符统一为 '\n'
+    
+    Args:
+        data: 文件的原始字节
+    
+    Returns:
+        List[str]: 文件行列表
+    """
+    document = SaiDocument.decode(data)
+    return [line.text + '\n' if line.ending else line.text for line in document.lines]
+
+def read_lines(path) -> List[str]:
+    """
+    读取文件的各行，见 decode_lines
+    
+    Args:
+        path: 文件路径
+    
+    Returns:
+        List[str]: 文件行列表
+    
+    Raises:
+        OSError: 文件不存在或无法读取
+    """
+    with open(path, 'rb') as f:
+        return decode_lines(f.read())
@@ -0,0 +1,258 @@
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from mutation_journal import MutationJournal
+from sai_codec import SaiDocument, SaiLine, format_entry, parse_entry
+
+class SaitsetModel:
+    """_0.saitset 的内存模型
+    
+    文件由头部、两行 "." 之间的索引部分（每行 "索引=笔刷组序号"）和尾部组成。
+    基于 SaiDocument 无损解析：头部、尾部、空行、编码和每行的换行符原样保留，
+    没有变化的索引行输出原始字节；批量加入、移除、排序和重新编号都只修改内存中的列表，最后一次性写回。
+    """
+    
+    def __init__(self, document: SaiDocument, start: int, end: int):
+        """
+        Args:
+            document: 文件内容
+            start: 第一行 "." 的行号
+            end: 第二行 "." 的行号
+        """
+        self._attach(document, start, end)
+    
+    def _attach(self, document: SaiDocument, start: int, end: int) -> None:
+        """使用新的文件内容，重新解析索引部分"""
+        self.document = document
+        self.path: Optional[Path] = document.path
+        self.dirty = False
+        self._start = start
+        self._end = end
+        # 索引部分 [(索引, 笔刷组序号, 原来的行)]：新加入的条目没有原来的行，空行和无法解析的行以 (-1, None, 行) 保留
+        self._entries: List[Tuple[int, Optional[int], Optional[SaiLine]]] = []
+        # 每行原来的 (索引, 笔刷组序号)，生成内容时用来判断条目是否有变化
+        self._original: Dict[int, Tuple[int, int]] = {}
+        for line in document.lines[start + 1:end]:
+            entry = parse_entry(line.text)
+            if entry is None:
+                self._entries.append((-1, None, line))
+                continue
+            self._entries.append((entry[0], entry[1], line))
+            self._original[id(line)] = entry
+        self._reindex()
+    
+    def _reindex(self) -> None:
+        """重建成员表和下一个索引（批量修改后调用一次）"""
+        self._members: Dict[int, int] = {}
+        self._next_index = 0
+        for index, value, _ in self._entries:
+            if value is not None:
+                self._members[value] = self._members.get(value, 0) + 1
+                if index >= self._next_index:
+                    self._next_index = index + 1
+    
+    @classmethod
+    def from_document(cls, document: SaiDocument) -> Optional['SaitsetModel']:
+        """
+        解析 _0.saitset 的内容
+        
+        Args:
+            document: 文件内容
+        
+        Returns:
+            Optional[SaitsetModel]: 模型，找不到两行 "." 时返回None
+        """
+        separators = document.separators()
+        if len(separators) < 2:
+            print("错误：saitset文件格式不正确")
+            return None
+        return cls(document, separators[0], separators[1])
+        
+    @classmethod
+    def parse(cls, data: bytes) -> Optional['SaitsetModel']:
+        """
+        解析 _0.saitset 的原始字节
+        
+        Args:
+            data: 文件内容
+        
+        Returns:
+            Optional[SaitsetModel]: 模型，找不到两行 "." 时返回None
+        """
+        return cls.from_document(SaiDocument.decode(data))
+    
+    @classmethod
+    def load(cls, path: Path) -> Optional['SaitsetModel']:
+        """
+        读取 _0.saitset 文件
+        
+        Args:
+            path: 文件路径
+        
+        Returns:
+            Optional[SaitsetModel]: 模型，读取或解析失败返回None
+        """
+        document = SaiDocument.load(path)
+        if document is None:
+            return None
+        return cls.from_document(document)
+    
+    def groups(self) -> List[int]:
+        """按文件顺序列出笔刷组序号"""
+        return [value for _, value, _ in self._entries if value is not None]
+    
+    def entries(self) -> List[Tuple[int, int]]:
+        """按文件顺序列出 (索引, 笔刷组序号)"""
+        return [(index, value) for index, value, _ in self._entries if value is not None]
+    
+    def __contains__(self, group_number: int) -> bool:
+        return group_number in self._members
+    
+    def __len__(self) -> int:
+        return len(self._members)
+    
+    def append(self, group_numbers: Iterable[int]) -> List[int]:
+        """
+        把笔刷组依次加到索引部分末尾，已存在的笔刷组跳过
+        
+        Args:
+            group_numbers: 笔刷组序号
+        
+        Returns:
+            List[int]: 实际加入的笔刷组使用的索引
+        """
+        added = []
+        for group_number in group_numbers:
+            if group_number in self._members:
+                continue
+            self._entries.append((self._next_index, group_number, None))
+            self._members[group_number] = 1
+            added.append(self._next_index)
+            self._next_index += 1
+        if added:
+            self.dirty = True
+        return added
+    
+    def remove(self, group_numbers: Iterable[int]) -> int:
+        """
+        移除笔刷组（一次遍历完成，其余条目的索引不变）
+        
+        Args:
+            group_numbers: 笔刷组序号
+        
+        Returns:
+            int: 移除的条目数量
+        """
+        remove = {group_number for group_number in group_numbers if group_number in self._members}
+        if not remove:
+            return 0
+        count = len(self._entries)
+        self._entries = [entry for entry in self._entries if entry[1] not in remove]
+        count -= len(self._entries)
+        self._reindex()
+        self.dirty = True
+        return count
+    
+    def reorder(self, order: Iterable[int]) -> None:
+        """
+        调整笔刷组的顺序：order中的笔刷组按给定顺序排在前面，其余保持原有相对顺序，然后重新编号
+        
+        Args:
+            order: 笔刷组序号
+        """
+        position = {}
+        for group_number in order:
+            if group_number in self._members and group_number not in position:
+                position[group_number] = len(position)
+        entries = [entry for entry in self._entries if entry[1] is not None]
+        others = [entry for entry in self._entries if entry[1] is None]
+        entries.sort(key=lambda entry: position.get(entry[1], len(position)))
+        if entries + others != self._entries:
+            self.dirty = True
+        self._entries = entries + others
+        self.renumber()
+    
+    def renumber(self, start: int = 0) -> None:
+        """
+        按当前顺序把索引重新编为 start, start+1, ...
+        
+        Args:
+            start: 第一个索引
+        """
+        renumbered = []
+        index = start
+        for entry in self._entries:
+            if entry[1] is not None:
+                renumbered.append((index, entry[1], entry[2]))
+                index += 1
+            else:
+                renumbered.append(entry)
+        if renumbered != self._entries:
+            self.dirty = True
+        self._entries = renumbered
+        self._reindex()
+    
+    def _build(self) -> SaiDocument:
+        """生成新的文档：索引和序号没有变化的行沿用原来的行，修改过的行保留原有的空白和换行符"""
+        if not self.dirty:
+            return self.document
+        newline = self.document.newline
+        lines = self.document.lines[:self._start + 1]
+        for index, value, line in self._entries:
+            if line is None:
+                lines.append(SaiLine(f"{index}={value}", newline))
+                continue
+            original = self._original.get(id(line))
+            if value is None or original == (index, value):
+                lines.append(line)
+            elif line.text == f"{original[0]}={original[1]}":
+                lines.append(SaiLine(f"{index}={value}", line.ending))
+            else:
+                lines.append(SaiLine(format_entry(index, value, line.text), line.ending))
+        lines.extend(self.document.lines[self._end:])
+        return SaiDocument(lines, self.document.encoding)
+    
+    def render(self) -> str:
+        """生成文件内容（文本）"""
+        return ''.join(self._build().text_lines(keepends=True))
+    
+    def encode(self) -> bytes:
+        """生成文件内容（原编码的字节，未修改的文件逐字节不变）"""
+        return self._build().encode()
+    
+    def save(self, path: Optional[Path] = None, journal: Optional[MutationJournal] = None) -> bool:
+        """
+        写回文件：通过预写日志写入，或先写临时文件再原子替换；没有修改时不写入
+        
+        Args:
+            path: 目标文件，None时写回读取的文件
+            journal: MutationJournal，None时直接原子替换
+        
+        Returns:
+            bool: 是否成功
+        """
+        path = Path(path or self.path)
+        if not self.dirty and path == self.path:
+            return True
+        document = self._build()
+        data = document.encode()
+        try:
+            if journal is not None:
+                if not journal.run("saitset", [document.step(path)]):
+                    return False
+            else:
+                tmp_path = path.with_name(f"{path.name}.tmp")
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"写入 {path} 时发生错误: {str(e)}")
+            return False
+        # 之后的修改以写入的内容为准
+        saved = SaiDocument.decode(data)
+        saved.path = path
+        self._attach(saved, self._start, self._start + 1 + len(self._entries))
+        return True
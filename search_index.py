@@ -0,0 +1,198 @@
+import heapq
+import math
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+class BrushSearchIndex:
+    """笔刷组、子笔刷和资源名称的增量倒排索引
+    
+    名称经过NFKC规范化和大小写折叠后按字符n-gram建立倒排表，
+    查询时统计命中的n-gram数量，因此中日文名称的部分匹配和少量错字都能找到。
+    """
+    
+    def __init__(self, n: int = 2, min_similarity: float = 0.6):
+        """
+        Args:
+            n: n-gram长度，中日文名称通常为2
+            min_similarity: 模糊匹配时至少命中的查询n-gram比例
+        """
+        self.n = n
+        self.min_similarity = min_similarity
+        self._postings: Dict[str, Set[tuple]] = {}   # n-gram -> 文档键集合
+        self._names: Dict[tuple, str] = {}           # 文档键 -> 原始名称
+        self._normalized: Dict[tuple, str] = {}      # 文档键 -> 规范化名称
+        self._group_keys: Dict[int, List[tuple]] = {}  # 笔刷组序号 -> 该组的所有文档键
+    
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """规范化名称：统一全角/半角、大小写，并去掉空白"""
+        text = unicodedata.normalize('NFKC', text).casefold()
+        return ''.join(text.split())
+    
+    def _grams(self, normalized: str) -> Set[str]:
+        """生成用于索引的n-gram（同时包含单字，便于单字查询）"""
+        grams = set(normalized)
+        for i in range(len(normalized) - self.n + 1):
+            grams.add(normalized[i:i + self.n])
+        return grams
+    
+    def _query_grams(self, normalized: str) -> Set[str]:
+        """生成用于查询的n-gram，短于n的查询直接按单字匹配"""
+        if len(normalized) < self.n:
+            return set(normalized)
+        return {normalized[i:i + self.n] for i in range(len(normalized) - self.n + 1)}
+    
+    def __len__(self) -> int:
+        return len(self._names)
+    
+    def _add_document(self, key: tuple, name: str) -> None:
+        """添加单个文档"""
+        if not name:
+            return
+        normalized = self._normalize(name)
+        self._names[key] = name
+        self._normalized[key] = normalized
+        for gram in self._grams(normalized):
+            self._postings.setdefault(gram, set()).add(key)
+        self._group_keys.setdefault(key[1], []).append(key)
+    
+    def add_group(self, group_number: int, name: str, sub_brushes: Dict[int, str],
+                  resources: List[str] = ()) -> None:
+        """
+        添加或替换一个笔刷组的索引
+        
+        Args:
+            group_number: 笔刷组序号
+            name: 笔刷组名称
+            sub_brushes: 子笔刷 {索引: 名称}
+            resources: 资源列表，例如 ['brushtex/paper']
+        """
+        self.remove_group(group_number)
+        self._add_document(('group', group_number), name)
+        for index, sub_name in sub_brushes.items():
+            self._add_document(('brush', group_number, index), sub_name)
+        for resource in resources:
+            self._add_document(('resource', group_number, resource), resource)
+    
+    def remove_group(self, group_number: int) -> None:
+        """
+        从索引中删除一个笔刷组（包括其子笔刷和资源）
+        
+        Args:
+            group_number: 笔刷组序号
+        """
+        for key in self._group_keys.pop(group_number, []):
+            normalized = self._normalized.pop(key)
+            self._names.pop(key, None)
+            for gram in self._grams(normalized):
+                posting = self._postings.get(gram)
+                if posting is None:
+                    continue
+                posting.discard(key)
+                if not posting:
+                    del self._postings[gram]
+    
+    def index_group(self, reader, group_number: int) -> bool:
+        """
+        从笔刷库读取一个笔刷组并加入索引
+        
+        Args:
+            reader: 已初始化的SystemaxReader
+            group_number: 笔刷组序号
+        
+        Returns:
+            bool: 是否成功读取
+        """
+        brush_data = reader.read_brush_data(group_number)
+        if not brush_data:
+            self.remove_group(group_number)
+            return False
+        
+        resources = set()
+        for rel_path, files in reader.get_brush_resource_files(group_number).items():
+            for filename in files:
+                resources.add(f"{rel_path}/{Path(filename).stem}")
+        
+        self.add_group(group_number, brush_data.name, brush_data.sub_brushes or {}, sorted(resources))
+        return True
+    
+    def iter_build(self, reader):
+        """
+        逐组建立整个笔刷库的索引，每处理完一个笔刷组产生一次，便于GUI分批执行
+        
+        Args:
+            reader: 已初始化的SystemaxReader
+        
+        Yields:
+            int: 已加入索引的笔刷组序号
+        """
+        for group_number in reader.list_group_numbers():
+            self.index_group(reader, group_number)
+            yield group_number
+    
+    def search(self, query: str, limit: int = 500) -> List[Tuple[tuple, str, float]]:
+        """
+        查询名称
+        
+        Args:
+            query: 查询文本
+            limit: 最多返回的结果数量
+        
+        Returns:
+            List[Tuple[tuple, str, float]]: [(文档键, 名称, 得分)]，按得分从高到低排列。
+            文档键为 ('group', 组序号)、('brush', 组序号, 索引) 或 ('resource', 组序号, 资源)
+        """
+        normalized = self._normalize(query)
+        if not normalized:
+            return []
+        grams = self._query_grams(normalized)
+        
+        if len(grams) == 1:
+            # 单个n-gram的查询：倒排表中的文档都完整包含查询文本，无需逐个计数
+            gram = next(iter(grams))
+            candidates = ((key, self._names[key], 2.0) for key in self._postings.get(gram, ()))
+            return heapq.nsmallest(limit, candidates, key=lambda item: len(item[1]))
+        
+        hits: Dict[tuple, int] = {}
+        for gram in grams:
+            for key in self._postings.get(gram, ()):
+                hits[key] = hits.get(key, 0) + 1
+        
+        required = max(1, math.ceil(len(grams) * self.min_similarity))
+        results = []
+        for key, count in hits.items():
+            if count < required:
+                continue
+            score = count / len(grams)
+            if normalized in self._normalized[key]:
+                score += 1.0  # 完整包含查询文本的结果排在前面
+            results.append((key, self._names[key], score))
+        
+        return heapq.nsmallest(limit, results, key=lambda item: (-item[2], len(item[1])))
+    
+    def search_groups(self, query: str, limit: int = 500) -> List[int]:
+        """
+        查询名称，返回命中的笔刷组序号（按最佳得分排序，去重）
+        
+        Args:
+            query: 查询文本
+            limit: 最多返回的结果数量
+        
+        Returns:
+            List[int]: 笔刷组序号列表
+        """
+        # 一个笔刷组可能有多个命中的文档，limit限制的是笔刷组数量：
+        # 取得的文档不够 limit 个不同的笔刷组且还有更多结果时，加倍取得的数量重新查询
+        fetch = limit
+        while True:
+            results = self.search(query, fetch)
+            group_numbers = []
+            seen = set()
+            for key, _, _ in results:
+                if key[1] not in seen:
+                    seen.add(key[1])
+                    group_numbers.append(key[1])
+            if len(group_numbers) >= limit or len(results) < fetch:
+                return group_numbers[:limit]
+            fetch *= 2
@@ -0,0 +1,212 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List
+
+from resource_index import LIBRARY_DIRS
+
+class ShadowMirror:
+    """SAI设置文件夹的本地镜像
+    
+    SAI的设置通常位于被OneDrive/Dropbox同步的文档目录中，每次stat和打开都很慢，大量复制还会引发同步风暴。
+    镜像模式下所有读取都在本地镜像中进行，只用目录修改时间判断真实目录是否有变化；
+    写入先落在镜像中，操作结束时由 commit 一次性把变化推送到真实目录。
+    """
+    
+    STATE_FILE = 'mirror_state.json'
+    
+    def __init__(self, real_root: Path, mirror_root: Path):
+        """
+        Args:
+            real_root: 真实的SAI路径（包含 SAIv2 文件夹）
+            mirror_root: 本地镜像路径，结构与SAI路径相同，可以直接作为读取器的SAI路径使用
+        """
+        self.real_root = Path(real_root)
+        self.mirror_root = Path(mirror_root)
+        self._state_path = self.mirror_root / self.STATE_FILE
+        self.state = self._load_state()
+        self.conflicts: List[str] = []  # 上一次 commit 因真实目录已被修改而没有推送的文件
+    
+    def _settings_dir(self, root: Path, rel_dir: str) -> Path:
+        return root / 'SAIv2' / 'settings' / rel_dir
+    
+    def _load_state(self) -> dict:
+        """读取镜像状态，镜像属于其他SAI路径时丢弃"""
+        empty = {'real_root': str(self.real_root), 'dirs': {}, 'files': {}}
+        if not self._state_path.exists():
+            return empty
+        try:
+            with open(self._state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('real_root') == str(self.real_root):
+                return state
+        except Exception as e:
+            print(f"读取镜像状态时出错: {str(e)}")
+        return empty
+    
+    def _save_state(self) -> None:
+        try:
+            self.mirror_root.mkdir(parents=True, exist_ok=True)
+            with open(self._state_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f)
+        except Exception as e:
+            print(f"保存镜像状态时出错: {str(e)}")
+    
+    @staticmethod
+    def _scan(folder: Path) -> Dict[str, List[int]]:
+        """列出目录中的文件 {文件名: [大小, 修改时间]}"""
+        files = {}
+        if not folder.is_dir():
+            return files
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = [stat.st_size, stat.st_mtime_ns]
+        return files
+    
+    def _real_changed(self, real_dir: Path, name: str, key: str) -> bool:
+        """真实目录中的文件在上次同步后是否被其他程序修改过（包括新建和删除）"""
+        try:
+            stat = (real_dir / name).stat()
+            current = [stat.st_size, stat.st_mtime_ns]
+        except FileNotFoundError:
+            current = None
+        return current != self.state['files'].get(key)
+    
+    @staticmethod
+    def _push_file(source: Path, target: Path) -> None:
+        """先写入真实目录中的临时文件再原子替换，中途失败不会留下写了一半的文件"""
+        tmp_path = target.with_name(f"{target.name}.mirror.tmp")
+        try:
+            shutil.copy2(source, tmp_path)
+            os.replace(tmp_path, target)
+        except OSError:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            raise
+    
+    def refresh(self) -> int:
+        """
+        把真实目录的变化同步到镜像
+        
+        真实目录的修改时间与上次同步时相同的目录直接跳过，不再逐个检查其中的文件。
+        
+        Returns:
+            int: 复制或删除的文件数量
+        """
+        changed = 0
+        for rel_dir in LIBRARY_DIRS:
+            real_dir = self._settings_dir(self.real_root, rel_dir)
+            mirror_dir = self._settings_dir(self.mirror_root, rel_dir)
+            try:
+                dir_mtime = real_dir.stat().st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if self.state['dirs'].get(rel_dir) == dir_mtime and mirror_dir.is_dir():
+                continue
+            
+            mirror_dir.mkdir(parents=True, exist_ok=True)
+            real_files = self._scan(real_dir)
+            for name, stat in real_files.items():
+                key = f"{rel_dir}/{name}"
+                if self.state['files'].get(key) == stat and (mirror_dir / name).exists():
+                    continue
+                try:
+                    shutil.copy2(real_dir / name, mirror_dir / name)
+                    self.state['files'][key] = stat
+                    changed += 1
+                except OSError as e:
+                    print(f"同步 {key} 到镜像时出错: {str(e)}")
+            
+            # 删除真实目录中已不存在的文件
+            for name in self._scan(mirror_dir):
+                if name not in real_files:
+                    (mirror_dir / name).unlink()
+                    self.state['files'].pop(f"{rel_dir}/{name}", None)
+                    changed += 1
+            
+            self.state['dirs'][rel_dir] = dir_mtime
+        
+        self._save_state()
+        if changed:
+            print(f"已从SAI设置目录同步 {changed} 个文件到本地镜像")
+        return changed
+    
+    def commit(self) -> int:
+        """
+        把镜像中的修改一次性推送到真实目录
+        
+        推送前比较每个将要写入或删除的真实文件与上次同步时记录的状态（SAI原地修改文件时目录的修改时间不变，
+        因此不能只看目录）：真实文件已被SAI等程序修改的视为冲突，不覆盖也不删除，记录在 conflicts 中，
+        下次 refresh 时以真实目录为准。只检查有变化的文件，不会逐个访问整个真实目录。
+        
+        Returns:
+            int: 写入或删除的文件数量
+        """
+        changed = 0
+        self.conflicts = []
+        for rel_dir in LIBRARY_DIRS:
+            real_dir = self._settings_dir(self.real_root, rel_dir)
+            mirror_dir = self._settings_dir(self.mirror_root, rel_dir)
+            if not mirror_dir.is_dir():
+                continue
+            
+            mirror_files = self._scan(mirror_dir)
+            prefix = f"{rel_dir}/"
+            dir_changed = False
+            try:
+                # 真实目录在上次同步后被SAI等程序修改过时，推送后仍让下次 refresh 重新检查该目录
+                external_change = real_dir.stat().st_mtime_ns != self.state['dirs'].get(rel_dir)
+            except FileNotFoundError:
+                external_change = True
+            for name, stat in mirror_files.items():
+                key = prefix + name
+                if self.state['files'].get(key) == stat:
+                    continue
+                if self._real_changed(real_dir, name, key):
+                    self.conflicts.append(key)
+                    continue
+                try:
+                    real_dir.mkdir(parents=True, exist_ok=True)
+                    self._push_file(mirror_dir / name, real_dir / name)
+                    self.state['files'][key] = stat
+                    changed += 1
+                    dir_changed = True
+                except OSError as e:
+                    print(f"推送 {key} 时出错: {str(e)}")
+            
+            for key in [key for key in self.state['files'] if key.startswith(prefix)]:
+                name = key[len(prefix):]
+                if '/' in name or name in mirror_files:
+                    continue
+                if self._real_changed(real_dir, name, key):
+                    self.conflicts.append(key)
+                    continue
+                try:
+                    (real_dir / name).unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"删除 {key} 时出错: {str(e)}")
+                    continue
+                del self.state['files'][key]
+                changed += 1
+                dir_changed = True
+            
+            # 记录推送后的目录修改时间，下次 refresh 不会把自己的写入当作外部变化；
+            # 有冲突时清除记录，让下次 refresh 重新检查该目录并取回真实目录中的版本
+            if any(key.startswith(prefix) for key in self.conflicts):
+                self.state['dirs'].pop(rel_dir, None)
+            elif dir_changed and not external_change and real_dir.exists():
+                self.state['dirs'][rel_dir] = real_dir.stat().st_mtime_ns
+        
+        self._save_state()
+        if changed:
+            print(f"已将 {changed} 个文件的修改推送到SAI设置目录")
+        for key in self.conflicts:
+            print(f"冲突: {key} 在SAI设置目录中已被修改，镜像中的修改没有推送")
+        return changed
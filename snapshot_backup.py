@@ -0,0 +1,323 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from mutation_journal import JournalStep, MutationJournal
+from read_Systemax import SystemaxReader
+from resource_index import LIBRARY_DIRS
+
+class SnapshotManager:
+    """SAI设置目录的增量快照备份
+    
+    每个快照都是一份完整的目录树，但与上一个快照相比没有变化的文件使用硬链接，
+    因此每次快照只需要复制变化过的文件，删除旧快照也不会影响其他快照。
+    """
+    
+    MANIFEST = 'manifest.json'
+    
+    def __init__(self, sai_path: Path, backup_root: Path, keep_last: int = 10, keep_daily: int = 7,
+                 journal: Optional[MutationJournal] = None):
+        """
+        Args:
+            sai_path: SAI路径（包含 SAIv2 文件夹）
+            backup_root: 快照存放目录
+            keep_last: 保留最近的快照数量
+            keep_daily: 另外为最近多少天各保留一个快照
+            journal: 恢复笔刷组时使用的预写日志，None时使用读取器默认的日志
+        """
+        self.sai_path = Path(sai_path)
+        self.backup_root = Path(backup_root)
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self.journal = journal
+    
+    def _settings_dir(self, root: Path, rel_dir: str) -> Path:
+        return root / 'SAIv2' / 'settings' / rel_dir
+    
+    def _load_manifest(self, snapshot: Path) -> Optional[dict]:
+        """读取快照清单，不完整的快照（没有清单）返回None"""
+        try:
+            with open(snapshot / self.MANIFEST, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def list_snapshots(self) -> List[dict]:
+        """
+        列出所有完整的快照
+        
+        Returns:
+            List[dict]: [{'name', 'path', 'label', 'created', 'files', 'copied_bytes'}]，从新到旧排列
+        """
+        snapshots = []
+        if not self.backup_root.is_dir():
+            return snapshots
+        for entry in sorted(os.listdir(self.backup_root), reverse=True):
+            path = self.backup_root / entry
+            manifest = self._load_manifest(path)
+            if manifest is None:
+                continue
+            snapshots.append({
+                'name': entry,
+                'path': path,
+                'label': manifest.get('label', ''),
+                'created': manifest.get('created', 0),
+                'files': len(manifest.get('files', {})),
+                'copied_bytes': manifest.get('copied_bytes', 0)
+            })
+        return snapshots
+    
+    def create(self, label: str = '', retention: bool = True) -> Optional[Path]:
+        """
+        创建快照
+        
+        Args:
+            label: 快照说明，例如 "导入前"
+            retention: 创建后是否按保留策略删除旧快照
+        
+        Returns:
+            Optional[Path]: 快照目录，失败返回None
+        """
+        try:
+            previous = self.list_snapshots()
+            previous_path = previous[0]['path'] if previous else None
+            previous_files = self._load_manifest(previous_path)['files'] if previous_path else {}
+            
+            name = datetime.now().strftime('%Y%m%d-%H%M%S')
+            snapshot = self.backup_root / name
+            suffix = 1
+            while snapshot.exists():
+                snapshot = self.backup_root / f"{name}-{suffix}"
+                suffix += 1
+            snapshot.mkdir(parents=True)
+            
+            files = {}
+            copied = 0
+            copied_bytes = 0
+            for rel_dir in LIBRARY_DIRS:
+                src_dir = self._settings_dir(self.sai_path, rel_dir)
+                if not src_dir.is_dir():
+                    continue
+                dst_dir = self._settings_dir(snapshot, rel_dir)
+                dst_dir.mkdir(parents=True, exist_ok=True)
+                with os.scandir(src_dir) as it:
+                    for entry in it:
+                        if not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                        key = f"{rel_dir}/{entry.name}"
+                        signature = [stat.st_size, stat.st_mtime_ns]
+                        dst_file = dst_dir / entry.name
+                        if previous_files.get(key) == signature:
+                            try:
+                                # 未变化的文件直接硬链接到上一个快照
+                                os.link(self._settings_dir(previous_path, rel_dir) / entry.name, dst_file)
+                                files[key] = signature
+                                continue
+                            except OSError:
+                                pass  # 文件系统不支持硬链接时改为复制
+                        shutil.copy2(entry.path, dst_file)
+                        files[key] = signature
+                        copied += 1
+                        copied_bytes += stat.st_size
+            
+            # 最后写入清单，没有清单的目录视为不完整的快照
+            with open(snapshot / self.MANIFEST, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'label': label,
+                    'created': time.time(),
+                    'sai_path': str(self.sai_path),
+                    'copied_bytes': copied_bytes,
+                    'files': files
+                }, f, ensure_ascii=False)
+            
+            print(f"已创建快照 {snapshot.name}：{len(files)} 个文件，其中复制 {copied} 个（{copied_bytes} 字节）")
+            if retention:
+                self.apply_retention()
+            return snapshot
+        
+        except Exception as e:
+            print(f"创建快照时出错: {str(e)}")
+            return None
+    
+    def apply_retention(self) -> List[str]:
+        """
+        按保留策略删除旧快照：保留最近 keep_last 个，另外为最近 keep_daily 天各保留当天最新的一个
+        
+        Returns:
+            List[str]: 被删除的快照名称
+        """
+        snapshots = self.list_snapshots()
+        keep = {snapshot['name'] for snapshot in snapshots[:self.keep_last]}
+        days = []
+        for snapshot in snapshots:
+            day = datetime.fromtimestamp(snapshot['created']).date()
+            if day not in days:
+                days.append(day)
+                if len(days) <= self.keep_daily:
+                    keep.add(snapshot['name'])
+        
+        removed = []
+        for snapshot in snapshots:
+            if snapshot['name'] in keep:
+                continue
+            try:
+                shutil.rmtree(snapshot['path'])
+                removed.append(snapshot['name'])
+            except OSError as e:
+                print(f"删除快照 {snapshot['name']} 时出错: {str(e)}")
+        
+        # 清理创建中途失败留下的不完整快照
+        if self.backup_root.is_dir():
+            for entry in os.listdir(self.backup_root):
+                path = self.backup_root / entry
+                if path.is_dir() and not (path / self.MANIFEST).exists():
+                    shutil.rmtree(path, ignore_errors=True)
+        return removed
+    
+    def restore(self, name: str) -> bool:
+        """
+        把整个设置目录恢复为快照的状态
+        
+        只复制与快照不同的文件，并删除快照之后新增的文件；恢复前会先为当前状态创建一个快照。
+        
+        Args:
+            name: 快照名称
+        
+        Returns:
+            bool: 是否成功
+        """
+        snapshot = self.backup_root / name
+        manifest = self._load_manifest(snapshot)
+        if manifest is None:
+            print(f"错误：找不到快照 {name}")
+            return False
+        
+        try:
+            # 恢复完成前不执行保留策略，以免删除正在恢复的快照；无法保存当前状态时不恢复
+            if self.create(f"恢复 {name} 前", retention=False) is None:
+                print("错误：无法为当前状态创建快照，已取消恢复")
+                return False
+            files = manifest['files']
+            restored = 0
+            removed = 0
+            for rel_dir in LIBRARY_DIRS:
+                dst_dir = self._settings_dir(self.sai_path, rel_dir)
+                prefix = f"{rel_dir}/"
+                wanted = {key[len(prefix):] for key in files if key.startswith(prefix)}
+                if dst_dir.is_dir():
+                    with os.scandir(dst_dir) as it:
+                        for entry in it:
+                            if entry.is_file() and entry.name not in wanted:
+                                os.unlink(entry.path)
+                                removed += 1
+                for filename in wanted:
+                    dst_file = dst_dir / filename
+                    signature = files[prefix + filename]
+                    try:
+                        stat = dst_file.stat()
+                        if [stat.st_size, stat.st_mtime_ns] == signature:
+                            continue
+                    except FileNotFoundError:
+                        dst_dir.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(self._settings_dir(snapshot, rel_dir) / filename, dst_file)
+                    restored += 1
+            
+            print(f"已恢复快照 {name}：复制 {restored} 个文件，删除 {removed} 个文件")
+            self.apply_retention()
+            return True
+        
+        except Exception as e:
+            print(f"恢复快照时出错: {str(e)}")
+            return False
+    
+    def restore_group(self, name: str, group_number: int) -> bool:
+        """
+        只从快照中恢复一个笔刷组（grp、它引用的dat/lnk和缺少的资源文件）
+        
+        快照中的dat编号如果已被当前其他笔刷组使用且内容不同，会拒绝恢复，以免覆盖其他笔刷组。
+        所有文件的复制和 _0.saitset 的更新通过预写日志作为一次操作执行。
+        
+        Args:
+            name: 快照名称
+            group_number: 笔刷组序号
+        
+        Returns:
+            bool: 是否成功
+        """
+        snapshot = self.backup_root / name
+        if self._load_manifest(snapshot) is None:
+            print(f"错误：找不到快照 {name}")
+            return False
+        
+        try:
+            snapshot_reader = self._make_reader(snapshot)
+            snapshot_nrm = snapshot_reader.library_path
+            if not (snapshot_nrm / f"_{group_number}.saitgrp").exists():
+                print(f"错误：快照 {name} 中没有笔刷组 {group_number}")
+                return False
+            
+            # 快照中该组使用的所有文件：grp、按SAI的查找顺序经过的链接文件和实际的dat
+            nrm_files = [f"_{group_number}.saitgrp"] + snapshot_reader.scan_references().group_files(group_number)
+            
+            # 检查编号冲突
+            current_reader = self._make_reader(self.sai_path)
+            if self.journal is not None:
+                current_reader.journal = self.journal
+            current_nrm = current_reader.library_path
+            users = current_reader.scan_references().file_users()
+            for filename in nrm_files[1:]:
+                current_file = current_nrm / filename
+                if not current_file.exists():
+                    continue
+                if current_file.read_bytes() == (snapshot_nrm / filename).read_bytes():
+                    continue
+                others = users.get(filename, set()) - {group_number}
+                if others:
+                    print(f"错误：{filename} 已被笔刷组 {sorted(others)} 使用，无法单独恢复笔刷组 {group_number}，请恢复整个快照")
+                    return False
+            
+            steps = [JournalStep('copy', current_nrm / filename, source=snapshot_nrm / filename)
+                     for filename in nrm_files]
+            
+            # 只补充缺少的资源文件，不覆盖现有文件
+            for rel_path, filenames in snapshot_reader.get_brush_resource_files(group_number).items():
+                for filename in filenames:
+                    src = self._settings_dir(snapshot, rel_path) / filename
+                    dst = self._settings_dir(self.sai_path, rel_path) / filename
+                    if src.exists() and not dst.exists():
+                        dst.parent.mkdir(parents=True, exist_ok=True)
+                        steps.append(JournalStep('copy', dst, source=src))
+            
+            # 笔刷组不在 _0.saitset 中时重新加入
+            model = current_reader.load_saitset()
+            if model is None:
+                return False
+            if group_number not in model:
+                model.append([group_number])
+                steps.append(JournalStep('write', current_nrm / "_0.saitset", data=model.encode()))
+            
+            if self.create(f"恢复笔刷组 {group_number} 前", retention=False) is None:
+                print("错误：无法为当前状态创建快照，已取消恢复")
+                return False
+            if not current_reader.journal.run(f"restore_group {group_number}", steps):
+                print("恢复笔刷组失败，已恢复原状")
+                return False
+            
+            print(f"已从快照 {name} 恢复笔刷组 {group_number}（{len(nrm_files)} 个文件）")
+            self.apply_retention()
+            return True
+        
+        except Exception as e:
+            print(f"恢复笔刷组时出错: {str(e)}")
+            return False
+    
+    @staticmethod
+    def _make_reader(root: Path) -> SystemaxReader:
+        """创建指向指定SAI路径的读取器"""
+        return SystemaxReader.from_path(root)
+    
\ No newline at end of file
@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mutation_journal import MutationJournal
+from read_Systemax import SystemaxReader
+
+
+def write_lines(path: Path, lines, newline: str = '\n', encoding: str = 'utf-8') -> None:
+    """按指定的换行符和编码写入文件（最后一行也带换行符）"""
+    path.write_bytes(''.join(line + newline for line in lines).encode(encoding))
+
+
+def write_saitset(nrm: Path, group_numbers, **kwargs) -> None:
+    write_lines(nrm / '_0.saitset', ['name=U:setv2', '.'] + [f"{i}={n}" for i, n in enumerate(group_numbers)]
+                + ['.', '--EOF--'], **kwargs)
+
+
+def write_group(nrm: Path, group_number: int, refs, name: str = None, **kwargs) -> None:
+    write_lines(nrm / f"_{group_number}.saitgrp", [f"name=U:{name or f'组{group_number}'}", '.']
+                + [f"{i}={ref}" for i, ref in enumerate(refs)] + ['.', '--EOF--'], **kwargs)
+
+
+def write_dat(nrm: Path, dat_id: int, name: str = None, density: int = 50, **kwargs) -> None:
+    write_lines(nrm / f"{dat_id}.saitdat", [f"name=U:{name or f'笔刷{dat_id}'}", 'fomcat=I:0', 'fomnam=U:',
+                                            'texcat=I:0', 'texnam=U:', f"density=I:{density}", '--EOF--'], **kwargs)
+
+
+def write_link(nrm: Path, lnk_id: int, target: int, **kwargs) -> None:
+    write_lines(nrm / f"{lnk_id}.saitlnk", [f"tarid=I:{target}", '--EOF--'], **kwargs)
+
+
+@pytest.fixture
+def library(tmp_path):
+    """空的SAI设置目录，返回 (读取器, nrm目录)；预写日志放在临时目录中"""
+    nrm = tmp_path / 'sai' / 'SAIv2' / 'settings' / 'custool' / 'nrm'
+    nrm.mkdir(parents=True)
+    write_saitset(nrm, [])
+    reader = SystemaxReader.from_path(tmp_path / 'sai')
+    reader.journal = MutationJournal(tmp_path / 'journal')
+    return reader, nrm
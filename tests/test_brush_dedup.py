@@ -0,0 +1,85 @@
+import os
+
+from brush_dedup import BrushDeduplicator
+
+from conftest import write_dat, write_group, write_link, write_saitset
+
+
+def dedup_library(library):
+    # _1 和 _2 各有一个内容相同的笔刷，_3 通过链接使用 _2 的笔刷
+    reader, nrm = library
+    write_dat(nrm, 10, name='铅笔')
+    write_dat(nrm, 20, name='铅笔')
+    write_link(nrm, 30, 20, newline='\r\n')
+    write_group(nrm, 1, [10])
+    write_group(nrm, 2, [20])
+    write_group(nrm, 3, [30])
+    write_saitset(nrm, [1, 2, 3])
+    deduplicator = BrushDeduplicator(reader, ignore_keys=())
+    return reader, nrm, deduplicator
+
+
+def test_link_duplicates(library):
+    reader, nrm, deduplicator = dedup_library(library)
+    duplicate_sets = deduplicator.find_duplicates()
+    assert [(s.canonical, s.duplicates) for s in duplicate_sets] == [(10, [20])]
+
+    dat_size = (nrm / '20.saitdat').stat().st_size
+
+    result = deduplicator.link_duplicates(duplicate_sets)
+
+    assert result == {'files': 1, 'bytes': dat_size - len(b'tarid=I:10\r\n--EOF--\r\n'), 'relinked': 1}
+
+    assert not (nrm / '20.saitdat').exists()
+    # 新链接以已有链接为模板（保留CRLF），已有链接直接指向保留文件
+    assert (nrm / '20.saitlnk').read_bytes() == b'tarid=I:10\r\n--EOF--\r\n'
+    assert (nrm / '30.saitlnk').read_bytes() == b'tarid=I:10\r\n--EOF--\r\n'
+    assert not reader.journal.pending_operations()
+
+
+def test_link_duplicates_dry_run(library):
+    reader, nrm, deduplicator = dedup_library(library)
+    before = {path.name: path.read_bytes() for path in nrm.iterdir()}
+
+    result = deduplicator.link_duplicates(deduplicator.find_duplicates(), dry_run=True)
+
+    assert result['files'] == 1
+    assert {path.name: path.read_bytes() for path in nrm.iterdir()} == before
+
+
+def test_link_duplicates_rolls_back_on_failure(library, monkeypatch):
+    reader, nrm, deduplicator = dedup_library(library)
+    duplicate_sets = deduplicator.find_duplicates()
+    before = {path.name: path.read_bytes() for path in nrm.iterdir()}
+    real_replace = os.replace
+
+    def failing_replace(src, dst):
+        if str(dst).endswith('30.saitlnk'):
+            raise OSError('disk full')
+        real_replace(src, dst)
+    monkeypatch.setattr('mutation_journal.os.replace', failing_replace)
+
+    assert deduplicator.link_duplicates(duplicate_sets)['files'] == 0
+
+    monkeypatch.undo()
+    assert {path.name: path.read_bytes() for path in nrm.iterdir()} == before
+
+
+def test_delete_after_dedup_keeps_other_groups(library):
+    reader, nrm, deduplicator = dedup_library(library)
+    deduplicator.link_duplicates(deduplicator.find_duplicates())
+
+    # 删除保留文件所在的笔刷组：其他笔刷组仍通过链接使用它
+    assert reader.delete_brush_group(1)
+    assert (nrm / '10.saitdat').exists()
+    assert reader.get_brush_group_info(2)['dat_numbers'] == [10]
+    assert reader.get_brush_group_info(3)['dat_numbers'] == [10]
+
+    # 删除使用链接的笔刷组：只删除它自己的链接
+    assert reader.delete_brush_group(2)
+    assert not (nrm / '20.saitlnk').exists()
+    assert (nrm / '10.saitdat').exists()
+    assert reader.get_brush_group_info(3)['dat_numbers'] == [10]
+
+    assert reader.delete_brush_group(3)
+    assert sorted(path.name for path in nrm.iterdir()) == ['_0.saitset']
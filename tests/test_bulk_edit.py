@@ -0,0 +1,52 @@
+from bulk_edit import BulkEditor, parse_conditions, parse_operations
+
+from conftest import write_dat, write_group, write_link, write_saitset
+
+
+def shared_library(library):
+    # _1 使用 10 和 11；_2 通过链接 20 共用 11
+    reader, nrm = library
+    write_dat(nrm, 10, density=80)
+    write_dat(nrm, 11, density=80)
+    write_link(nrm, 20, 11)
+    write_group(nrm, 1, [10, 11])
+    write_group(nrm, 2, [20])
+    write_saitset(nrm, [1, 2])
+    return reader, nrm
+
+
+def test_group_edit_skips_shared_dats(library):
+    reader, nrm = shared_library(library)
+    editor = BulkEditor(reader)
+    shared_before = (nrm / '11.saitdat').read_bytes()
+
+    plan = editor.plan(parse_operations('density=30'), group_numbers=[1])
+
+    assert [edit.dat_id for edit in plan.edits] == [10]
+    assert plan.shared == {11: [2]}
+    assert '11.saitdat（笔刷组 2）' in editor.generate_report(plan)
+
+    assert editor.apply(plan)
+    assert b'density=I:30' in (nrm / '10.saitdat').read_bytes()
+    assert (nrm / '11.saitdat').read_bytes() == shared_before
+
+
+def test_edit_of_all_sharing_groups(library):
+    reader, nrm = shared_library(library)
+    editor = BulkEditor(reader)
+
+    plan = editor.plan(parse_operations('density*0.5'), group_numbers=[1, 2],
+                       conditions=parse_conditions('density>50'))
+
+    assert plan.shared == {}
+    assert [edit.dat_id for edit in plan.edits] == [10, 11]
+    assert plan.edits[1].changes == [('scale', 'density', '80', '40')]
+
+
+def test_library_edit_follows_links(library):
+    reader, nrm = shared_library(library)
+    editor = BulkEditor(reader)
+
+    assert editor.candidate_ids() == [10, 11]
+    assert editor.candidate_ids([2]) == [11]
+    assert editor.plan(parse_operations('density=30')).shared == {}
@@ -0,0 +1,193 @@
+import os
+
+from saitset import SaitsetModel
+
+from conftest import write_dat, write_group, write_lines, write_link, write_saitset
+
+
+def test_delete_group_keeps_dat_linked_from_other_group(library):
+    # _1 -> 10.saitdat，_2 -> 20.saitlnk -> 10.saitdat（导入查重或去重之后的结构）
+    reader, nrm = library
+    write_dat(nrm, 10)
+    write_link(nrm, 20, 10)
+    write_group(nrm, 1, [10])
+    write_group(nrm, 2, [20])
+    write_saitset(nrm, [1, 2])
+
+    assert reader.delete_brush_group(2)
+
+    assert (nrm / '10.saitdat').exists()
+    assert not (nrm / '20.saitlnk').exists()
+    assert not (nrm / '_2.saitgrp').exists()
+    assert SaitsetModel.load(nrm / '_0.saitset').groups() == [1]
+
+
+def test_delete_group_keeps_dat_used_by_linking_group(library):
+    reader, nrm = library
+    write_dat(nrm, 10)
+    write_link(nrm, 20, 10)
+    write_group(nrm, 1, [10])
+    write_group(nrm, 2, [20])
+    write_saitset(nrm, [1, 2])
+
+    assert reader.delete_brush_group(1)
+
+    assert (nrm / '10.saitdat').exists()
+    assert (nrm / '20.saitlnk').exists()
+    assert reader.get_brush_group_info(2)['dat_numbers'] == [10]
+
+
+def test_delete_group_removes_unshared_files(library):
+    reader, nrm = library
+    write_dat(nrm, 10)
+    write_dat(nrm, 11)
+    write_link(nrm, 12, 11)
+    write_group(nrm, 1, [10, 12])
+    write_saitset(nrm, [1])
+
+    assert reader.delete_brush_group(1)
+
+    assert sorted(path.name for path in nrm.iterdir()) == ['_0.saitset']
+
+
+def test_delete_group_keeps_dat_targeted_by_unused_link(library):
+    reader, nrm = library
+    write_dat(nrm, 10)
+    write_link(nrm, 30, 10)      # 不属于任何笔刷组的链接
+    write_group(nrm, 1, [10])
+    write_saitset(nrm, [1])
+
+    assert reader.delete_brush_group(1)
+
+    assert (nrm / '10.saitdat').exists()
+
+
+def test_dat_is_preferred_over_link_with_same_number(library):
+    reader, nrm = library
+    write_dat(nrm, 10)
+    write_dat(nrm, 11)
+    write_link(nrm, 10, 11)      # SAI先找同编号的.saitdat，这个链接不会被使用
+    write_group(nrm, 1, [10])
+    write_group(nrm, 2, [11])
+    write_saitset(nrm, [1, 2])
+
+    assert reader.get_brush_group_info(1)['dat_numbers'] == [10]
+    assert reader.delete_brush_group(1)
+
+    assert not (nrm / '10.saitdat').exists()
+    assert (nrm / '11.saitdat').exists()
+
+
+def test_delete_shift_jis_group(library):
+    reader, nrm = library
+    write_dat(nrm, 10, name='鉛筆', encoding='shift-jis', newline='\r\n')
+    write_link(nrm, 20, 10, newline='\r\n')
+    write_group(nrm, 1, [20], name='鉛筆セット', encoding='shift-jis', newline='\r\n')
+    write_saitset(nrm, [1], newline='\r\n')
+
+    assert reader.get_brush_group_info(1)['dat_numbers'] == [10]
+    assert reader.delete_brush_group(1)
+
+    assert sorted(path.name for path in nrm.iterdir()) == ['_0.saitset']
+    assert (nrm / '_0.saitset').read_bytes() == b'name=U:setv2\r\n.\r\n.\r\n--EOF--\r\n'
+
+
+def test_delete_groups_in_one_operation(library, monkeypatch):
+    reader, nrm = library
+    write_dat(nrm, 10)
+    write_dat(nrm, 11)
+    write_link(nrm, 20, 10)
+    write_group(nrm, 1, [10])
+    write_group(nrm, 2, [20])
+    write_group(nrm, 3, [11])
+    write_saitset(nrm, [1, 2, 3])
+    operations = []
+    run = reader.journal.run
+    monkeypatch.setattr(reader.journal, 'run', lambda name, steps: operations.append(steps) or run(name, steps))
+
+    assert reader.delete_brush_groups([1, 2, 99])
+
+    assert len(operations) == 1
+    assert sum(1 for step in operations[0] if step.action == 'write') == 1
+    assert sorted(path.name for path in nrm.iterdir()) == ['11.saitdat', '_0.saitset', '_3.saitgrp']
+    assert SaitsetModel.load(nrm / '_0.saitset').entries() == [(2, 3)]
+
+
+def test_delete_groups_with_resources_in_one_operation(library, monkeypatch):
+    reader, nrm = library
+    brushtex = nrm.parents[1] / 'brushtex'
+    brushtex.mkdir()
+    (brushtex / 'paper.bmp').write_bytes(b'BM')
+    # 10 只被两个选中的笔刷组共用，一起删除时也会被删除
+    write_dat(nrm, 10)
+    write_link(nrm, 20, 10)
+    write_group(nrm, 1, [10])
+    write_group(nrm, 2, [20])
+    write_saitset(nrm, [1, 2])
+    assert reader.scan_references().removable_files([1]) == []
+    assert reader.scan_references().removable_files([1, 2]) == ['10.saitdat', '20.saitlnk']
+    operations = []
+    run = reader.journal.run
+    monkeypatch.setattr(reader.journal, 'run', lambda name, steps: operations.append(steps) or run(name, steps))
+
+    assert reader.delete_brush_groups([1, 2], {'brushtex': ['paper.bmp'], 'scatter': ['missing.bmp']})
+
+    assert len(operations) == 1
+    assert sorted(path.name for path in nrm.iterdir()) == ['_0.saitset']
+    assert not (brushtex / 'paper.bmp').exists()
+
+
+def test_delete_groups_with_resources_rolls_back_together(library, monkeypatch):
+    reader, nrm = library
+    brushtex = nrm.parents[1] / 'brushtex'
+    brushtex.mkdir()
+    (brushtex / 'paper.bmp').write_bytes(b'BM')
+    write_dat(nrm, 10)
+    write_group(nrm, 1, [10])
+    write_saitset(nrm, [1])
+    before = {path.name: path.read_bytes() for path in nrm.iterdir()}
+
+    real_unlink = os.unlink
+
+    def failing_unlink(path, *args, **kwargs):
+        # 资源文件被其他程序占用：此时笔刷组文件已经删除，需要一起回滚
+        if str(path).endswith('paper.bmp'):
+            raise OSError('locked')
+        real_unlink(path, *args, **kwargs)
+    monkeypatch.setattr('mutation_journal.os.unlink', failing_unlink)
+    assert not reader.delete_brush_groups([1], {'brushtex': ['paper.bmp']})
+    monkeypatch.undo()
+
+    assert {path.name: path.read_bytes() for path in nrm.iterdir()} == before
+    assert (brushtex / 'paper.bmp').read_bytes() == b'BM'
+
+
+def test_invalidate_references_updates_reverse_index(library):
+    reader, nrm = library
+    write_dat(nrm, 10)
+    write_dat(nrm, 11)
+    write_group(nrm, 1, [10])
+    write_group(nrm, 2, [11])
+    write_saitset(nrm, [1, 2])
+    assert reader.apply_changes(set()) == set()
+
+    assert reader.delete_brush_group(2)
+    write_group(nrm, 1, [10, 11])
+    reader.invalidate_references([1, 2])
+
+    assert reader.apply_changes({'custool/nrm/11.saitdat'}) == {1}
+
+
+def test_resource_files_follow_links_and_extensions(library):
+    reader, nrm = library
+    write_lines(nrm / '10.saitdat', ['name=U:铅笔', 'fomcat=I:2', 'fomnam=U:hair', 'texcat=I:1', 'texnam=U:paper',
+                                     '--EOF--'])
+    write_link(nrm, 20, 10)
+    write_group(nrm, 1, [20])
+    
+    resources = reader.get_brush_resource_files(1)
+    
+    assert {rel_dir: files for rel_dir, files in resources.items() if files} == {
+        'brushfom/bristle': {'hair.bmp', 'hair.ini'},
+        'brushtex': {'paper.bmp'},
+    }
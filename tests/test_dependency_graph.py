@@ -0,0 +1,25 @@
+import re
+
+from conftest import write_dat, write_group, write_link, write_saitset
+
+
+def test_link_chains_end_at_emitted_nodes(library):
+    # 12 -> 11 -> 10.saitdat，13 <-> 14 循环，15 -> 缺失的99
+    reader, nrm = library
+    write_dat(nrm, 10)
+    write_link(nrm, 11, 10)
+    write_link(nrm, 12, 11)
+    write_link(nrm, 13, 14)
+    write_link(nrm, 14, 13)
+    write_link(nrm, 15, 99)
+    write_group(nrm, 1, [12, 13, 15, 11])
+    write_saitset(nrm, [1])
+    
+    lines = list(reader.iter_dependency_dot())
+    
+    declared = {match.group(1) for line in lines for match in [re.match(r'\s+(\w+) \[', line)] if match}
+    edges = [re.match(r'\s+(\w+) -> (\w+)', line).groups() for line in lines if '->' in line]
+    assert {'d10', 'l11', 'l12', 'l13', 'l14', 'l15', 'd99'} <= declared
+    assert all(target in declared for _, target in edges)
+    assert ('l12', 'l11') in edges and ('l11', 'd10') in edges and ('l14', 'l13') in edges
+    assert sum(line.strip().startswith('l11 [') for line in lines) == 1
@@ -0,0 +1,18 @@
+from conftest import write_dat, write_group, write_link, write_saitset
+
+
+def test_export_plan_prefers_dat_over_link_with_same_id(library):
+    # 10.saitdat 和 10.saitlnk 同时存在时SAI使用dat；20 只有链接，沿链接导出 11
+    reader, nrm = library
+    write_dat(nrm, 10, name='铅笔')
+    write_link(nrm, 10, 11)
+    write_dat(nrm, 11, name='马克笔')
+    write_link(nrm, 20, 11)
+    write_group(nrm, 1, [10, 20])
+    write_saitset(nrm, [1])
+    
+    plan, = reader.build_export_plans([1])
+    
+    assert plan.dat_ids == [10, 11]
+    assert plan.brushes == [(0, 10, '铅笔'), (1, 11, '马克笔')]
+    assert b'0=10' in plan.grp_data and b'1=11' in plan.grp_data
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from brush_refs import BrushReferences
+from mutation_journal import MutationJournal
+from read_Systemax import BrushImporter
+
+from conftest import write_dat, write_group, write_saitset
+
+
+def make_pack(folder: Path, names) -> Path:
+    """导出格式的笔刷组文件夹：一个grp和编号从1开始的dat"""
+    folder.mkdir()
+    for dat_id, name in enumerate(names, start=1):
+        write_dat(folder, dat_id, name=name)
+    write_group(folder, 1, range(1, len(names) + 1), name=folder.name)
+    return folder
+
+
+def make_importer(tmp_path: Path, nrm: Path, import_path: Path) -> BrushImporter:
+    importer = BrushImporter()
+    importer.config.exe_dir = tmp_path
+    importer.journal = MutationJournal(tmp_path / 'journal')
+    importer.sai_path = nrm.parents[3]
+    importer.nrm_path = nrm
+    importer.saitset_path = nrm / '_0.saitset'
+    importer.import_path = import_path
+    return importer
+
+
+def test_second_import_does_not_reuse_link_ids(library, tmp_path):
+    reader, nrm = library
+    write_dat(nrm, 10, name='已有')
+    write_group(nrm, 1, [10])
+    write_saitset(nrm, [1])
+    # 第一个笔刷组的第二个笔刷与已有的笔刷相同，导入为最高编号的链接
+    pack_a = make_pack(tmp_path / 'pack_a', ['甲', '已有'])
+    pack_b = make_pack(tmp_path / 'pack_b', ['乙'])
+
+    importer = make_importer(tmp_path, nrm, pack_a)
+    assert importer.import_brushes()
+    group_a = importer.imported_grp_number
+    importer = make_importer(tmp_path, nrm, pack_b)
+    assert importer.import_brushes()
+    group_b = importer.imported_grp_number
+
+    refs = BrushReferences.scan(nrm)
+    assert refs.group_files(group_a) == ['11.saitdat', '12.saitlnk', '10.saitdat']
+    assert refs.group_files(group_b) == ['13.saitdat']
+    assert not refs.dat_ids & set(refs.link_targets)
+    assert not importer.journal.pending_operations()
+
+
+def test_first_group_is_numbered_one(library, tmp_path):
+    # 还没有任何笔刷组时，新笔刷组不使用 _0
+    reader, nrm = library
+    write_dat(nrm, 10)
+    pack = make_pack(tmp_path / 'pack', ['甲'])
+
+    importer = make_importer(tmp_path, nrm, pack)
+    assert importer.import_brushes()
+
+    assert importer.imported_grp_number == 1
+    assert reader.list_group_numbers() == [1]
+    assert reader.load_saitset().groups() == [1]
+
+
+def test_legacy_group_zero_is_listed(library):
+    reader, nrm = library
+    write_dat(nrm, 1)
+    write_group(nrm, 0, [1])
+    write_saitset(nrm, [0])
+
+    assert reader.list_group_numbers() == [0]
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+from brush_refs import BrushReferences
+from library_sync import LibrarySync
+from mutation_journal import MutationJournal
+from read_Systemax import SystemaxReader
+
+from conftest import write_dat, write_group, write_lines, write_saitset
+
+
+def make_library(root: Path) -> SystemaxReader:
+    nrm = root / 'SAIv2' / 'settings' / 'custool' / 'nrm'
+    nrm.mkdir(parents=True)
+    write_saitset(nrm, [])
+    reader = SystemaxReader.from_path(root)
+    reader.config.exe_dir = root.parent
+    reader.journal = MutationJournal(root.parent / f"{root.name}_journal")
+    return reader
+
+
+def test_sync_links_to_existing_dats(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    reader_a = make_library(tmp_path / 'a')
+    reader_b = make_library(tmp_path / 'b')
+    nrm_a, nrm_b = reader_a.library_path, reader_b.library_path
+    # A侧的新笔刷组使用的笔刷与B侧已有的笔刷内容相同
+    write_dat(nrm_a, 1, name='铅笔')
+    write_dat(nrm_a, 2, name='水彩')
+    write_group(nrm_a, 1, [1, 2], name='新组')
+    write_saitset(nrm_a, [1])
+    write_dat(nrm_b, 5, name='铅笔')
+    write_group(nrm_b, 1, [5], name='旧组')
+    write_saitset(nrm_b, [1])
+
+    result = LibrarySync(reader_a, reader_b, state_path=tmp_path / 'state.json').sync()
+
+    assert not result.failed
+    assert result.to_b == ['新组'] and result.to_a == ['旧组']
+    # 两个方向各有一个笔刷使用对方已有的dat
+    assert result.reused == 2
+    refs = BrushReferences.scan(nrm_b)
+    # 新笔刷组通过自己的链接使用已有的dat，删除任一笔刷组都不会删除另一个笔刷组的笔刷
+    new_group = next(number for number in refs.group_refs if number != 1)
+    assert refs.group_files(new_group) == ['6.saitlnk', '5.saitdat', '7.saitdat']
+    assert refs.group_refs[1] == [5]
+    assert refs.removable_files([new_group]) == ['6.saitlnk', '7.saitdat']
+
+    refs = BrushReferences.scan(nrm_a)
+    assert refs.group_files(2) == ['3.saitlnk', '1.saitdat']
+
+
+def test_sync_replaces_group_and_removes_orphans(tmp_path, monkeypatch):
+    reader_a = make_library(tmp_path / 'a')
+    reader_b = make_library(tmp_path / 'b')
+    nrm_a, nrm_b = reader_a.library_path, reader_b.library_path
+    (tmp_path / 'a' / 'SAIv2' / 'settings' / 'brushtex').mkdir()
+    (tmp_path / 'a' / 'SAIv2' / 'settings' / 'brushtex' / 'paper.bmp').write_bytes(b'BM')
+    write_lines(nrm_a / '1.saitdat', ['name=U:铅笔', 'fomcat=I:0', 'fomnam=U:', 'texcat=I:1', 'texnam=U:paper',
+                                      'density=I:50', '--EOF--'])
+    write_dat(nrm_a, 2, name='水彩')
+    write_group(nrm_a, 1, [1, 2], name='组')
+    write_saitset(nrm_a, [1])
+    syncer = LibrarySync(reader_a, reader_b, state_path=tmp_path / 'state.json')
+
+    # B侧还没有资源目录
+    assert not syncer.sync().failed
+    assert (tmp_path / 'b' / 'SAIv2' / 'settings' / 'brushtex' / 'paper.bmp').read_bytes() == b'BM'
+    assert sorted(path.name for path in nrm_b.iterdir()) == ['1.saitdat', '2.saitdat', '_0.saitset', '_1.saitgrp']
+
+    # 只修改A侧的第一个笔刷，再次同步时覆盖B侧的笔刷组
+    write_lines(nrm_a / '1.saitdat', ['name=U:铅笔', 'fomcat=I:0', 'fomnam=U:', 'texcat=I:1', 'texnam=U:paper',
+                                      'density=I:80', '--EOF--'])
+    result = syncer.sync()
+
+    assert not result.failed
+    assert result.to_b == ['组'] and result.removed == 1
+    # 旧的1.saitdat不再被使用而删除；2.saitdat被新链接使用而保留
+    assert sorted(path.name for path in nrm_b.iterdir()) == ['2.saitdat', '3.saitdat', '4.saitlnk',
+                                                             '_0.saitset', '_1.saitgrp']
+    assert BrushReferences.scan(nrm_b).group_files(1) == ['3.saitdat', '4.saitlnk', '2.saitdat']
@@ -0,0 +1,126 @@
+import os
+
+import pytest
+
+from mutation_journal import JournalStep, MutationJournal
+
+
+def snapshot(directory):
+    return {path.name: path.read_bytes() for path in directory.iterdir()}
+
+
+@pytest.fixture
+def files(tmp_path):
+    directory = tmp_path / 'files'
+    directory.mkdir()
+    (directory / 'a.txt').write_bytes(b'old a\n')
+    (directory / 'b.txt').write_bytes(b'old b\n')
+    (tmp_path / 'source.bin').write_bytes(b'\x00\x01source')
+    return directory, MutationJournal(tmp_path / 'journal')
+
+
+def test_run_applies_all_steps(files, tmp_path):
+    directory, journal = files
+    steps = [
+        JournalStep('write', directory / 'a.txt', content='新\n内容\n', newline='\r\n'),
+        JournalStep('write', directory / 'c.bin', data=b'\xff\xfe'),
+        JournalStep('copy', directory / 'd.bin', source=tmp_path / 'source.bin'),
+        JournalStep('delete', directory / 'b.txt'),
+    ]
+
+    assert journal.run('test', steps)
+
+    assert snapshot(directory) == {
+        'a.txt': '新\r\n内容\r\n'.encode('utf-8'),
+        'c.bin': b'\xff\xfe',
+        'd.bin': b'\x00\x01source',
+    }
+    # 提交后日志和备份都被清理
+    assert not journal.pending_operations()
+    assert not journal.log_path.exists()
+    assert os.listdir(journal.journal_dir) == []
+
+
+def test_run_does_not_flush_whole_system(files, monkeypatch):
+    directory, journal = files
+
+    def forbidden():
+        raise AssertionError('os.sync() called')
+    monkeypatch.setattr('mutation_journal.os.sync', forbidden, raising=False)
+    synced = []
+    real_fsync = os.fsync
+
+    def recording_fsync(fd):
+        synced.append(fd)
+        real_fsync(fd)
+    monkeypatch.setattr('mutation_journal.os.fsync', recording_fsync)
+
+    assert journal.run('test', [JournalStep('write', directory / 'a.txt', data=b'new')])
+    assert synced
+    assert (directory / 'a.txt').read_bytes() == b'new'
+
+
+def test_run_rolls_back_on_error(files, monkeypatch):
+    directory, journal = files
+    before = snapshot(directory)
+    real_replace = os.replace
+
+    def failing_replace(src, dst):
+        if str(dst).endswith('b.txt'):
+            raise OSError('disk full')
+        real_replace(src, dst)
+    monkeypatch.setattr('mutation_journal.os.replace', failing_replace)
+
+    steps = [
+        JournalStep('delete', directory / 'a.txt'),
+        JournalStep('write', directory / 'new.txt', data=b'new'),
+        JournalStep('write', directory / 'b.txt', data=b'new b'),
+    ]
+    assert not journal.run('test', steps)
+
+    monkeypatch.undo()
+    assert snapshot(directory) == before
+    assert not journal.pending_operations()
+
+
+def test_recover_rolls_back_interrupted_operation(files, monkeypatch):
+    directory, journal = files
+    before = snapshot(directory)
+    real_replace = os.replace
+
+    def crashing_replace(src, dst):
+        if str(dst).endswith('b.txt'):
+            # 模拟程序在操作中途退出：不会进入 run 的异常处理
+            raise KeyboardInterrupt
+        real_replace(src, dst)
+    monkeypatch.setattr('mutation_journal.os.replace', crashing_replace)
+
+    steps = [
+        JournalStep('write', directory / 'a.txt', data=b'new a'),
+        JournalStep('write', directory / 'new.txt', data=b'new'),
+        JournalStep('write', directory / 'b.txt', data=b'new b'),
+    ]
+    with pytest.raises(KeyboardInterrupt):
+        journal.run('import', steps)
+    monkeypatch.undo()
+
+    assert (directory / 'a.txt').read_bytes() == b'new a'
+    assert [operation['name'] for operation in journal.pending_operations()] == ['import']
+
+    # 下次启动时用新的实例恢复
+    restarted = MutationJournal(journal.journal_dir)
+    assert restarted.recover() == 1
+
+    assert snapshot(directory) == before
+    assert not restarted.log_path.exists()
+    assert os.listdir(restarted.journal_dir) == []
+    assert restarted.recover() == 0
+
+
+def test_recover_ignores_torn_log_line(files):
+    directory, journal = files
+    journal.journal_dir.mkdir()
+    journal.log_path.write_text('{"op":"x","name":"imp', encoding='utf-8')
+
+    assert journal.recover() == 0
+    assert not journal.log_path.exists()
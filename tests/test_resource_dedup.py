@@ -0,0 +1,30 @@
+from pathlib import Path
+
+from resource_dedup import ResourceDeduplicator, ResourceImage
+
+
+def image(name: str, phash: int, mean: float = 100.0) -> ResourceImage:
+    return ResourceImage('brushtex', name, Path(name), 64, 64, mean, phash)
+
+
+def test_chained_matches_are_split(library):
+    reader, nrm = library
+    # 相邻的资源相差6位，a与ccc相差12位，只是经过bb间接相连
+    images = [image('a.bmp', 0), image('bb.bmp', 0b111111), image('ccc.bmp', 0b111111111111),
+              image('dddd.bmp', 0b1111111111111)]
+
+    clusters = ResourceDeduplicator(reader, threshold=6).find_clusters(images)
+
+    assert [(c.canonical, c.duplicates, c.distances) for c in clusters] == [
+        ('a', ['bb'], {'bb': 6}),
+        ('ccc', ['dddd'], {'dddd': 1}),
+    ]
+
+
+def test_members_must_match_canonical_brightness(library):
+    reader, nrm = library
+    images = [image('a.bmp', 0, mean=100), image('bb.bmp', 0, mean=107), image('ccc.bmp', 0, mean=114)]
+
+    clusters = ResourceDeduplicator(reader, threshold=0).find_clusters(images)
+
+    assert [(c.canonical, c.duplicates) for c in clusters] == [('a', ['bb'])]
@@ -0,0 +1,93 @@
+import pytest
+
+from mutation_journal import MutationJournal
+from sai_codec import SaiDocument, decode_lines, read_lines
+
+from conftest import write_dat, write_group
+
+DAT = 'name=U:鉛筆\r\ndensity=I:50\r\ntexnam=U:紙\r\n--EOF--'.encode('shift-jis')
+
+
+def test_round_trip_is_byte_exact():
+    for data in (DAT, '\ufeffname=U:笔刷\n\n  0 = 5 \n--EOF--\n'.encode('utf-8'), b'name=U:\xff\xfe\r--EOF--\r'):
+        document = SaiDocument.decode(data)
+        assert document.encode() == data
+        assert not document.dirty
+    assert SaiDocument.decode(DAT).encoding == 'shift-jis'
+
+
+def test_set_changes_only_one_line():
+    document = SaiDocument.decode(DAT)
+
+    assert document.set('density', '80')
+    assert not document.set('density', '80')
+    assert document.dirty
+    assert document.encode() == DAT.replace(b'density=I:50', b'density=I:80')
+    assert document.get_field('density') == ('I', '80')
+    assert document.get_int('density') == 80
+    assert document.get_int('name') is None
+    assert document.get_int('missing') is None
+
+
+def test_new_key_goes_before_eof_with_file_newline():
+    document = SaiDocument.decode(DAT)
+
+    document.set('size', '12')
+    document.set('label', '太い')
+
+    assert document.encode() == DAT.replace(b'--EOF--', 'size=I:12\r\nlabel=U:太い\r\n--EOF--'.encode('shift-jis'))
+
+
+def test_new_content_that_does_not_fit_encoding_raises():
+    document = SaiDocument.decode(DAT)
+    document.set('name', '笔刷😀')
+
+    with pytest.raises(UnicodeEncodeError):
+        document.encode()
+
+
+def test_entries_and_remap_keep_whitespace():
+    data = b'name=U:grp\r\n.\r\n0=10\r\n 1 = 11\r\n2=12\r\n.\r\n--EOF--\r\n'
+    document = SaiDocument.decode(data)
+
+    assert [(index, value) for _, index, value in document.entries()] == [(0, 10), (1, 11), (2, 12)]
+    assert document.remap({11: 21, 12: 12, 99: 1}) == 1
+    assert document.encode() == data.replace(b' 1 = 11', b' 1 = 21')
+    with pytest.raises(ValueError):
+        document.set_entry(0, 1)
+
+
+def test_save_through_journal(tmp_path):
+    path = tmp_path / '30.saitlnk'
+    path.write_bytes(b'tarid=I:10\r\n--EOF--\r\n')
+    document = SaiDocument.load(path)
+    journal = MutationJournal(tmp_path / 'journal')
+
+    assert document.save(journal=journal)   # 没有修改时不写入
+    document.set('tarid', '20')
+    assert document.save(journal=journal)
+
+    assert path.read_bytes() == b'tarid=I:20\r\n--EOF--\r\n'
+    assert not document.dirty
+    assert not journal.pending_operations()
+
+
+def test_read_lines(tmp_path):
+    path = tmp_path / '1.saitdat'
+    path.write_bytes(DAT)
+
+    assert read_lines(path) == ['name=U:鉛筆\n', 'density=I:50\n', 'texnam=U:紙\n', '--EOF--']
+    assert SaiDocument.load(tmp_path / 'missing.saitdat') is None
+    with pytest.raises(OSError):
+        read_lines(tmp_path / 'missing.saitdat')
+
+
+def test_reader_parses_groups_through_codec(library):
+    reader, nrm = library
+    write_dat(nrm, 10, name='鉛筆', newline='\r\n', encoding='shift-jis')
+    write_group(nrm, 1, [10], name='筆', newline='\r\n', encoding='shift-jis')
+    
+    assert decode_lines((nrm / '10.saitdat').read_bytes()) == read_lines(nrm / '10.saitdat')
+    assert reader.read_group_summary(1) == ('筆', 1)
+    assert reader.read_brush_data(1).sub_brushes == {0: '鉛筆'}
+    assert reader.read_group_summary(2) is None
@@ -0,0 +1,53 @@
+from mutation_journal import MutationJournal
+from saitset import SaitsetModel
+
+# 头部的值中带有 "."，不能被当作索引部分的分隔行
+SAITSET = b'name=U:setv2.0.1\r\nnote=U:.\r\n.\r\n0=3\r\n1 = 7\r\n\r\n2=5\r\n.\r\n--EOF--\r\n'
+
+
+def test_parse_with_dots_in_header():
+    model = SaitsetModel.parse(SAITSET)
+
+    assert model.groups() == [3, 7, 5]
+    assert model.entries() == [(0, 3), (1, 7), (2, 5)]
+    assert 7 in model and 4 not in model
+    assert len(model) == 3
+    assert model.encode() == SAITSET
+
+
+def test_missing_separators():
+    assert SaitsetModel.parse(b'name=U:setv2\r\n0=1\r\n--EOF--\r\n') is None
+
+
+def test_append_and_remove_keep_other_lines():
+    model = SaitsetModel.parse(SAITSET)
+
+    assert model.append([7, 8, 9]) == [3, 4]
+    assert model.remove([3, 4]) == 1
+
+    assert model.groups() == [7, 5, 8, 9]
+    assert model.encode() == SAITSET.replace(b'0=3\r\n', b'').replace(b'2=5\r\n.', b'2=5\r\n3=8\r\n4=9\r\n.')
+
+
+def test_reorder_renumbers():
+    model = SaitsetModel.parse(SAITSET)
+
+    model.reorder([5])
+
+    assert model.entries() == [(0, 5), (1, 3), (2, 7)]
+    # 条目保留原来的空白，空行移到条目之后
+    assert model.encode() == SAITSET.replace(b'0=3\r\n1 = 7\r\n\r\n2=5\r\n',
+                                             b'0=5\r\n1=3\r\n2 = 7\r\n\r\n')
+
+
+def test_save_through_journal(tmp_path):
+    path = tmp_path / '_0.saitset'
+    path.write_bytes(SAITSET)
+    journal = MutationJournal(tmp_path / 'journal')
+    model = SaitsetModel.load(path)
+
+    model.renumber(start=10)
+    assert model.save(journal=journal)
+
+    assert SaitsetModel.load(path).entries() == [(10, 3), (11, 7), (12, 5)]
+    assert not journal.pending_operations()
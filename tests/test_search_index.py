@@ -0,0 +1,22 @@
+from search_index import BrushSearchIndex
+
+
+def test_search_groups_limits_distinct_groups():
+    index = BrushSearchIndex()
+    # 笔刷组1的组名和所有子笔刷都命中，排在笔刷组2之前
+    index.add_group(1, '铅笔', {i: f"铅笔{i}" for i in range(10)})
+    index.add_group(2, '铅笔套装', {})
+    index.add_group(3, '水彩', {0: '湿铅笔画笔套装'})
+
+    assert index.search_groups('铅笔', limit=2) == [1, 2]
+    assert index.search_groups('铅笔', limit=10) == [1, 2, 3]
+    assert len(index.search('铅笔', limit=2)) == 2
+
+
+def test_search_groups_after_remove():
+    index = BrushSearchIndex()
+    index.add_group(1, '铅笔', {0: '铅笔A'})
+    index.add_group(2, '铅笔B', {})
+    index.remove_group(1)
+
+    assert index.search_groups('铅笔', limit=1) == [2]
@@ -0,0 +1,57 @@
+import os
+
+from shadow_mirror import ShadowMirror
+
+
+def make_mirror(tmp_path):
+    real_nrm = tmp_path / 'real' / 'SAIv2' / 'settings' / 'custool' / 'nrm'
+    real_nrm.mkdir(parents=True)
+    (real_nrm / '10.saitdat').write_bytes(b'name=U:a\n')
+    (real_nrm / '11.saitdat').write_bytes(b'name=U:b\n')
+    mirror = ShadowMirror(tmp_path / 'real', tmp_path / 'mirror')
+    mirror.refresh()
+    return mirror, real_nrm, tmp_path / 'mirror' / 'SAIv2' / 'settings' / 'custool' / 'nrm'
+
+
+def touch_later(path, data):
+    """写入内容并把修改时间推后，保证与记录的状态不同"""
+    stat = path.stat() if path.exists() else None
+    path.write_bytes(data)
+    if stat is not None:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_commit_pushes_mirror_changes(tmp_path):
+    mirror, real_nrm, mirror_nrm = make_mirror(tmp_path)
+    touch_later(mirror_nrm / '10.saitdat', b'name=U:changed\n')
+    (mirror_nrm / '11.saitdat').unlink()
+    (mirror_nrm / '12.saitdat').write_bytes(b'name=U:new\n')
+
+    assert mirror.commit() == 3
+
+    assert (real_nrm / '10.saitdat').read_bytes() == b'name=U:changed\n'
+    assert not (real_nrm / '11.saitdat').exists()
+    assert (real_nrm / '12.saitdat').read_bytes() == b'name=U:new\n'
+    assert mirror.conflicts == []
+    assert not list(real_nrm.glob('*.tmp'))
+
+
+def test_commit_does_not_overwrite_external_changes(tmp_path):
+    mirror, real_nrm, mirror_nrm = make_mirror(tmp_path)
+    touch_later(mirror_nrm / '10.saitdat', b'name=U:mirror\n')
+    (mirror_nrm / '11.saitdat').unlink()
+    # SAI在镜像同步之后原地修改了真实文件（目录的修改时间不变）
+    touch_later(real_nrm / '10.saitdat', b'name=U:sai\n')
+    touch_later(real_nrm / '11.saitdat', b'name=U:sai\n')
+
+    assert mirror.commit() == 0
+
+    assert sorted(mirror.conflicts) == ['custool/nrm/10.saitdat', 'custool/nrm/11.saitdat']
+    assert (real_nrm / '10.saitdat').read_bytes() == b'name=U:sai\n'
+    assert (real_nrm / '11.saitdat').read_bytes() == b'name=U:sai\n'
+
+    # 下次同步以真实目录为准
+    mirror.refresh()
+    assert (mirror_nrm / '10.saitdat').read_bytes() == b'name=U:sai\n'
+    assert (mirror_nrm / '11.saitdat').read_bytes() == b'name=U:sai\n'
+    assert mirror.commit() == 0
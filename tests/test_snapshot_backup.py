@@ -0,0 +1,60 @@
+from saitset import SaitsetModel
+from snapshot_backup import SnapshotManager
+
+from conftest import write_dat, write_group, write_link, write_saitset
+
+
+def make_manager(library, tmp_path):
+    reader, nrm = library
+    return SnapshotManager(reader.sai_path, tmp_path / 'backups', journal=reader.journal)
+
+
+def test_restore_group_after_delete(library, tmp_path):
+    reader, nrm = library
+    write_dat(nrm, 10)
+    write_link(nrm, 20, 10)
+    write_group(nrm, 1, [10])
+    write_group(nrm, 2, [20])
+    write_saitset(nrm, [1, 2])
+    manager = make_manager(library, tmp_path)
+    snapshot = manager.create('test')
+    reader.delete_brush_group(2)
+
+    assert manager.restore_group(snapshot.name, 2)
+
+    assert (nrm / '20.saitlnk').read_bytes() == b'tarid=I:10\n--EOF--\n'
+    assert reader.get_brush_group_info(2)['dat_numbers'] == [10]
+    assert SaitsetModel.load(nrm / '_0.saitset').groups() == [1, 2]
+    assert not reader.journal.pending_operations()
+
+
+def test_restore_group_refuses_to_overwrite_shared_dat(library, tmp_path):
+    reader, nrm = library
+    write_dat(nrm, 10)
+    write_group(nrm, 1, [10])
+    write_group(nrm, 2, [10])
+    write_saitset(nrm, [1, 2])
+    manager = make_manager(library, tmp_path)
+    snapshot = manager.create('test')
+    write_dat(nrm, 10, density=99)
+    before = (nrm / '10.saitdat').read_bytes()
+
+    assert not manager.restore_group(snapshot.name, 2)
+
+    assert (nrm / '10.saitdat').read_bytes() == before
+
+
+def test_restore_aborts_when_safety_snapshot_fails(library, tmp_path, monkeypatch):
+    reader, nrm = library
+    write_dat(nrm, 10)
+    write_group(nrm, 1, [10])
+    write_saitset(nrm, [1])
+    manager = make_manager(library, tmp_path)
+    snapshot = manager.create('test')
+    write_dat(nrm, 11)
+    monkeypatch.setattr(manager, 'create', lambda *args, **kwargs: None)
+
+    assert not manager.restore(snapshot.name)
+    assert not manager.restore_group(snapshot.name, 1)
+
+    assert (nrm / '11.saitdat').exists()
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import struct
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# 缩略图边长（像素）
+THUMBNAIL_SIZE = 48
+
+def read_bmp(path: Path) -> Optional[np.ndarray]:
+    """
+    读取未压缩的BMP文件（1/4/8位调色板，16/24/32位）
+    
+    Args:
+        path: BMP文件路径
+    
+    Returns:
+        Optional[np.ndarray]: (高, 宽, 3) 的uint8 RGB数组，文件损坏或格式不支持（如RLE压缩）时返回None
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 26 or data[:2] != b'BM':
+        return None
+    
+    offset, header_size = struct.unpack_from('<II', data, 10)
+    if header_size == 12:
+        # BITMAPCOREHEADER：调色板每项3字节
+        width, height, _, bpp = struct.unpack_from('<HHHH', data, 18)
+        compression, colors, entry_size = 0, 0, 3
+    elif header_size >= 40 and len(data) >= 54:
+        width, height, _, bpp, compression = struct.unpack_from('<iiHHI', data, 18)
+        colors = struct.unpack_from('<I', data, 46)[0]
+        entry_size = 4
+    else:
+        return None
+    
+    top_down = height < 0
+    height = abs(height)
+    if width <= 0 or height == 0 or compression not in (0, 3) or bpp not in (1, 4, 8, 16, 24, 32):
+        return None
+    stride = (width * bpp + 31) // 32 * 4
+    if len(data) < offset + stride * height:
+        return None
+    rows = np.frombuffer(data, np.uint8, count=stride * height, offset=offset).reshape(height, stride)
+    
+    if bpp <= 8:
+        palette_end = min(offset, 14 + header_size + (colors or 1 << bpp) * entry_size)
+        palette = np.frombuffer(data[14 + header_size:palette_end], np.uint8)
+        palette = palette[:len(palette) // entry_size * entry_size].reshape(-1, entry_size)[:, 2::-1]
+        if not len(palette):
+            return None
+        if bpp == 8:
+            indices = rows[:, :width]
+        elif bpp == 4:
+            indices = np.stack((rows >> 4, rows & 0x0F), axis=2).reshape(height, -1)[:, :width]
+        else:
+            indices = np.unpackbits(rows, axis=1)[:, :width]
+        pixels = palette[np.minimum(indices, len(palette) - 1)]
+    elif bpp == 24:
+        pixels = rows[:, :width * 3].reshape(height, width, 3)[:, :, ::-1]
+    else:
+        # 16/32位：按颜色掩码取出各通道（BI_BITFIELDS的掩码紧跟在40字节的信息头之后）
+        if compression == 3 and len(data) >= 66:
+            masks = struct.unpack_from('<III', data, 54)
+        elif bpp == 16:
+            masks = (0x7C00, 0x03E0, 0x001F)
+        else:
+            masks = (0xFF0000, 0x00FF00, 0x0000FF)
+        values = rows[:, :width * bpp // 8].copy().view('<u2' if bpp == 16 else '<u4').astype(np.uint32)
+        channels = []
+        for mask in masks:
+            if not mask:
+                channels.append(np.zeros_like(values, dtype=np.uint8))
+                continue
+            shift = (mask & -mask).bit_length() - 1
+            maximum = mask >> shift
+            channels.append(((values & mask) >> shift) * 255 // maximum)
+        pixels = np.stack(channels, axis=2).astype(np.uint8)
+    
+    if not top_down:
+        pixels = pixels[::-1]
+    return np.ascontiguousarray(pixels)
+
+def downsample(pixels: np.ndarray, size: int = THUMBNAIL_SIZE) -> np.ndarray:
+    """
+    把图像缩放到长边不超过size：大图按整数倍区域平均缩小，小图按整数倍放大
+    
+    Args:
+        pixels: (高, 宽, 3) 的uint8数组
+        size: 缩略图边长
+    
+    Returns:
+        np.ndarray: 缩放后的uint8数组
+    """
+    height, width = pixels.shape[:2]
+    longest = max(height, width)
+    if longest > size:
+        factor = -(-longest // size)
+        pad_h, pad_w = -height % factor, -width % factor
+        if pad_h or pad_w:
+            pixels = np.pad(pixels, ((0, pad_h), (0, pad_w), (0, 0)), mode='edge')
+        blocks = pixels.reshape(pixels.shape[0] // factor, factor, pixels.shape[1] // factor, factor, 3)
+        pixels = (blocks.mean(axis=(1, 3), dtype=np.float32) + 0.5).astype(np.uint8)
+    elif longest * 2 <= size:
+        factor = size // longest
+        pixels = pixels.repeat(factor, axis=0).repeat(factor, axis=1)
+    return pixels
+
+def encode_ppm(pixels: np.ndarray) -> bytes:
+    """把RGB数组编码为PPM（tkinter.PhotoImage 可以直接显示）"""
+    height, width = pixels.shape[:2]
+    return b'P6 %d %d 255\n' % (width, height) + np.ascontiguousarray(pixels, dtype=np.uint8).tobytes()
+
+class ThumbnailCache:
+    """笔刷形状和纹理的缩略图缓存
+    
+    缩略图按 (路径, 文件大小, 修改时间) 缓存为磁盘上的PPM文件，超过 max_entries 时淘汰最久未使用的；
+    最近使用的缩略图同时保存在内存中。同一个BMP只要没有修改，就只会解码一次。
+    """
+    
+    INDEX_FILE = 'index.json'
+    
+    def __init__(self, cache_dir: Path, size: int = THUMBNAIL_SIZE,
+                 max_entries: int = 2000, memory_entries: int = 256):
+        """
+        Args:
+            cache_dir: 缓存目录
+            size: 缩略图边长
+            max_entries: 磁盘上最多保存的缩略图数量
+            memory_entries: 内存中最多保存的缩略图数量
+        """
+        self.cache_dir = Path(cache_dir)
+        self.size = size
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory: 'OrderedDict[str, Optional[bytes]]' = OrderedDict()
+        self._entries: Dict[str, List] = {}   # {键: [最近使用序号, 是否有缩略图]}
+        self._clock = 0
+        self._dirty = False
+        self.decoded = 0                      # 本次运行解码的BMP数量
+        self._load_index()
+    
+    def _load_index(self) -> None:
+        """读取磁盘缓存的索引，缩略图边长不同时丢弃"""
+        try:
+            with open(self.cache_dir / self.INDEX_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('size') == self.size:
+                self._entries = data.get('entries', {})
+                self._clock = max((entry[0] for entry in self._entries.values()), default=0)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"读取缩略图缓存索引时出错: {str(e)}")
+    
+    def save(self) -> None:
+        """保存磁盘缓存的索引（有变化时）"""
+        if not self._dirty:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_dir / f"{self.INDEX_FILE}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'size': self.size, 'entries': self._entries}, f)
+            os.replace(tmp_path, self.cache_dir / self.INDEX_FILE)
+            self._dirty = False
+        except Exception as e:
+            print(f"保存缩略图缓存索引时出错: {str(e)}")
+    
+    def _key(self, path: Path) -> Optional[str]:
+        """缓存键：路径、文件大小和修改时间的哈希，文件不存在返回None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        source = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha1(source.encode('utf-8')).hexdigest()
+    
+    def _touch(self, key: str, has_thumbnail: bool) -> None:
+        """记录一次使用，超过上限时淘汰最久未使用的缩略图"""
+        self._clock += 1
+        self._entries[key] = [self._clock, has_thumbnail]
+        self._dirty = True
+        if len(self._entries) > self.max_entries:
+            by_age = sorted(self._entries.items(), key=lambda item: item[1][0])
+            for old_key, (_, old_has_thumbnail) in by_age[:len(self._entries) - self.max_entries]:
+                del self._entries[old_key]
+                self._memory.pop(old_key, None)
+                if old_has_thumbnail:
+                    try:
+                        os.unlink(self.cache_dir / f"{old_key}.ppm")
+                    except OSError:
+                        pass
+    
+    def _remember(self, key: str, data: Optional[bytes]) -> None:
+        """放入内存缓存"""
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+    
+    def get(self, path: Path) -> Optional[bytes]:
+        """
+        获取BMP文件的缩略图
+        
+        Args:
+            path: BMP文件路径
+        
+        Returns:
+            Optional[bytes]: PPM格式的缩略图，文件不存在或无法解码时返回None
+        """
+        key = self._key(path)
+        if key is None:
+            return None
+        
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self._touch(key, self._memory[key] is not None)
+            return self._memory[key]
+        
+        thumb_path = self.cache_dir / f"{key}.ppm"
+        entry = self._entries.get(key)
+        if entry is not None:
+            if not entry[1]:
+                self._touch(key, False)
+                self._remember(key, None)
+                return None
+            try:
+                with open(thumb_path, 'rb') as f:
+                    data = f.read()
+                self._touch(key, True)
+                self._remember(key, data)
+                return data
+            except OSError:
+                pass
+        
+        # 解码并生成缩略图
+        data = None
+        try:
+            pixels = read_bmp(path)
+            self.decoded += 1
+            if pixels is not None:
+                data = encode_ppm(downsample(pixels, self.size))
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                with open(thumb_path, 'wb') as f:
+                    f.write(data)
+        except Exception as e:
+            print(f"生成缩略图时出错 {path}: {str(e)}")
+            data = None
+        self._touch(key, data is not None)
+        self._remember(key, data)
+        return data
+    
+    def get_many(self, paths: Iterable[Path]) -> List[Tuple[Path, bytes]]:
+        """
+        批量获取缩略图并保存索引
+        
+        Args:
+            paths: BMP文件路径
+        
+        Returns:
+            List[Tuple[Path, bytes]]: 成功生成的 (路径, PPM数据)
+        """
+        thumbnails = []
+        for path in paths:
+            data = self.get(path)
+            if data is not None:
+                thumbnails.append((Path(path), data))
+        self.save()
+        return thumbnails